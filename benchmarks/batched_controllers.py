@@ -0,0 +1,103 @@
+"""
+Parity and throughput of the batched controllers in
+`omni_drones.controllers.lee_position_controller` with per-env parameters,
+against evaluating the controller per env with `torch.vmap` over the
+parameters (`torch.func.functional_call`).
+
+    python benchmarks/batched_controllers.py --device cuda --drones 1024 4096 16384 65536
+"""
+
+import argparse
+import os.path as osp
+
+import torch
+import yaml
+from torch.utils.benchmark import Timer
+
+from omni_drones.controllers import (
+    AttitudeController,
+    LeePositionController,
+    RateController,
+)
+from omni_drones.utils.torch import euler_to_quaternion
+
+ASSET_PATH = osp.join(osp.dirname(__file__), "..", "omni_drones", "robots", "assets")
+
+
+def timeit(stmt: str, **globals) -> float:
+    try:
+        measurement = Timer(stmt, globals=globals).blocked_autorange(min_run_time=0.5)
+    except RuntimeError:
+        return float("nan")
+    return measurement.median * 1e3
+
+
+def random_state(n: int, device) -> torch.Tensor:
+    pos = torch.randn(n, 3, device=device)
+    rot = euler_to_quaternion(torch.randn(n, 3, device=device) * 0.3)
+    vel = torch.randn(n, 3, device=device)
+    ang_vel = torch.randn(n, 3, device=device)
+    return torch.cat([pos, rot, vel, ang_vel], dim=-1)
+
+
+def make_inputs(name: str, n: int, device):
+    if name == "LeePositionController":
+        return {"target_vel": torch.randn(n, 3, device=device), "target_yaw": torch.randn(n, 1, device=device)}
+    if name == "AttitudeController":
+        return {
+            "target_thrust": torch.rand(n, 1, device=device) * 10,
+            "target_yaw_rate": torch.randn(n, 1, device=device),
+            "target_roll": torch.randn(n, 1, device=device) * 0.1,
+            "target_pitch": torch.randn(n, 1, device=device) * 0.1,
+        }
+    return {"target_rate": torch.randn(n, 3, device=device), "target_thrust": torch.rand(n, 1, device=device) * 10}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--drone_model", default="hummingbird")
+    parser.add_argument("--drones", type=int, nargs="+", default=[1024, 4096, 16384, 65536])
+    args = parser.parse_args()
+
+    with open(osp.join(ASSET_PATH, "usd", f"{args.drone_model}.yaml")) as f:
+        uav_params = yaml.safe_load(f)
+
+    header = f"{'controller':>22} {'drones':>6} | {'max_err':>8} {'vmap':>8} {'batched':>8} {'speedup':>7}  (ms)"
+    print(header)
+    print("-" * len(header))
+    for cls in (LeePositionController, AttitudeController, RateController):
+        for n in args.drones:
+            controller = cls(9.81, uav_params).to(args.device)
+            # per-drone parameters, as sampled by domain randomization
+            params = {"inertia": controller.mixer.new_tensor([0.007, 0.007, 0.012]) * (0.5 + torch.rand(n, 3, device=args.device))}
+            if hasattr(controller, "mass"):
+                params["mass"] = controller.mass * (0.5 + torch.rand(n, device=args.device))
+            controller.set_params(**params)
+
+            root_state = random_state(n, args.device)
+            inputs = make_inputs(cls.__name__, n, args.device)
+            names = list(inputs)
+            batched_params = dict(controller.named_parameters())
+
+            def per_env(params, root_state, *inputs):
+                return torch.func.functional_call(
+                    controller, params, (root_state,), dict(zip(names, inputs))
+                )
+            vmapped = torch.vmap(per_env, in_dims=({k: 0 if v.dim() > controller._event_dims[k] else None for k, v in batched_params.items()}, 0, *[0] * len(names)))
+
+            cmd = controller(root_state, **inputs)
+            # as in the scripts, vmap over envs with one drone per env
+            vmap_inputs = [x.unsqueeze(1) for x in (root_state, *inputs.values())]
+            cmd_vmap = vmapped(batched_params, *vmap_inputs).squeeze(1)
+            max_err = (cmd - cmd_vmap).abs().max().item()
+            t_vmap = timeit("f(p, *x)", f=vmapped, p=batched_params, x=vmap_inputs)
+            t_batched = timeit("f(s, **x)", f=controller, s=root_state, x=inputs)
+            print(
+                f"{cls.__name__:>22} {n:>6} | {max_err:8.1e} {t_vmap:8.3f} {t_batched:8.3f} "
+                f"{t_vmap / t_batched:6.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+PPO with `algo.precision=bf16` versus float32: rollout inference and update
+latency, the activation memory saved for the backward pass, and how far the
+bf16 losses and gradients are from the float32 ones on the same minibatch.
+Also checks that a deep copy of a bf16 policy runs its own parameters and that
+the exported actor is float32.
+
+`--curve N` additionally trains both precisions for N iterations on a
+point-mass stand-in for `Hover` (no simulator needed) and prints the two
+learning curves side by side.
+
+    python benchmarks/bf16.py --device cpu --batch 4096 16384
+    python benchmarks/bf16.py --device cpu --batch 4096 --curve 100
+"""
+
+import argparse
+import copy
+
+import torch
+from omegaconf import OmegaConf
+from tensordict import TensorDict
+from torch.utils.benchmark import Timer
+from torchrl.envs.utils import ExplorationType, set_exploration_type
+from torchrl.data import CompositeSpec, UnboundedContinuousTensorSpec
+
+from omni_drones.learning.export import strip_actor
+from omni_drones.learning.ppo.config import PPOConfig
+from omni_drones.learning.ppo.ppo import PPOPolicy
+
+
+def make_policy(precision, obs_dim, action_dim, device):
+    cfg = OmegaConf.structured(PPOConfig(precision=precision))
+    observation_spec = CompositeSpec({
+        "agents": CompositeSpec({"observation": UnboundedContinuousTensorSpec((1, obs_dim))})
+    }).to(device)
+    action_spec = UnboundedContinuousTensorSpec((1, action_dim), device=device)
+    reward_spec = UnboundedContinuousTensorSpec((1, 1), device=device)
+    torch.manual_seed(0)
+    return PPOPolicy(cfg, observation_spec, action_spec, reward_spec, device)
+
+
+def make_minibatch(policy, size, obs_dim, device):
+    minibatch = TensorDict({
+        "agents": {"observation": torch.randn(size, 1, obs_dim, device=device)},
+    }, [size])
+    with torch.no_grad():
+        policy(minibatch)
+        dist = policy.actor.get_dist(minibatch)
+        action = dist.sample()
+        minibatch[("agents", "action")] = action
+        minibatch["sample_log_prob"] = dist.log_prob(action)
+    minibatch["adv"] = torch.randn(size, 1, 1, device=device)
+    minibatch["ret"] = torch.randn(size, 1, 1, device=device)
+    return minibatch
+
+
+def check_copy(policy, reference, rollout):
+    """`policy` is bf16, `reference` the same policy in float32."""
+    trunk = copy.deepcopy(policy.critic.module[0])
+    for p in trunk.parameters():
+        p.data.zero_()
+    with torch.no_grad():
+        x = rollout[("agents", "observation")]
+        assert trunk(x).abs().max() == 0, "the copy runs the original parameters"
+        assert policy.critic.module[0](x).abs().max() > 0
+        actor, _ = strip_actor(policy.actor, rollout[:1])
+        expected, _ = strip_actor(reference.actor, rollout[:1])
+        assert torch.equal(actor(x.cpu())[0], expected(x.cpu())[0]), "the exported actor is not float32"
+
+
+def saved_bytes(policy, minibatch):
+    """The size of the tensors saved for backward by one update step."""
+    total = 0
+    def pack(t):
+        nonlocal total
+        total += t.numel() * t.element_size()
+        return t
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+        policy._update(minibatch.clone(False))
+    return total
+
+
+def gradients(policy, minibatch):
+    for p in policy.parameters():
+        p.grad = None
+    # a zero learning rate keeps the parameters and only leaves the gradients behind
+    for opt in (policy.actor_opt, policy.critic_opt):
+        for group in opt.param_groups:
+            group["lr"] = 0.
+    info = policy._update(minibatch.clone(False))
+    grads = torch.cat([p.grad.flatten() for p in policy.parameters() if p.grad is not None])
+    return info, grads
+
+
+def hover_reset(num_envs, device):
+    pos = torch.rand(num_envs, 3, device=device) * 4 - 2
+    return torch.cat([pos, torch.zeros_like(pos)], dim=-1)
+
+
+def hover_rollout(policy, state, steps):
+    """Fly a point mass (state: position and velocity) to the origin and hold
+    it there, the action being its acceleration on top of gravity compensation."""
+    frames = []
+    for _ in range(steps):
+        tensordict = TensorDict({"agents": {"observation": state.unsqueeze(1)}}, state.shape[:1])
+        with torch.no_grad(), set_exploration_type(ExplorationType.RANDOM):
+            policy(tensordict)
+        action = tensordict[("agents", "action")].squeeze(1).clamp(-1, 1)
+        vel = state[:, 3:] + action * 0.25
+        pos = state[:, :3] + vel * 0.05
+        next_state = torch.cat([pos, vel], dim=-1)
+        distance = pos.norm(dim=-1, keepdim=True)
+        terminated = distance > 4
+        tensordict["next"] = TensorDict({
+            "agents": {
+                "observation": next_state.unsqueeze(1),
+                "reward": (1 / (1 + distance)).unsqueeze(1),
+            },
+            "terminated": terminated,
+        }, state.shape[:1])
+        frames.append(tensordict)
+        state = torch.where(terminated, hover_reset(len(state), state.device), next_state)
+    return torch.stack(frames, dim=1), state
+
+
+def learning_curve(precision, iters, num_envs, device):
+    policy = make_policy(precision, 6, 3, device)
+    torch.manual_seed(0)
+    state = hover_reset(num_envs, device)
+    curve = []
+    for _ in range(iters):
+        rollout, state = hover_rollout(policy, state, policy.cfg.train_every)
+        curve.append(rollout[("next", "agents", "reward")].mean().item())
+        policy.train_op(rollout)
+    return curve
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch", type=int, nargs="+", default=[4096, 16384])
+    parser.add_argument("--obs_dim", type=int, default=32)
+    parser.add_argument("--action_dim", type=int, default=4)
+    parser.add_argument("--curve", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'precision':>9} {'inference (ms)':>15} {'update (ms)':>12} {'saved (MB)':>11}")
+    for size in args.batch:
+        results = {}
+        for precision in ("fp32", "bf16"):
+            policy = make_policy(precision, args.obs_dim, args.action_dim, args.device)
+            minibatch = make_minibatch(make_policy("fp32", args.obs_dim, args.action_dim, args.device), size, args.obs_dim, args.device)
+            rollout = minibatch.select("agents")
+            if precision == "bf16":
+                check_copy(policy, make_policy("fp32", args.obs_dim, args.action_dim, args.device), rollout)
+            with torch.no_grad():
+                inference = Timer("policy(rollout.clone(False))", globals={"policy": policy, "rollout": rollout})
+                inference = inference.blocked_autorange(min_run_time=1.).median * 1e3
+            for _ in range(2): # optimizer state
+                policy._update(minibatch.clone(False))
+            update = Timer("policy._update(minibatch.clone(False))", globals={"policy": policy, "minibatch": minibatch})
+            update = update.blocked_autorange(min_run_time=1.).median * 1e3
+            saved = saved_bytes(policy, minibatch) / 2**20
+            print(f"{size:>6} {precision:>9} {inference:>15.2f} {update:>12.2f} {saved:>11.2f}")
+            results[precision] = gradients(make_policy(precision, args.obs_dim, args.action_dim, args.device), minibatch)
+
+        (info_fp32, grad_fp32), (info_bf16, grad_bf16) = results["fp32"], results["bf16"]
+        losses = ", ".join(
+            f"{k} {info_fp32[k].mean().item():.4f}/{info_bf16[k].mean().item():.4f}"
+            for k in ("policy_loss", "value_loss", "entropy")
+        )
+        cos = torch.cosine_similarity(grad_fp32, grad_bf16, dim=0).item()
+        print(f"{'':>6} fp32/bf16: {losses}, gradient cosine similarity {cos:.4f}")
+
+    if args.curve > 0:
+        num_envs = args.batch[0]
+        curves = [learning_curve(precision, args.curve, num_envs, args.device) for precision in ("fp32", "bf16")]
+        print(f"\n{num_envs} point-mass hover envs, mean reward per iteration")
+        print(f"{'iter':>6} {'fp32':>8} {'bf16':>8}")
+        for i, (fp32, bf16) in enumerate(zip(*curves)):
+            print(f"{i:>6} {fp32:>8.4f} {bf16:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
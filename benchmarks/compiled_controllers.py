@@ -0,0 +1,90 @@
+"""
+Per-call latency of the PID controllers with explicit state tensors, run
+eagerly, with TorchScript and with `torch.compile`, from a single drone
+(onboard) to a training-sized batch. The benchmark fails if a controller
+fell back to eager execution in the "script" or "compile" column.
+
+    python benchmarks/compiled_controllers.py --device cuda --batch 1 64 4096 65536
+"""
+
+import argparse
+import os.path as osp
+
+import torch
+import yaml
+from tensordict import TensorDict
+from torch.utils.benchmark import Timer
+
+from omni_drones.controllers import DSLPIDController
+from omni_drones.controllers.cf2x_pid import DSLPIDControl
+from omni_drones.utils.torch import euler_to_quaternion
+
+ASSET_PATH = osp.join(osp.dirname(__file__), "..", "omni_drones", "robots", "assets")
+MODES = ("eager", "script", "compile")
+
+
+def timeit(stmt: str, **globals) -> float:
+    try:
+        measurement = Timer(stmt, globals=globals).blocked_autorange(min_run_time=0.5)
+    except RuntimeError:
+        return float("nan")
+    return measurement.median * 1e6
+
+
+def check_compiled(f, mode: str, name: str):
+    # `maybe_compile` falls back to the eager function with a warning
+    if mode == "script" and not isinstance(f, torch.jit.ScriptFunction):
+        raise RuntimeError(f"Scripting {name} failed, the script column would run eagerly.")
+    if mode == "compile" and not f.compiled:
+        raise RuntimeError(f"torch.compile of {name} fell back to eager, the compile column would run eagerly.")
+
+
+def random_state(n: int, device) -> torch.Tensor:
+    pos = torch.randn(n, 3, device=device) * 0.1
+    rot = euler_to_quaternion(torch.randn(n, 3, device=device) * 0.1)
+    vel = torch.randn(n, 6, device=device) * 0.1
+    return torch.cat([pos, rot, vel], dim=-1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 64, 4096, 65536])
+    args = parser.parse_args()
+
+    with open(osp.join(ASSET_PATH, "usd", "crazyflie.yaml")) as f:
+        uav_params = yaml.safe_load(f)
+
+    header = f"{'controller':>16} {'batch':>6} | " + " ".join(f"{m:>9}" for m in MODES) + "  (us/call)"
+    print(header)
+    print("-" * len(header))
+    for n in args.batch:
+        state = random_state(n, args.device)
+        control_target = torch.cat([state[:, :3] + 0.1, torch.zeros(n, 4, device=args.device)], dim=-1)
+
+        results = []
+        for mode in MODES:
+            controller = DSLPIDController(0.01, 9.81, uav_params, compile=mode).to(args.device)
+            _, controller_state = controller(state, control_target, TensorDict({}, [n]))
+            controller(state, control_target, controller_state) # warm up
+            check_compiled(controller._control, mode, "DSLPIDController")
+            results.append(timeit("f(s, t, c)", f=controller, s=state, t=control_target, c=controller_state))
+        print(f"{'DSLPIDController':>16} {n:>6} | " + " ".join(f"{r:9.1f}" for r in results))
+
+        results = []
+        target_rpy = torch.zeros(n, 3, device=args.device)
+        zeros = torch.zeros(n, 3, device=args.device)
+        for mode in MODES:
+            controller = DSLPIDControl((n,), 9.81, 0.01, device=args.device, compile=mode)
+            controller_state = controller.init_state()
+            controller.step(controller_state, state, control_target[:, :3], target_rpy, zeros, zeros)
+            check_compiled(controller._compute_control, mode, "DSLPIDControl")
+            results.append(timeit(
+                "f(c, s, p, r, v, w)", f=controller.step,
+                c=controller_state, s=state, p=control_target[:, :3], r=target_rpy, v=zeros, w=zeros
+            ))
+        print(f"{'DSLPIDControl':>16} {n:>6} | " + " ".join(f"{r:9.1f}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
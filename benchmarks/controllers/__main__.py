@@ -0,0 +1,94 @@
+"""
+Throughput and latency benchmarks of the controller stack on CPU.
+
+Run the suite and write a JSON report:
+
+    python benchmarks/controllers --batch 1 64 4096 65536 1048576 --output report.json
+
+Compare two reports, exiting with a non-zero status on regressions:
+
+    python benchmarks/controllers compare baseline.json report.json --threshold 0.1
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+
+import torch
+
+# run as `python benchmarks/controllers`, which puts this directory on the path
+from cases import CASES
+from compare import compare
+from measure import measure
+
+
+def run(args):
+    torch.set_num_threads(args.num_threads or torch.get_num_threads())
+    results = []
+    print(f"{'case':>20} {'batch':>8} | {'mean (us)':>11} {'p99 (us)':>11} {'drones/s':>10} {'allocs':>6}")
+    for name in args.cases:
+        for batch in args.batch:
+            generator = torch.Generator().manual_seed(args.seed)
+            with torch.inference_mode():
+                step = CASES[name](batch, generator)
+                result = measure(
+                    step, batch,
+                    min_time=args.min_time,
+                    max_iters=args.max_iters,
+                    allocations=not args.no_allocs,
+                )
+            result.update(case=name, batch=batch)
+            results.append(result)
+            print(
+                f"{name:>20} {batch:>8} | {result['mean_us']:11.1f} {result['p99_us']:11.1f} "
+                f"{result['throughput']:10.3g} {result.get('allocs', '-'):>6}"
+            )
+    report = {
+        "meta": {
+            "time": datetime.datetime.now().isoformat(),
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "num_threads": torch.get_num_threads(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}.")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 64, 4096, 65536, 1048576])
+    parser.add_argument("--output", type=str, default="controllers.json")
+    parser.add_argument("--min_time", type=float, default=1.0)
+    parser.add_argument("--max_iters", type=int, default=200)
+    parser.add_argument("--num_threads", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no_allocs", action="store_true", help="skip counting allocations")
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        regressions = compare(args.baseline, args.candidate, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s).")
+            sys.exit(1)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
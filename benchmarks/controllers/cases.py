@@ -0,0 +1,97 @@
+"""
+Benchmark cases: each case builds a controller (or the rotor model) for a
+batch of `n` drones and returns a closure that runs one control step on
+synthetic states. Everything runs on CPU without the simulator.
+"""
+
+import os.path as osp
+from typing import Callable, Dict
+
+import torch
+import torch.nn as nn
+import yaml
+
+from omni_drones.actuators.rotor_group import RotorGroup
+from omni_drones.controllers import (
+    AttitudeController,
+    DSLPIDController,
+    LeePositionController,
+    RateController,
+)
+from omni_drones.controllers.cf2x_pid import DSLPIDControl
+from omni_drones.utils.torch import euler_to_quaternion
+
+ASSET_PATH = osp.join(osp.dirname(__file__), "..", "..", "omni_drones", "robots", "assets")
+
+
+def load_params(drone_model: str):
+    with open(osp.join(ASSET_PATH, "usd", f"{drone_model}.yaml")) as f:
+        return yaml.safe_load(f)
+
+
+def random_state(n: int, generator: torch.Generator) -> torch.Tensor:
+    pos = torch.randn(n, 3, generator=generator) * 0.1
+    rot = euler_to_quaternion(torch.randn(n, 3, generator=generator) * 0.1)
+    vel = torch.randn(n, 6, generator=generator) * 0.1
+    return torch.cat([pos, rot, vel], dim=-1)
+
+
+def lee_position(n: int, generator: torch.Generator) -> Callable:
+    controller = LeePositionController(9.81, load_params("hummingbird"))
+    state = random_state(n, generator)
+    target_vel = torch.randn(n, 3, generator=generator)
+    target_yaw = torch.randn(n, 1, generator=generator)
+    return lambda: controller(state, target_vel=target_vel, target_yaw=target_yaw)
+
+
+def attitude(n: int, generator: torch.Generator) -> Callable:
+    controller = AttitudeController(9.81, load_params("hummingbird"))
+    state = random_state(n, generator)
+    target_thrust = torch.rand(n, 1, generator=generator) * 10
+    target_yaw_rate = torch.randn(n, 1, generator=generator)
+    return lambda: controller(state, target_thrust, target_yaw_rate=target_yaw_rate)
+
+
+def rate(n: int, generator: torch.Generator) -> Callable:
+    controller = RateController(9.81, load_params("hummingbird"))
+    state = random_state(n, generator)
+    target_rate = torch.randn(n, 3, generator=generator)
+    target_thrust = torch.rand(n, 1, generator=generator) * 10
+    return lambda: controller(state, target_rate=target_rate, target_thrust=target_thrust)
+
+
+def dsl_pid(n: int, generator: torch.Generator) -> Callable:
+    controller = DSLPIDControl((n,), 9.81, 0.01)
+    controller_state = controller.init_state()
+    state = random_state(n, generator)
+    target_pos = state[:, :3] + 0.1
+    zeros = torch.zeros(n, 3)
+    return lambda: controller.step(controller_state, state, target_pos, zeros, zeros, zeros)
+
+
+def dsl_pid_controller(n: int, generator: torch.Generator) -> Callable:
+    from tensordict import TensorDict
+    controller = DSLPIDController(0.01, 9.81, load_params("crazyflie"))
+    state = random_state(n, generator)
+    control_target = torch.cat([state[:, :3] + 0.1, torch.zeros(n, 4)], dim=-1)
+    _, controller_state = controller(state, control_target, TensorDict({}, [n]))
+    return lambda: controller(state, control_target, controller_state)
+
+
+def rotor_group(n: int, generator: torch.Generator) -> Callable:
+    rotors = RotorGroup(load_params("hummingbird")["rotor_configuration"], dt=0.016)
+    # per-drone rotor parameters, as `MultirotorBase` expands them
+    for name, param in list(rotors.named_parameters()):
+        setattr(rotors, name, nn.Parameter(param.expand(n, -1).clone(), requires_grad=False))
+    cmds = torch.rand(n, rotors.num_rotors, generator=generator) * 2 - 1
+    return lambda: rotors(cmds)
+
+
+CASES: Dict[str, Callable[[int, torch.Generator], Callable]] = {
+    "lee_position": lee_position,
+    "attitude": attitude,
+    "rate": rate,
+    "dsl_pid": dsl_pid,
+    "dsl_pid_controller": dsl_pid_controller,
+    "rotor_group": rotor_group,
+}
@@ -0,0 +1,36 @@
+"""Diffs two reports of `benchmarks/controllers` and flags regressions."""
+
+import json
+from typing import List
+
+
+def load(path: str):
+    with open(path) as f:
+        report = json.load(f)
+    return {(r["case"], r["batch"]): r for r in report["results"]}
+
+
+def compare(baseline: str, candidate: str, threshold: float = 0.1) -> List[str]:
+    """Prints the relative change of each metric and returns the regressions:
+    mean or p99 latency more than `threshold` slower, or more allocations."""
+    old, new = load(baseline), load(candidate)
+    regressions = []
+    header = f"{'case':>20} {'batch':>8} | {'mean':>8} {'p99':>8} {'allocs':>11}"
+    print(header)
+    print("-" * len(header))
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        changes = {m: b[m] / a[m] - 1 for m in ("mean_us", "p99_us") if a[m] > 0}
+        flags = [m for m, c in changes.items() if c > threshold]
+        allocs = ""
+        if "allocs" in a and "allocs" in b:
+            allocs = f"{a['allocs']:>4} -> {b['allocs']:<4}"
+            if b["allocs"] > a["allocs"]:
+                flags.append("allocs")
+        row = " ".join(f"{changes.get(m, float('nan')):+8.1%}" for m in ("mean_us", "p99_us"))
+        print(f"{key[0]:>20} {key[1]:>8} | {row} {allocs:>11}" + ("  REGRESSION: " + ", ".join(flags) if flags else ""))
+        if flags:
+            regressions.append(f"{key[0]}[{key[1]}]: {', '.join(flags)}")
+    for key in sorted(old.keys() - new.keys()):
+        print(f"{key[0]:>20} {key[1]:>8} | missing in {candidate}")
+    return regressions
@@ -0,0 +1,56 @@
+"""Latency, throughput and allocation measurements of a single step."""
+
+import math
+import time
+from typing import Callable, Dict
+
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+
+def count_allocations(step: Callable) -> Dict[str, int]:
+    """Counts the CPU allocations of one call of `step` as recorded by the
+    profiler: explicit ``[memory]`` allocation events plus every op that
+    allocated memory itself."""
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        step()
+    count, nbytes = 0, 0
+    for event in prof.events():
+        usage = event.cpu_memory_usage if event.name == "[memory]" else event.self_cpu_memory_usage
+        if usage > 0:
+            count += 1
+            nbytes += usage
+    return {"allocs": count, "alloc_bytes": nbytes}
+
+
+def measure(
+    step: Callable,
+    batch_size: int,
+    min_iters: int = 5,
+    max_iters: int = 200,
+    min_time: float = 1.0,
+    warmup: int = 3,
+    allocations: bool = True,
+) -> Dict[str, float]:
+    """Times `step` for at least `min_iters` calls and `min_time` seconds (up to
+    `max_iters` calls) and returns the mean and p99 latency in microseconds and
+    the throughput in drones per second."""
+    for _ in range(warmup):
+        step()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_iters and (len(samples) < min_iters or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        step()
+        samples.append(time.perf_counter() - t0)
+    samples = torch.tensor(samples, dtype=torch.float64)
+    mean = samples.mean().item()
+    result = {
+        "iters": len(samples),
+        "mean_us": mean * 1e6,
+        "p99_us": torch.quantile(samples, 0.99).item() * 1e6,
+        "throughput": batch_size / mean if mean > 0 else math.inf,
+    }
+    if allocations:
+        result.update(count_allocations(step))
+    return result
@@ -0,0 +1,91 @@
+"""
+PPO rollout throughput and iteration time with the critic evaluated at every
+rollout step versus `algo.defer_values=true`, where the rollout runs only the
+actor and `train_op` evaluates the critic over the whole rollout at once. The
+environment is a stand-in that returns random observations, so the rollout
+FPS is that of the policy alone.
+
+    python benchmarks/deferred_values.py --device cuda --envs 4096 --steps 32
+"""
+
+import argparse
+import time
+
+import torch
+from omegaconf import OmegaConf
+from tensordict import TensorDict
+from torchrl.data import CompositeSpec, UnboundedContinuousTensorSpec
+
+from omni_drones.learning.ppo.config import PPOConfig
+from omni_drones.learning.ppo.ppo import PPOPolicy
+
+
+def make_policy(defer_values, envs, obs_dim, action_dim, device):
+    cfg = OmegaConf.structured(PPOConfig(defer_values=defer_values))
+    observation_spec = CompositeSpec({
+        "agents": CompositeSpec({"observation": UnboundedContinuousTensorSpec((envs, 1, obs_dim))}, shape=[envs])
+    }, shape=[envs]).to(device)
+    action_spec = UnboundedContinuousTensorSpec((envs, 1, action_dim), device=device)
+    reward_spec = UnboundedContinuousTensorSpec((envs, 1, 1), device=device)
+    torch.manual_seed(0)
+    return PPOPolicy(cfg, observation_spec, action_spec, reward_spec, device)
+
+
+def rollout(policy, envs, steps, obs_dim, device):
+    observation = torch.randn(envs, 1, obs_dim, device=device)
+    data = []
+    for _ in range(steps):
+        td = TensorDict({"agents": {"observation": observation}}, [envs], device=device)
+        with torch.no_grad():
+            policy(td)
+        if "sample_log_prob" not in td.keys():
+            # the name of the log-prob key of `ProbabilisticActor` differs across torchrl versions
+            td["sample_log_prob"] = td[("agents", "action_log_prob")]
+        observation = torch.randn(envs, 1, obs_dim, device=device)
+        td["next"] = TensorDict({
+            "agents": {"observation": observation, "reward": torch.randn(envs, 1, 1, device=device)},
+            "terminated": torch.rand(envs, 1, device=device) < 0.01,
+        }, [envs])
+        data.append(td)
+    return torch.stack(data, dim=1)
+
+
+def sync(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--envs", type=int, default=1024)
+    parser.add_argument("--steps", type=int, default=32)
+    parser.add_argument("--obs_dim", type=int, default=32)
+    parser.add_argument("--action_dim", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'defer_values':>12} {'rollout FPS':>12} {'rollout (s)':>12} {'train_op (s)':>13} {'iteration (s)':>14}")
+    for defer_values in (False, True):
+        policy = make_policy(defer_values, args.envs, args.obs_dim, args.action_dim, args.device)
+        rollout_time = train_time = 0.
+        for i in range(args.iterations + 1):
+            sync(args.device)
+            t0 = time.perf_counter()
+            data = rollout(policy, args.envs, args.steps, args.obs_dim, args.device)
+            sync(args.device)
+            t1 = time.perf_counter()
+            policy.train_op(data)
+            sync(args.device)
+            t2 = time.perf_counter()
+            if i > 0: # warm-up
+                rollout_time += t1 - t0
+                train_time += t2 - t1
+        rollout_time /= args.iterations
+        train_time /= args.iterations
+        fps = args.envs * args.steps / rollout_time
+        print(f"{str(defer_values):>12} {fps:>12.0f} {rollout_time:>12.3f} {train_time:>13.3f} {rollout_time + train_time:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
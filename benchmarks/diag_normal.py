@@ -0,0 +1,91 @@
+"""
+Per-call latency of the action distribution of the continuous PPO policies:
+`IndependentNormal` (`D.Independent(D.Normal)`) versus the closed-form
+`DiagNormal`, for a rollout step (sample + log_prob), an update step
+(log_prob + entropy, forward and backward), and a full `ProbabilisticActor`
+call on a TensorDict.
+
+    python benchmarks/diag_normal.py --device cuda --batch 256 4096 65536
+"""
+
+import argparse
+
+import torch
+import torch.nn as nn
+from tensordict import TensorDict
+from tensordict.nn import TensorDictModule
+from torch.utils.benchmark import Timer
+from torchrl.modules import ProbabilisticActor
+
+from omni_drones.learning.modules.distributions import DiagNormal, IndependentNormal
+
+
+def rollout_step(cls, loc, scale):
+    with torch.no_grad():
+        dist = cls(loc, scale)
+        action = dist.sample()
+        return dist.log_prob(action)
+
+
+def update_step(cls, loc, scale, action):
+    dist = cls(loc, scale)
+    loss = dist.log_prob(action).mean() + dist.entropy().mean()
+    loss.backward()
+
+
+class Head(nn.Module):
+    def __init__(self, action_dim):
+        super().__init__()
+        self.log_std = nn.Parameter(torch.zeros(action_dim))
+
+    def forward(self, loc):
+        return loc, self.log_std.exp().expand_as(loc)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch", type=int, nargs="+", default=[256, 4096, 65536])
+    parser.add_argument("--action_dim", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'call':>8} {'IndependentNormal (us)':>23} {'DiagNormal (us)':>16} {'speedup':>8}")
+    for size in args.batch:
+        loc = torch.randn(size, args.action_dim, device=args.device, requires_grad=True)
+        scale = torch.rand(size, args.action_dim, device=args.device).add(0.1).requires_grad_()
+        action = torch.randn(size, args.action_dim, device=args.device)
+
+        expected, actual = IndependentNormal(loc, scale), DiagNormal(loc, scale)
+        assert torch.allclose(expected.log_prob(action), actual.log_prob(action), atol=1e-5)
+        assert torch.allclose(expected.entropy(), actual.entropy(), atol=1e-5)
+
+        actors = {
+            cls: ProbabilisticActor(
+                TensorDictModule(Head(args.action_dim), ["loc"], ["loc", "scale"]),
+                in_keys=["loc", "scale"],
+                out_keys=["action"],
+                distribution_class=cls,
+                return_log_prob=True,
+            ).to(args.device)
+            for cls in (IndependentNormal, DiagNormal)
+        }
+        td = TensorDict({"loc": loc.detach()}, [size], device=args.device)
+
+        calls = {
+            "rollout": "rollout_step(cls, loc, scale)",
+            "update": "update_step(cls, loc, scale, action)",
+            "actor": "with torch.no_grad(): actor(td.clone(False))",
+        }
+        for name, stmt in calls.items():
+            results = []
+            for cls in (IndependentNormal, DiagNormal):
+                globals = {
+                    "rollout_step": rollout_step, "update_step": update_step, "torch": torch, "cls": cls,
+                    "loc": loc, "scale": scale, "action": action, "actor": actors[cls], "td": td,
+                }
+                results.append(Timer(stmt, globals=globals).blocked_autorange(min_run_time=1.).median * 1e6)
+            print(f"{size:>6} {name:>8} {results[0]:>23.1f} {results[1]:>16.1f} {results[0] / results[1]:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Timings for the batched formation costs in `omni_drones.utils.formation`
+against the previous per-env `vmap` implementation.
+
+    python benchmarks/formation_cost.py --device cuda
+"""
+
+import argparse
+import itertools
+
+import torch
+from torch.utils.benchmark import Timer
+
+from omni_drones.utils.formation import (
+    cost_formation_auction,
+    cost_formation_hausdorff,
+    cost_formation_sinkhorn,
+    sample_from_grid,
+)
+from omni_drones.utils.torch import make_cells
+
+
+@torch.vmap
+def _hausdorff_vmap(p: torch.Tensor, desired_p: torch.Tensor):
+    p = p - p.mean(-2, keepdim=True)
+    desired_p = desired_p - desired_p.mean(-2, keepdim=True)
+    d_pq = torch.cdist(p, desired_p).min(-1).values.max(-1).values
+    d_qp = torch.cdist(desired_p, p).min(-1).values.max(-1).values
+    return torch.max(d_pq, d_qp).unsqueeze(-1)
+
+
+def _sample_vmap(cells: torch.Tensor, n: int):
+    idx = torch.randperm(cells.shape[0], device=cells.device)[:n]
+    return cells[idx]
+
+
+def timeit(stmt: str, **globals) -> float:
+    try:
+        measurement = Timer(stmt, globals=globals).blocked_autorange(min_run_time=0.5)
+    except RuntimeError:
+        # e.g. batching rules missing for the vmap baselines on older torch
+        return float("nan")
+    return measurement.median * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--drones", type=int, nargs="+", default=[5, 10, 20, 50])
+    parser.add_argument("--envs", type=int, nargs="+", default=[1024, 4096, 16384])
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    cells = make_cells([-2, -2, 0.5], [2, 2, 2], [0.5, 0.5, 0.25]).flatten(0, -2)
+    cells = cells.to(args.device)
+
+    header = (
+        f"{'drones':>6} {'envs':>6} | {'hd_vmap':>8} {'hd':>8} {'hd_chunk':>8} "
+        f"{'sinkhorn':>8} {'auction':>8} | {'grid_vmap':>9} {'grid':>8}  (ms)"
+    )
+    print(header)
+    print("-" * len(header))
+    for n, E in itertools.product(args.drones, args.envs):
+        p = torch.randn(E, n, 3, device=args.device)
+        desired_p = torch.randn(n, 3, device=args.device)
+        results = [
+            timeit("f(p, q.expand(p.shape[0], *q.shape))", f=_hausdorff_vmap, p=p, q=desired_p),
+            timeit("f(p, q)", f=cost_formation_hausdorff, p=p, q=desired_p),
+            timeit("f(p, q, chunk_size=c)", f=cost_formation_hausdorff, p=p, q=desired_p, c=args.chunk_size),
+            timeit("f(p, q)", f=cost_formation_sinkhorn, p=p, q=desired_p),
+            timeit("f(p, q)", f=cost_formation_auction, p=p, q=desired_p),
+        ]
+        if n <= cells.shape[0]:
+            sampler_vmap = torch.vmap(_sample_vmap, randomness="different")
+            results += [
+                timeit("f(c.expand(E, *c.shape), n=n)", f=sampler_vmap, c=cells, E=E, n=n),
+                timeit("f(c, n, E)", f=sample_from_grid, c=cells, E=E, n=n),
+            ]
+        row = " ".join(f"{r:8.3f}" for r in results[:5])
+        row_grid = " ".join(f"{r:8.3f}" for r in results[5:])
+        print(f"{n:>6} {E:>6} | {row} | {row_grid}")
+
+
+if __name__ == "__main__":
+    main()
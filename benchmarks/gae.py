@@ -0,0 +1,65 @@
+"""
+Latency of advantage estimation against the rollout length: the per-step
+Python loop the algorithms used before (`reference_gae`, kept here as the
+baseline) versus the blocked scan and the scripted loop of
+`omni_drones.learning.utils.gae`.
+
+    python benchmarks/gae.py --device cuda --envs 4096 --agents 4 --steps 32 128 512 1024
+"""
+
+import argparse
+
+import torch
+from torch.utils.benchmark import Timer
+
+from omni_drones.learning.utils.gae import gae
+
+
+def reference_gae(reward, terminated, value, next_value, gamma=0.99, lmbda=0.95):
+    num_steps = terminated.shape[1]
+    advantages = torch.zeros_like(reward)
+    not_done = 1 - terminated.float()
+    gae = 0
+    for step in reversed(range(num_steps)):
+        delta = reward[:, step] + gamma * next_value[:, step] * not_done[:, step] - value[:, step]
+        advantages[:, step] = gae = delta + (gamma * lmbda * not_done[:, step] * gae)
+    return advantages, advantages + value
+
+
+def timeit(stmt: str, **globals) -> float:
+    measurement = Timer(stmt, globals=globals).blocked_autorange(min_run_time=0.5)
+    return measurement.median * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--envs", type=int, default=4096)
+    parser.add_argument("--agents", type=int, default=1)
+    parser.add_argument("--steps", type=int, nargs="+", default=[32, 64, 128, 256, 512, 1024])
+    parser.add_argument("--block_size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'T':>6} {'loop (ms)':>10} {'scan (ms)':>10} {'scripted loop (ms)':>19} {'max err':>9}")
+    for T in args.steps:
+        shape = (args.envs, T, args.agents, 1)
+        reward = torch.randn(shape, device=args.device)
+        value = torch.randn(shape, device=args.device)
+        next_value = torch.randn(shape, device=args.device)
+        terminated = torch.rand(args.envs, T, 1, 1, device=args.device) < 0.01
+        # a per-env discount takes the scripted loop
+        gamma = torch.full((args.envs, 1, 1, 1), 0.99, device=args.device)
+
+        expected, _ = reference_gae(reward, terminated, value, next_value)
+        actual, _ = gae(reward, value, next_value, terminated, block_size=args.block_size)
+        error = (actual - expected).abs().max().item()
+        t_loop = timeit("reference_gae(r, d, v, nv)", reference_gae=reference_gae, r=reward, d=terminated, v=value, nv=next_value)
+        t_scan = timeit(
+            "gae(r, v, nv, d, block_size=b)", gae=gae, r=reward, d=terminated, v=value, nv=next_value, b=args.block_size
+        )
+        t_script = timeit("gae(r, v, nv, d, gamma=g)", gae=gae, r=reward, d=terminated, v=value, nv=next_value, g=gamma)
+        print(f"{T:>6} {t_loop:>10.2f} {t_scan:>10.2f} {t_script:>19.2f} {error:>9.1e}")
+
+
+if __name__ == "__main__":
+    main()
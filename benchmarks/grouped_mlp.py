@@ -0,0 +1,61 @@
+"""
+Forward + backward latency of non-shared per-agent MLPs against the number of
+agents: `vmap` over stacked functional parameters, as the non-shared actors and
+critics of MAPPO/HAPPO are computed, versus `GroupedMLP`, which holds each
+layer as a [num_agents, in, out] tensor and runs one `torch.baddbmm` per layer.
+
+    python benchmarks/grouped_mlp.py --device cuda --batch 4096 --agents 2 4 8 16 32
+"""
+
+import argparse
+
+import torch
+import torch.nn as nn
+from torch.func import functional_call, stack_module_state
+from torch.utils.benchmark import Timer
+
+from omni_drones.learning.modules.networks import MLP, GroupedMLP
+
+
+def make_vmapped(mlps):
+    params, buffers = stack_module_state(mlps)
+    base = mlps[0]
+    call = lambda p, b, x: functional_call(base, (p, b), (x,))
+    # agents are the second to last dimension of the input, as in MAPPO
+    return params, torch.vmap(lambda p, b, x: call(p, b, x), in_dims=(0, 0, -2), out_dims=-2), buffers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch", type=int, default=4096)
+    parser.add_argument("--agents", type=int, nargs="+", default=[2, 4, 8, 16, 32])
+    parser.add_argument("--num_units", type=int, nargs="+", default=[64, 256, 128, 128])
+    args = parser.parse_args()
+
+    print(f"{'agents':>6} {'vmap (ms)':>10} {'grouped (ms)':>13} {'speedup':>8} {'max error':>10}")
+    for n in args.agents:
+        torch.manual_seed(0)
+        mlps = [MLP(args.num_units, nn.LayerNorm).to(args.device) for _ in range(n)]
+        grouped = GroupedMLP.from_mlps(mlps)
+        params, vmapped, buffers = make_vmapped(mlps)
+        x = torch.randn(args.batch, n, args.num_units[0], device=args.device)
+
+        with torch.no_grad():
+            error = (vmapped(params, buffers, x) - grouped(x)).abs().max().item()
+
+        def vmap_step():
+            vmapped(params, buffers, x).sum().backward()
+
+        def grouped_step():
+            grouped(x).sum().backward()
+
+        results = []
+        for step in (vmap_step, grouped_step):
+            timer = Timer("step()", globals={"step": step})
+            results.append(timer.blocked_autorange(min_run_time=1.).median * 1e3)
+        print(f"{n:>6} {results[0]:>10.2f} {results[1]:>13.2f} {results[0] / results[1]:>7.2f}x {error:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
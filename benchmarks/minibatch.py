@@ -0,0 +1,108 @@
+"""
+Time per epoch and memory high-water mark of drawing PPO minibatches from a
+rollout: indexing the TensorDict with a fresh permutation per minibatch (the
+previous `make_batch`, kept here as the baseline) versus `MinibatchSampler`
+in its "gather" and "inplace" modes.
+
+Each variant runs in its own process so the peak resident memory (on CPU) or
+the peak allocated CUDA memory only reflects that variant; the reported
+figure is the peak above the memory held by the rollout itself.
+
+    python benchmarks/minibatch.py --device cuda --envs 4096 --steps 32 --minibatches 16
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import torch
+from tensordict import TensorDict
+
+from omni_drones.learning.utils.minibatch import MinibatchSampler
+
+
+def reference_make_batch(tensordict: TensorDict, num_minibatches: int):
+    tensordict = tensordict.reshape(-1)
+    perm = torch.randperm(
+        (tensordict.shape[0] // num_minibatches) * num_minibatches,
+        device=tensordict.device,
+    ).reshape(num_minibatches, -1)
+    for indices in perm:
+        yield tensordict[indices]
+
+
+def make_rollout(envs, steps, obs_dim, device):
+    shape = (envs, steps)
+    return TensorDict({
+        "agents": {
+            "observation": torch.randn(*shape, 1, obs_dim),
+            "action": torch.randn(*shape, 1, 4),
+        },
+        "next": {
+            "agents": {"observation": torch.randn(*shape, 1, obs_dim), "reward": torch.randn(*shape, 1, 1)},
+            "terminated": torch.zeros(*shape, 1, dtype=torch.bool),
+        },
+        "sample_log_prob": torch.randn(*shape, 1),
+        "state_value": torch.randn(*shape, 1, 1),
+        "adv": torch.randn(*shape, 1, 1),
+        "ret": torch.randn(*shape, 1, 1),
+    }, shape).to(device)
+
+
+def peak_bytes(device) -> int:
+    if device.startswith("cuda"):
+        return torch.cuda.max_memory_allocated()
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run(variant, args, queue):
+    torch.manual_seed(0)
+    rollout = make_rollout(args.envs, args.steps, args.obs_dim, args.device)
+    if args.device.startswith("cuda"):
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    baseline = peak_bytes(args.device)
+    if variant == "reference":
+        epochs = lambda: reference_make_batch(rollout, args.minibatches)
+    else:
+        sampler = MinibatchSampler(rollout, args.minibatches, mode=variant)
+        epochs = lambda: sampler
+
+    times = []
+    for epoch in range(args.epochs + 1):
+        start = time.perf_counter()
+        for minibatch in epochs():
+            # stands in for the update, touching every entry of the minibatch
+            sum(value.float().sum() for value in minibatch.values(True, True))
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        if epoch > 0: # the first epoch allocates the buffers
+            times.append(time.perf_counter() - start)
+    queue.put((variant, sum(times) / len(times), peak_bytes(args.device) - baseline))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--envs", type=int, default=4096)
+    parser.add_argument("--steps", type=int, default=32)
+    parser.add_argument("--obs_dim", type=int, default=64)
+    parser.add_argument("--minibatches", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=4)
+    args = parser.parse_args()
+
+    rollout_bytes = make_rollout(args.envs, args.steps, args.obs_dim, "cpu").bytes()
+    print(f"rollout: {args.envs} x {args.steps} steps, {rollout_bytes / 2**20:.1f} MiB")
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    for variant in ("reference", "gather", "inplace"):
+        process = ctx.Process(target=run, args=(variant, args, queue))
+        process.start()
+        variant, seconds, peak = queue.get()
+        process.join()
+        print(f"{variant:>10}: {seconds * 1e3:8.2f} ms/epoch  peak +{peak / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
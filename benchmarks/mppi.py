@@ -0,0 +1,63 @@
+"""
+Latency of one `MPPIController` step against the number of sampled command
+sequences and envs. Every env rolls out all its samples through
+`MultirotorDynamics` in the same batch, so the cost grows with
+envs x samples x horizon rather than with a per-env Python loop.
+
+    python benchmarks/mppi.py --device cuda --envs 1 64 1024 --samples 64 256 1024
+"""
+
+import argparse
+import os.path as osp
+
+import torch
+import yaml
+from torch.utils.benchmark import Timer
+
+from omni_drones.controllers import MPPIController, MultirotorDynamics
+
+ASSET_PATH = osp.join(osp.dirname(__file__), "..", "omni_drones", "robots", "assets")
+
+
+def timeit(stmt: str, **globals) -> float:
+    try:
+        measurement = Timer(stmt, globals=globals).blocked_autorange(min_run_time=0.5)
+    except RuntimeError:
+        return float("nan")
+    return measurement.median * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--drone_model", default="hummingbird")
+    parser.add_argument("--envs", type=int, nargs="+", default=[1, 64, 1024])
+    parser.add_argument("--samples", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--horizon", type=int, default=25)
+    parser.add_argument("--dt", type=float, default=0.016)
+    args = parser.parse_args()
+
+    with open(osp.join(ASSET_PATH, "usd", f"{args.drone_model}.yaml")) as f:
+        uav_params = yaml.safe_load(f)
+
+    header = f"{'envs':>6} {'samples':>7} {'horizon':>7} | {'step (ms)':>9} {'rollouts/s':>11}"
+    print(header)
+    print("-" * len(header))
+    for n in args.envs:
+        dynamics = MultirotorDynamics(uav_params, dt=args.dt).to(args.device)
+        # per-env masses, as sampled by domain randomization
+        dynamics.set_params(mass=dynamics.mass * (0.8 + 0.4 * torch.rand(n, device=args.device)))
+        root_state = torch.zeros(n, 13, device=args.device)
+        root_state[:, 2] = 1.
+        root_state[:, 3] = 1.
+        state = dynamics.init_state(root_state)
+        target_pos = torch.randn(n, 3, device=args.device)
+        for k in args.samples:
+            mppi = MPPIController(dynamics, horizon=args.horizon, num_samples=k)
+            plan = mppi.init_plan((n,))
+            ms = timeit("mppi(state, plan, target_pos=target_pos)", **locals())
+            print(f"{n:>6} {k:>7} {args.horizon:>7} | {ms:>9.3f} {n * k / ms * 1e3:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Latency of the multi-discrete action distribution against the number of
+action dimensions D: a list of `D.Categorical`, one per dimension, looped over
+for sample, `log_prob` and `entropy` (`ListMultiCategorical`, the previous
+implementation kept here as the baseline) versus `MultiCategorical` over one
+padded [*, D, K_max] logits tensor, both behind the linear layer of
+`MultiCategoricalModule`, for a rollout step (sample + log_prob) and an update
+step (log_prob + entropy, forward and backward).
+
+    python benchmarks/multi_categorical.py --device cuda --batch 4096 --dims 4 8 16 32 64
+"""
+
+import argparse
+
+import torch
+import torch.distributions as D
+from torch.utils.benchmark import Timer
+
+from omni_drones.learning.modules.distributions import MultiCategoricalModule
+
+
+class ListMultiCategorical:
+    def __init__(self, logits):
+        self.base_dists = [D.Categorical(logits=l) for l in logits]
+
+    def sample(self):
+        return torch.stack([dist.sample() for dist in self.base_dists], dim=-1)
+
+    def log_prob(self, value):
+        return torch.stack(
+            [dist.log_prob(v) for dist, v in zip(self.base_dists, value.unbind(-1))], dim=-1
+        ).sum(-1)
+
+    def entropy(self):
+        return torch.stack([dist.entropy() for dist in self.base_dists], dim=-1).sum(-1)
+
+
+def rollout_step(make_dist, x):
+    with torch.no_grad():
+        dist = make_dist(x)
+        action = dist.sample()
+        return dist.log_prob(action)
+
+
+def update_step(make_dist, x, action):
+    dist = make_dist(x)
+    loss = dist.log_prob(action).mean() + dist.entropy().mean()
+    loss.backward()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch", type=int, default=4096)
+    parser.add_argument("--dims", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--max_choices", type=int, default=8)
+    parser.add_argument("--hidden_dim", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'D':>4} {'call':>8} {'list (us)':>10} {'padded (us)':>12} {'speedup':>8}")
+    for d in args.dims:
+        torch.manual_seed(0)
+        sizes = torch.randint(2, args.max_choices + 1, (d,)).tolist()
+        head = MultiCategoricalModule(args.hidden_dim, sizes).to(args.device)
+        x = torch.randn(args.batch, args.hidden_dim, device=args.device)
+        make_dists = {
+            "list": lambda x: ListMultiCategorical(head.operator(x).split(sizes, dim=-1)),
+            "padded": head,
+        }
+        action = make_dists["list"](x).sample()
+
+        expected, actual = make_dists["list"](x), make_dists["padded"](x)
+        assert torch.allclose(expected.log_prob(action), actual.log_prob(action), atol=1e-4)
+        assert torch.allclose(expected.entropy(), actual.entropy(), atol=1e-4)
+
+        calls = {
+            "rollout": "rollout_step(make_dist, x)",
+            "update": "update_step(make_dist, x, action)",
+        }
+        for name, stmt in calls.items():
+            results = []
+            for make_dist in make_dists.values():
+                globals = {
+                    "rollout_step": rollout_step, "update_step": update_step,
+                    "make_dist": make_dist, "x": x, "action": action,
+                }
+                results.append(Timer(stmt, globals=globals).blocked_autorange(min_run_time=1.).median * 1e6)
+            print(f"{d:>4} {name:>8} {results[0]:>10.1f} {results[1]:>12.1f} {results[0] / results[1]:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
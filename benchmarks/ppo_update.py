@@ -0,0 +1,87 @@
+"""
+Per-minibatch latency of the PPO update (`PPOPolicy._update`): the eager
+TensorDict implementation versus `algo.compile=compile`, a `torch.compile`d
+loss over flat tensors with foreach gradient clipping and fused Adam. The
+"fused" column is the same update with the loss left uncompiled, i.e. what
+`algo.compile=compile` runs if compilation falls back to eager, so the gain of
+`torch.compile` itself is "fused" over "compiled". The benchmark fails if the
+compiled loss has fallen back.
+
+    python benchmarks/ppo_update.py --device cpu --minibatch 512 8192
+"""
+
+import argparse
+
+import torch
+from omegaconf import OmegaConf
+from tensordict import TensorDict
+from torch.utils.benchmark import Timer
+from torchrl.data import CompositeSpec, UnboundedContinuousTensorSpec
+
+from omni_drones.learning.ppo.config import PPOConfig
+from omni_drones.learning.ppo.ppo import PPOPolicy
+
+
+def make_policy(compile, obs_dim, action_dim, device):
+    cfg = OmegaConf.structured(PPOConfig(compile=compile))
+    observation_spec = CompositeSpec({
+        "agents": CompositeSpec({"observation": UnboundedContinuousTensorSpec((1, obs_dim))})
+    }).to(device)
+    action_spec = UnboundedContinuousTensorSpec((1, action_dim), device=device)
+    reward_spec = UnboundedContinuousTensorSpec((1, 1), device=device)
+    return PPOPolicy(cfg, observation_spec, action_spec, reward_spec, device)
+
+
+def make_minibatch(policy, size, obs_dim, device):
+    minibatch = TensorDict({
+        "agents": {"observation": torch.randn(size, 1, obs_dim, device=device)},
+    }, [size])
+    with torch.no_grad():
+        policy(minibatch)
+        # sampled explicitly, the default interaction type and the name of the
+        # log-prob key of `ProbabilisticActor` differ across torchrl versions
+        dist = policy.actor.get_dist(minibatch)
+        action = dist.sample()
+        minibatch[("agents", "action")] = action
+        minibatch["sample_log_prob"] = dist.log_prob(action)
+    minibatch["adv"] = torch.randn(size, 1, 1, device=device)
+    minibatch["ret"] = torch.randn(size, 1, 1, device=device)
+    return minibatch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--minibatch", type=int, nargs="+", default=[512, 2048, 8192])
+    parser.add_argument("--obs_dim", type=int, default=32)
+    parser.add_argument("--action_dim", type=int, default=4)
+    args = parser.parse_args()
+
+    print(
+        f"{'minibatch':>10} {'eager (ms)':>11} {'fused (ms)':>11} {'compiled (ms)':>14}"
+        f" {'fused':>7} {'compiled':>9}  (speedup over eager)"
+    )
+    for size in args.minibatch:
+        results = []
+        for name in ("eager", "fused", "compiled"):
+            torch.manual_seed(0)
+            policy = make_policy("eager" if name == "eager" else "compile", args.obs_dim, args.action_dim, args.device)
+            if name == "fused":
+                policy._loss = policy._loss_fn
+            minibatch = make_minibatch(policy, size, args.obs_dim, args.device)
+            # the eager update writes its outputs into the minibatch, so give it a fresh container
+            for _ in range(3): # compilation and optimizer state
+                policy._update(minibatch.clone(False))
+            if name == "compiled" and not policy._loss.compiled:
+                raise RuntimeError("torch.compile fell back to eager, the compiled update did not run.")
+            timer = Timer("policy._update(minibatch.clone(False))", globals={"policy": policy, "minibatch": minibatch})
+            results.append(timer.blocked_autorange(min_run_time=1.).median * 1e3)
+        eager, fused, compiled = results
+        print(
+            f"{size:>10} {eager:>11.2f} {fused:>11.2f} {compiled:>14.2f}"
+            f" {eager / fused:>6.2f}x {eager / compiled:>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Forward + backward latency and activation memory (the tensors saved for the
+backward pass) of the relational encoders against the number of entities N:
+`RelationEncoder`, which builds the [N, N] pair tensors, versus the chunked
+`ChunkedRelationEncoder`, and `PartialAttentionEncoder` (all entities as
+queries) versus `SDPAttentionEncoder`.
+
+    python benchmarks/relation_encoder.py --device cuda --batch 64 --entities 4 16 64 256
+"""
+
+import argparse
+
+import torch
+from tensordict import TensorDict
+from torch.utils.benchmark import Timer
+from torchrl.data import CompositeSpec, UnboundedContinuousTensorSpec
+
+from omni_drones.learning.modules.networks import (
+    ChunkedRelationEncoder,
+    PartialAttentionEncoder,
+    RelationEncoder,
+    SDPAttentionEncoder,
+)
+
+
+def saved_bytes(fn):
+    total = 0
+    def pack(t):
+        nonlocal total
+        total += t.numel() * t.element_size()
+        return t
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+        fn()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--entities", type=int, nargs="+", default=[4, 16, 64, 128, 256])
+    parser.add_argument("--obs_dim", type=int, default=16)
+    parser.add_argument("--max_memory", type=float, default=2., help="GB, larger pair tensors are skipped")
+    args = parser.parse_args()
+
+    pairs = [
+        ("relation", RelationEncoder, ChunkedRelationEncoder, {}),
+        ("attention", PartialAttentionEncoder, SDPAttentionEncoder, {"query_index": None, "num_heads": 4}),
+    ]
+    print(f"{'encoder':>9} {'N':>4} {'time (ms)':>19} {'saved (MB)':>21} {'max error':>10}")
+    for name, cls, cls_fast, kwargs in pairs:
+        for n in args.entities:
+            spec = CompositeSpec({"entities": UnboundedContinuousTensorSpec((n, args.obs_dim))})
+            x = TensorDict({"entities": torch.randn(args.batch, n, args.obs_dim)}, [args.batch]).to(args.device)
+            torch.manual_seed(0)
+            fast = cls_fast(spec, **kwargs).to(args.device)
+            module = cls(spec, **kwargs).to(args.device)
+            module.load_state_dict(fast.state_dict())
+
+            # pair tensors of the input of g, the output of its linear layer and activation
+            too_large = name == "relation" and args.batch * n * n * 600 * 4 > args.max_memory * 2**30
+            times, saved = [], []
+            for m in ((fast,) if too_large else (module, fast)):
+                step = lambda: m(x).sum().backward()
+                saved.append(saved_bytes(step) / 2**20)
+                times.append(Timer("step()", globals={"step": step}).blocked_autorange(min_run_time=0.5).median * 1e3)
+            if too_large:
+                error = float("nan")
+                times.insert(0, float("nan"))
+                saved.insert(0, float("nan"))
+            else:
+                with torch.no_grad():
+                    error = (module(x) - fast(x)).abs().max().item()
+            print(
+                f"{name:>9} {n:>4} {times[0]:>9.2f} {times[1]:>9.2f} "
+                f"{saved[0]:>10.1f} {saved[1]:>10.1f} {error:>10.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
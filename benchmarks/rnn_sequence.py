@@ -0,0 +1,83 @@
+"""
+Forward + backward latency of the recurrent layers of `PPORNNPolicy` on a
+training minibatch: the per-step loop over `nn.GRUCell`/`nn.LSTMCell` that
+masks the hidden state at episode boundaries (`reference_rnn`, kept here as
+the baseline) versus `omni_drones.learning.modules.rnn.segment_rnn`, which
+packs the episode segments and runs the fused `nn.GRU`/`nn.LSTM` kernels
+(forced with `packed=True`, by default only CUDA tensors are packed).
+
+    python benchmarks/rnn_sequence.py --device cuda --sequences 4096 --seq_len 16 32 64
+"""
+
+import argparse
+
+import torch
+import torch.nn as nn
+from torch.utils.benchmark import Timer
+
+from omni_drones.learning.modules.rnn import segment_rnn
+
+
+def reference_rnn(cell, x, is_init, hx, cx=None):
+    mask = 1 - is_init.float().unsqueeze(-1)
+    output = []
+    for t in range(x.shape[1]):
+        if cx is None:
+            hx = cell(x[:, t], hx * mask[:, t])
+        else:
+            hx, cx = cell(x[:, t], (hx * mask[:, t], cx * mask[:, t]))
+        output.append(hx)
+    output = torch.stack(output, dim=1)
+    return (output, hx) if cx is None else (output, hx, cx)
+
+
+def cell_of(rnn):
+    cell = (nn.GRUCell if isinstance(rnn, nn.GRU) else nn.LSTMCell)(rnn.input_size, rnn.hidden_size)
+    for key in ("weight_ih", "weight_hh", "bias_ih", "bias_hh"):
+        getattr(cell, key).data.copy_(getattr(rnn, f"{key}_l0"))
+    return cell.to(rnn.weight_ih_l0.device)
+
+
+def forward_backward(fn, module, *args, **kwargs):
+    output, *_ = fn(module, *args, **kwargs)
+    output.sum().backward()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--sequences", type=int, default=1024)
+    parser.add_argument("--seq_len", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--hidden_size", type=int, default=128)
+    parser.add_argument("--episode_length", type=int, default=100, help="mean, for the episode boundaries")
+    args = parser.parse_args()
+
+    print(f"{'rnn':>5} {'seq_len':>8} {'loop (ms)':>10} {'packed (ms)':>12} {'speedup':>8} {'max error':>10}")
+    for name, cls in (("gru", nn.GRU), ("lstm", nn.LSTM)):
+        for T in args.seq_len:
+            torch.manual_seed(0)
+            rnn = cls(256, args.hidden_size, batch_first=True).to(args.device)
+            cell = cell_of(rnn)
+            x = torch.randn(args.sequences, T, 256, device=args.device)
+            is_init = torch.rand(args.sequences, T, device=args.device) < 1 / args.episode_length
+            state = [torch.randn(args.sequences, args.hidden_size, device=args.device)]
+            if cls is nn.LSTM:
+                state.append(torch.randn_like(state[0]))
+
+            expected = reference_rnn(cell, x, is_init, *state)
+            actual = segment_rnn(rnn, x, is_init, *state, packed=True)
+            error = max((a - e).abs().max().item() for a, e in zip(actual, expected))
+
+            results = []
+            for fn, module, kwargs in ((reference_rnn, cell, {}), (segment_rnn, rnn, {"packed": True})):
+                timer = Timer(
+                    "forward_backward(fn, module, x, is_init, *state, **kwargs)",
+                    globals={"forward_backward": forward_backward, "fn": fn, "module": module,
+                             "x": x, "is_init": is_init, "state": state, "kwargs": kwargs},
+                )
+                results.append(timer.blocked_autorange(min_run_time=1.).median * 1e3)
+            print(f"{name:>5} {T:>8} {results[0]:>10.2f} {results[1]:>12.2f} {results[0] / results[1]:>7.2f}x {error:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Ingest throughput and latency of state records pushed through a shared memory
+`ShmRing` by a fake vehicle process (`SharedMemoryVehicle`).
+
+For each producer rate (0 means free-running), the consumer drains the state
+ring in bulk for `--duration` seconds and records, per record, the time from
+the producer stamping it to the consumer having copied it out.
+
+    python benchmarks/shm_ring.py --rates 1000 10000 0 --capacity 4096
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from sim2real_omnidrones import LatencyHistogram, SharedMemoryVehicle, ShmRing, state_record
+
+
+def ingest(rate_hz, capacity, batch, duration, poll_us):
+    hist = LatencyHistogram(bin_us=1., max_us=20_000.)
+    with SharedMemoryVehicle(rate_hz=rate_hz or None, capacity=capacity) as vehicle:
+        ring = ShmRing(vehicle.names[0], state_record())
+        out = np.zeros(batch, ring.dtype)
+        timestamps = out["timestamp"]
+        # wait for the producer process to come up
+        while ring.stats()["written"] == 0:
+            time.sleep(0.01)
+        ring.drain(out)
+        start_stats = ring.stats()
+        start = time.perf_counter()
+        received = 0
+        while (now := time.perf_counter()) - start < duration:
+            n = ring.drain(out)
+            if n:
+                hist.record_many(time.monotonic() - timestamps[:n])
+                received += n
+            elif poll_us > 0:
+                time.sleep(poll_us * 1e-6)
+        elapsed = now - start
+        stats = ring.stats()
+        timestamps = out = None
+        ring.close()
+    return {
+        "rate_hz": rate_hz,
+        "received": received,
+        "records_per_s": received / elapsed,
+        "dropped": stats["dropped"] - start_stats["dropped"],
+        "latency": hist.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", type=float, nargs="+", default=[1000., 10000., 0.])
+    parser.add_argument("--capacity", type=int, default=4096)
+    parser.add_argument("--batch", type=int, default=1024, help="max records per drain")
+    parser.add_argument("--duration", type=float, default=3.)
+    parser.add_argument("--poll-us", type=float, default=0., help="sleep when the ring is empty, 0 to spin")
+    args = parser.parse_args()
+
+    for rate in args.rates:
+        result = ingest(rate, args.capacity, args.batch, args.duration, args.poll_us)
+        lat = result["latency"]
+        print(
+            f"{'free' if not rate else f'{rate:.0f} Hz':>9}: {result['records_per_s']:10.0f} records/s  "
+            f"dropped {result['dropped']:7d}  latency p50 {lat['p50_us']:6.1f}  "
+            f"p99 {lat['p99_us']:7.1f}  max {lat['max_us']:8.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
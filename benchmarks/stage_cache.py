@@ -0,0 +1,104 @@
+"""
+Cold vs. warm scene construction with `omni_drones.utils.stage_cache`.
+
+Runs on CPU with `usd-core` (no Isaac Sim). The template env references a
+robot asset and is cloned `num_envs` times with `Sdf.CopySpec`, as
+`GridCloner.clone` does with `replicate_physics=False`, on the same centered
+grid, so the template env is moved off the origin too. The warm path inserts
+the cached envs as a sublayer instead and is checked to put every env,
+including the template, where the cold path did. Both paths end with a full
+traversal so that composition cost is included.
+
+    python benchmarks/stage_cache.py --num_envs 256 1024 4096
+"""
+
+import argparse
+import math
+import os
+import tempfile
+import time
+
+from pxr import Gf, Sdf, Usd, UsdGeom
+
+from omni_drones.utils.stage_cache import StageCache, stage_cache_key
+
+ASSET_PATH = os.path.join(os.path.dirname(__file__), "..", "omni_drones", "robots", "assets")
+ENV_NS = "/World/envs"
+
+
+def design_scene(stage: Usd.Stage, usd_path: str, num_robots: int):
+    UsdGeom.Xform.Define(stage, f"{ENV_NS}/env_0")
+    for i in range(num_robots):
+        prim = stage.DefinePrim(f"{ENV_NS}/env_0/robot_{i}", "Xform")
+        prim.GetReferences().AddReference(usd_path)
+        UsdGeom.XformCommonAPI(prim).SetTranslate(Gf.Vec3d(0., i * 0.5, 1.))
+
+
+def grid_clone(stage: Usd.Stage, num_envs: int, spacing: float):
+    # the centered layout of `GridCloner.get_clone_transforms`
+    num_rows = math.ceil(math.sqrt(num_envs))
+    num_cols = math.ceil(num_envs / num_rows)
+    row_offset = 0.5 * spacing * (num_rows - 1)
+    col_offset = 0.5 * spacing * (num_cols - 1)
+    prim_paths = [f"{ENV_NS}/env_{i}" for i in range(num_envs)]
+    positions = [
+        (row_offset - (i // num_cols) * spacing, (i % num_cols) * spacing - col_offset, 0.)
+        for i in range(num_envs)
+    ]
+    layer = stage.GetRootLayer()
+    with Sdf.ChangeBlock():
+        for prim_path, position in zip(prim_paths[1:], positions[1:]):
+            Sdf.CopySpec(layer, prim_paths[0], layer, prim_path)
+    for prim_path, position in zip(prim_paths, positions):
+        UsdGeom.XformCommonAPI(stage.GetPrimAtPath(prim_path)).SetTranslate(Gf.Vec3d(*position))
+    return prim_paths, positions
+
+
+def build(cache: StageCache, args, num_envs: int):
+    start = time.perf_counter()
+    stage = Usd.Stage.CreateInMemory()
+    usd_path = os.path.abspath(os.path.join(ASSET_PATH, "usd", args.asset))
+    design_scene(stage, usd_path, args.num_robots)
+    key = stage_cache_key(
+        {"asset": args.asset, "num_robots": args.num_robots},
+        {"num_envs": num_envs, "spacing": args.spacing, "replicate_physics": False},
+        [ASSET_PATH],
+    )
+    envs_positions = cache.load(stage, key)
+    hit = envs_positions is not None
+    if not hit:
+        prim_paths, envs_positions = grid_clone(stage, num_envs, args.spacing)
+        cache.save(stage, key, prim_paths[1:], envs_positions, prim_paths[0])
+    num_prims = sum(1 for _ in stage.Traverse())
+    elapsed = time.perf_counter() - start
+    for i, position in enumerate(envs_positions):
+        prim = UsdGeom.Xformable(stage.GetPrimAtPath(f"{ENV_NS}/env_{i}"))
+        translate = prim.ComputeLocalToWorldTransform(Usd.TimeCode.Default()).ExtractTranslation()
+        assert Gf.IsClose(translate, Gf.Vec3d(*position), 1e-6), (i, translate, position)
+    return elapsed, hit, num_prims
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_envs", type=int, nargs="+", default=[256, 1024, 4096])
+    parser.add_argument("--num_robots", type=int, default=1)
+    parser.add_argument("--asset", type=str, default="cf2x_isaac.usd")
+    parser.add_argument("--spacing", type=float, default=8.)
+    parser.add_argument("--cache_dir", type=str, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = StageCache(args.cache_dir or tmp)
+        print(f"{'num_envs':>8} {'cold (s)':>9} {'warm (s)':>9} {'speedup':>8} {'prims':>8}")
+        for num_envs in args.num_envs:
+            cold, cold_hit, num_prims = build(cache, args, num_envs)
+            warm, warm_hit, num_prims_warm = build(cache, args, num_envs)
+            assert warm_hit and num_prims == num_prims_warm
+            print(
+                f"{num_envs:>8} {cold:>9.3f} {warm:>9.3f} {cold / warm:>7.1f}x {num_prims:>8}"
+                + (" (cold run hit an existing cache)" if cold_hit else "")
+            )
+
+
+if __name__ == "__main__":
+    main()
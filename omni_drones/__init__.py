@@ -23,14 +23,18 @@
 
 import os
 
-import torch
-from omni.isaac.kit import SimulationApp
-from tensordict import TensorDict
-
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), os.path.pardir, "cfg")
 
+# NOTE: Isaac Sim is only imported when the simulator is launched so that the
+# simulator-independent parts of the package (`utils`, `controllers`, `learning`,
+# `utils.torchrl`) can be imported by tests, worker processes and offline tools
+# on machines without Isaac Sim. Likewise, `tensordict` is only imported (and
+# patched) by the simulator-facing code. Use `python -m omni_drones.importtime`
+# to check the import cost of these modules.
+
 
 def init_simulation_app(cfg):
+    from omni.isaac.kit import SimulationApp
     # launch the simulator
     config = {"headless": cfg["headless"], "anti_aliasing": 1}
     # load cheaper kit config in headless
@@ -41,21 +45,27 @@ def init_simulation_app(cfg):
     app_experience = f"{os.environ['EXP_PATH']}/omni.isaac.sim.python.kit"
     simulation_app = SimulationApp(config, experience=app_experience)
     # simulation_app = SimulationApp(config)
+    patch_tensordict()
     return simulation_app
 
 
-def _get_shapes(self: TensorDict):
+def _get_shapes(self):
+    import torch
     return {
         k: v.shape if isinstance(v, torch.Tensor) else v.shapes for k, v in self.items()
     }
 
 
-def _get_devices(self: TensorDict):
+def _get_devices(self):
+    import torch
     return {
         k: v.device if isinstance(v, torch.Tensor) else v.devices
         for k, v in self.items()
     }
 
 
-TensorDict.shapes = property(_get_shapes)
-TensorDict.devices = property(_get_devices)
+def patch_tensordict():
+    """Adds the `shapes` and `devices` properties to `TensorDict`."""
+    from tensordict import TensorDict
+    TensorDict.shapes = property(_get_shapes)
+    TensorDict.devices = property(_get_devices)
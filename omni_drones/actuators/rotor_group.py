@@ -43,8 +43,11 @@ class RotorGroup(nn.Module):
         self.throttle = nn.Parameter(torch.zeros(self.num_rotors))
         self.directions = nn.Parameter(torch.as_tensor(rotor_config["directions"]).float())
 
-        self.tau_up = nn.Parameter(0.43 * torch.ones(self.num_rotors))
-        self.tau_down = nn.Parameter(0.43 * torch.ones(self.num_rotors))
+        # per-step throttle blending coefficients, e.g. as fitted by `scripts/sysid.py`
+        tau_up = torch.as_tensor(rotor_config.get("tau_up", 0.43)).float()
+        tau_down = torch.as_tensor(rotor_config.get("tau_down", 0.43)).float()
+        self.tau_up = nn.Parameter(tau_up.expand(self.num_rotors).clone())
+        self.tau_down = nn.Parameter(tau_down.expand(self.num_rotors).clone())
 
         self.f = torch.square
         self.f_inv = torch.sqrt
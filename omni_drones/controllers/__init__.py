@@ -27,3 +27,5 @@ from .lee_position_controller import (
     AttitudeController,
     RateController
 )
+from .dynamics import MultirotorDynamics
+from .mppi import MPPIController, tracking_cost, sphere_obstacle_cost
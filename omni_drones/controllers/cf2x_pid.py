@@ -21,15 +21,26 @@
 # SOFTWARE.
 
 
+from typing import Tuple
+
 import torch
-import torch.nn as nn
 from tensordict import TensorDict
 
-from .utils import normalize, quaternion_to_euler, quaternion_to_rotation_matrix
+from omni_drones.utils.torch import maybe_compile, quaternion_to_euler, quaternion_to_rotation_matrix
 
 
 class DSLPIDControl:
-    def __init__(self, size, gravity, dt, device="cpu") -> None:
+    """
+    The PID controller of gym-pybullet-drones, batched over `size`.
+
+    :meth:`step` is pure: the controller state (the last attitude and the
+    integral errors) is passed in and returned as a TensorDict, so that the
+    underlying :func:`compute_control` can be compiled with ``compile="compile"``
+    (`torch.compile`) or ``compile="script"`` (TorchScript). Compilation falls
+    back to eager execution if it fails. :meth:`compute_control` keeps the
+    state in `self.state` for convenience.
+    """
+    def __init__(self, size, gravity, dt, device="cpu", compile: str = "eager") -> None:
         self.device = device
         self.P_COEFF_FOR = torch.tensor([0.4, 0.4, 1.25], device=device)
         self.I_COEFF_FOR = torch.tensor([0.05, 0.05, 0.05], device=device)
@@ -57,39 +68,47 @@ class DSLPIDControl:
         )
         self.KF = 3.16e-10
         self.size = size
-        self.control_timestep = dt
-
-        self.last_pos_e = torch.zeros((*size, 3), device=self.device)
-        self.integral_pos_e = torch.zeros((*size, 3), device=self.device)
-        self.last_rpy = torch.zeros((*size, 3), device=self.device)
-        self.last_rpy_e = torch.zeros((*size, 3), device=self.device)
-        self.integral_rpy_e = torch.zeros((*size, 3), device=self.device)
+        self.control_timestep = float(dt)
+
+        self._compute_control = maybe_compile(compute_control, compile)
+        self.state = self.init_state()
+
+    def init_state(self, size=None) -> TensorDict:
+        size = self.size if size is None else size
+        zeros = torch.zeros((*size, 3), device=self.device)
+        return TensorDict(
+            {
+                "last_rpy": zeros,
+                "integral_pos_e": zeros.clone(),
+                "integral_rpy_e": zeros.clone(),
+            },
+            size,
+            device=self.device,
+        )
 
     def reset_idx(self, env_ids: torch.Tensor):
-        self.last_pos_e[env_ids] = 0
-        self.integral_pos_e[env_ids] = 0
-        self.last_rpy[env_ids] = 0
-        self.last_rpy_e[env_ids] = 0
-        self.integral_rpy_e[env_ids] = 0
-
-    def compute_control(
-        self, cur_state, target_pos, target_rpy, target_vel, target_rpy_rates
-    ):
-        (
-            rpms,
-            self.last_rpy[:],
-            self.integral_pos_e[:],
-            self.integral_rpy_e[:],
-        ) = compute_control(
+        for value in self.state.values():
+            value[env_ids] = 0
+
+    def step(
+        self,
+        controller_state: TensorDict,
+        cur_state: torch.Tensor,
+        target_pos: torch.Tensor,
+        target_rpy: torch.Tensor,
+        target_vel: torch.Tensor,
+        target_rpy_rates: torch.Tensor,
+    ) -> Tuple[torch.Tensor, TensorDict]:
+        rpms, last_rpy, integral_pos_e, integral_rpy_e = self._compute_control(
             self.control_timestep,
             cur_state,
             target_pos,
             target_rpy,
             target_vel,
             target_rpy_rates,
-            self.last_rpy,
-            self.integral_rpy_e,
-            self.integral_pos_e,
+            controller_state["last_rpy"],
+            controller_state["integral_rpy_e"],
+            controller_state["integral_pos_e"],
             self.MIXER_MATRIX,
             self.PWM2RPM_SCALE,
             self.PWM2RPM_CONST,
@@ -104,14 +123,29 @@ class DSLPIDControl:
             self.MAX_PWM,
             self.KF,
         )
-        rpms.nan_to_num_(0.0)
+        controller_state = TensorDict(
+            {
+                "last_rpy": last_rpy,
+                "integral_pos_e": integral_pos_e,
+                "integral_rpy_e": integral_rpy_e,
+            },
+            controller_state.batch_size,
+            device=controller_state.device,
+        )
+        return rpms.nan_to_num(0.0), controller_state
+
+    def compute_control(
+        self, cur_state, target_pos, target_rpy, target_vel, target_rpy_rates
+    ):
+        rpms, self.state = self.step(
+            self.state, cur_state, target_pos, target_rpy, target_vel, target_rpy_rates
+        )
         return rpms
 
 
 from torch import Tensor
 
-EPS = 1e-6
-# @torch.jit.script
+
 def compute_control(
     control_timestep: float,
     cur_state: Tensor,
@@ -123,8 +157,8 @@ def compute_control(
     integral_rpy_e: Tensor,
     integral_pos_e: Tensor,
     MIXER_MATRIX: Tensor,
-    PWM2RPM_SCALE: Tensor,
-    PWM2RPM_CONST: Tensor,
+    PWM2RPM_SCALE: float,
+    PWM2RPM_CONST: float,
     P_COEFF_FOR: Tensor,
     I_COEFF_FOR: Tensor,
     D_COEFF_FOR: Tensor,
@@ -135,7 +169,8 @@ def compute_control(
     MIN_PWM: float,
     MAX_PWM: float,
     KF: float,
-):
+) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    EPS = 1e-6
     # position control
     cur_pos, cur_quat, cur_vel, cur_angvel = torch.split(
         cur_state, [3, 4, 3, 3], dim=cur_state.dim() - 1
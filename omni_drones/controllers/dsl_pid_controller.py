@@ -21,15 +21,106 @@
 # SOFTWARE.
 
 
+from typing import Tuple
+
 import torch
 import torch.nn as nn
-from tensordict import TensorDict
 
-from omni_drones.utils.torch import normalize, quaternion_to_euler, quaternion_to_rotation_matrix
+from omni_drones.utils.torch import (
+    maybe_compile,
+    normalize,
+    quaternion_to_euler,
+    quaternion_to_rotation_matrix,
+)
+
+
+def dsl_pid_control(
+    state: torch.Tensor,
+    control_target: torch.Tensor,
+    integral_pos_error: torch.Tensor,
+    integral_rpy_error: torch.Tensor,
+    last_rpy: torch.Tensor,
+    P_COEFF_FOR: torch.Tensor,
+    I_COEFF_FOR: torch.Tensor,
+    D_COEFF_FOR: torch.Tensor,
+    P_COEFF_TOR: torch.Tensor,
+    I_COEFF_TOR: torch.Tensor,
+    D_COEFF_TOR: torch.Tensor,
+    GRAVITY: torch.Tensor,
+    MIXER_MATRIX: torch.Tensor,
+    dt: float,
+    KF: float,
+    PWM2RPM_SCALE: float,
+    PWM2RPM_CONST: float,
+    MAX_RPM: float,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """A pure, batched step of :class:`DSLPIDController`. Returns the rotor commands
+    and the new integral position error, integral rpy error and last rpy."""
+    # parsing input
+    pos, quat, vel, angvel = torch.split(state, [3, 4, 3, 3], dim=-1)
+    target_pos, target_vel, target_yaw = torch.split(control_target, [3, 3, 1], dim=-1)
+    rpy = quaternion_to_euler(quat)
+    rot = quaternion_to_rotation_matrix(quat)
+
+    # position control
+    pos_error = target_pos - pos
+    vel_error = target_vel - vel
+    integral_pos_error = torch.clip(integral_pos_error + pos_error * dt, -2, 2)
+
+    target_thrust = (
+        P_COEFF_FOR * pos_error
+        + I_COEFF_FOR * integral_pos_error
+        + D_COEFF_FOR * vel_error
+        + GRAVITY
+    )
+    scalar_thrust = (target_thrust * rot[..., :, 2]).sum(-1, keepdim=True)
+
+    # attitute control
+    target_x_c = torch.cat(
+        [torch.cos(target_yaw), torch.sin(target_yaw), torch.zeros_like(target_yaw)], dim=-1
+    )
+    target_z_ax = normalize(target_thrust)
+    target_y_ax = normalize(torch.cross(target_z_ax, target_x_c, dim=-1))
+    target_x_ax = torch.cross(target_y_ax, target_z_ax, dim=-1)
+    target_rot = torch.stack([target_x_ax, target_y_ax, target_z_ax], dim=-1)
+    rot_matrix_error = target_rot.transpose(-2, -1) @ rot - rot.transpose(-2, -1) @ target_rot
+    rot_error = torch.stack(
+        [rot_matrix_error[..., 2, 1], rot_matrix_error[..., 0, 2], rot_matrix_error[..., 1, 0]],
+        dim=-1
+    )
+    rpy_rates_error = -(rpy - last_rpy) / dt
+    integral_rpy_error = integral_rpy_error - rot_error * dt
+    target_torque = (
+        -P_COEFF_TOR * rot_error
+        + D_COEFF_TOR * rpy_rates_error
+        + I_COEFF_TOR * integral_rpy_error
+    )
+
+    thrust = (
+        torch.sqrt(scalar_thrust / (4 * KF)) - PWM2RPM_CONST
+    ) / PWM2RPM_SCALE
+    pwm = torch.clip(thrust + (MIXER_MATRIX @ target_torque.unsqueeze(-1)).squeeze(-1), 0, 65535)
+    rpms = PWM2RPM_SCALE * pwm + PWM2RPM_CONST
+    cmd = torch.square(rpms / MAX_RPM) * 2 - 1
+    return cmd, integral_pos_error, integral_rpy_error, rpy
 
 
 class DSLPIDController(nn.Module):
-    def __init__(self, dt: float, g: float, uav_params) -> None:
+    """
+    The PID controller of gym-pybullet-drones for the Crazyflie.
+
+    The controller is stateless: the integral errors and the last attitude are
+    passed in and returned as a TensorDict, which is empty at the first step.
+    This makes a step a pure function of its inputs, so it can be compiled by
+    passing ``compile="compile"`` (`torch.compile`) or ``compile="script"``
+    (TorchScript), with a fallback to eager execution if compilation fails.
+
+    Examples:
+        >>> controller = DSLPIDController(dt, 9.81, drone.params, compile="compile")
+        >>> controller_state = TensorDict({}, drone.shape)
+        >>> cmd, controller_state = controller(root_state, control_target, controller_state)
+    """
+    def __init__(self, dt: float, g: float, uav_params, compile: str = "eager") -> None:
         super().__init__()
         self.P_COEFF_FOR = nn.Parameter(torch.tensor([0.4, 0.4, 1.25]))
         self.I_COEFF_FOR = nn.Parameter(torch.tensor([0.05, 0.05, 0.05]))
@@ -57,75 +148,52 @@ class DSLPIDController(nn.Module):
             )
         )
         self.KF = 3.16e-10
-        self.dt = dt
-        self.MAX_RPM = 21714
+        self.dt = float(dt)
+        self.MAX_RPM = 21714.
         for p in self.parameters():
             p.requires_grad_(False)
+        self._control = maybe_compile(dsl_pid_control, compile)
 
     def forward(
         self,
         state: torch.Tensor,
         control_target: torch.Tensor,
-        controller_state: TensorDict,
+        controller_state: "TensorDict",
     ):
-        # parsing input
-        pos, quat, vel, angvel = torch.split(state, [3, 4, 3, 3])
-        target_pos, target_vel, target_yaw = torch.split(control_target, [3, 3, 1])
-        rpy = quaternion_to_euler(quat)
-        rot = quaternion_to_rotation_matrix(quat)
-        integral_pos_error = controller_state.get(
-            "integral_pos_error", torch.zeros_like(pos)
-        )
-        integral_rpy_error = controller_state.get(
-            "integral_rpy_error", torch.zeros_like(rpy)
-        )
-        last_rpy = controller_state.get("last_rpy", rpy)
-
-        # position control
-        pos_error = target_pos - pos
-        vel_error = target_vel - vel
-        integral_pos_error = torch.clip(integral_pos_error + pos_error * self.dt, -2, 2)
-
-        target_thrust = (
-            self.P_COEFF_FOR * pos_error
-            + self.I_COEFF_FOR * integral_pos_error
-            + self.D_COEFF_FOR * vel_error
-            + self.GRAVITY
-        )
-        scalar_thrust = target_thrust @ rot[:, 2]
+        # loaded on first use, it is the bulk of the import time of `controllers`
+        from tensordict import TensorDict
 
-        # attitute control
-        target_x_c = torch.cat(
-            [torch.cos(target_yaw), torch.sin(target_yaw), torch.zeros_like(target_yaw)]
+        batch_shape = state.shape[:-1]
+        rpy = None
+        if "last_rpy" not in controller_state.keys():
+            rpy = quaternion_to_euler(state[..., 3:7])
+        zeros = torch.zeros(*batch_shape, 3, device=state.device)
+        cmd, integral_pos_error, integral_rpy_error, last_rpy = self._control(
+            state,
+            control_target,
+            controller_state.get("integral_pos_error", zeros),
+            controller_state.get("integral_rpy_error", zeros),
+            controller_state.get("last_rpy", rpy),
+            self.P_COEFF_FOR,
+            self.I_COEFF_FOR,
+            self.D_COEFF_FOR,
+            self.P_COEFF_TOR,
+            self.I_COEFF_TOR,
+            self.D_COEFF_TOR,
+            self.GRAVITY,
+            self.MIXER_MATRIX,
+            self.dt,
+            self.KF,
+            self.PWM2RPM_SCALE,
+            self.PWM2RPM_CONST,
+            self.MAX_RPM,
         )
-        target_z_ax = normalize(target_thrust)
-        target_y_ax = normalize(torch.cross(target_z_ax, target_x_c))
-        target_x_ax = torch.cross(target_y_ax, target_z_ax)
-        target_rot = torch.stack([target_x_ax, target_y_ax, target_z_ax], dim=-1)
-        rot_matrix_error = target_rot.T @ rot - rot.T @ target_rot
-        rot_error = torch.stack(
-            [rot_matrix_error[2, 1], rot_matrix_error[0, 2], rot_matrix_error[1, 0]]
-        )
-        rpy_rates_error = -(rpy - last_rpy) / self.dt
-        integral_rpy_error = integral_rpy_error - rot_error * self.dt
-        target_torque = (
-            -self.P_COEFF_TOR * rot_error
-            + self.D_COEFF_TOR * rpy_rates_error
-            + self.I_COEFF_TOR * integral_rpy_error
-        )
-
-        thrust = (
-            torch.sqrt(scalar_thrust / (4 * self.KF)) - self.PWM2RPM_CONST
-        ) / self.PWM2RPM_SCALE
-        pwm = torch.clip(thrust + self.MIXER_MATRIX @ target_torque, 0, 65535)
-        rpms = self.PWM2RPM_SCALE * pwm + self.PWM2RPM_CONST
-        cmd = torch.square(rpms / self.MAX_RPM) * 2 - 1
-
-        controller_state.update(
+        controller_state = TensorDict(
             {
                 "integral_pos_error": integral_pos_error,
-                "integral_rpy_error": integral_pos_error,
-                "last_rpy": rpy,
-            }
+                "integral_rpy_error": integral_rpy_error,
+                "last_rpy": last_rpy,
+            },
+            batch_shape,
         )
         return cmd, controller_state
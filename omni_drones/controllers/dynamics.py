@@ -0,0 +1,219 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import torch
+import torch.nn as nn
+from typing import Dict
+
+from .lee_position_controller import _align
+
+
+def quat_to_matrix(q: torch.Tensor) -> torch.Tensor:
+    """Rotation matrices of shape [*, 3, 3] for unit quaternions (w, x, y, z) of shape [*, 4]."""
+    w, x, y, z = q.unbind(-1)
+    return torch.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+        2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+        2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y),
+    ], dim=-1).unflatten(-1, (3, 3))
+
+
+def quat_integrate(q: torch.Tensor, ang_vel_b: torch.Tensor, dt: float) -> torch.Tensor:
+    """Integrates a body angular velocity over `dt` with a first-order exponential map."""
+    w, x, y, z = q.unbind(-1)
+    p, r, s = (ang_vel_b * (0.5 * dt)).unbind(-1)
+    q = torch.stack([
+        w - x * p - y * r - z * s,
+        x + w * p + y * s - z * r,
+        y + w * r + z * p - x * s,
+        z + w * s + x * r - y * p,
+    ], dim=-1)
+    return q / q.norm(dim=-1, keepdim=True)
+
+
+class MultirotorDynamics(nn.Module):
+    """
+    A batched, differentiable torch model of `MultirotorBase`: a rigid body
+    driven by a `RotorGroup` (first-order throttle lag, `f=square` thrust curve)
+    with linear drag, integrated with semi-implicit Euler.
+
+    The state is a tensor of shape [*, 13 + num_rotors] containing position,
+    rotation (quaternion, wxyz), linear and angular velocity in the world frame
+    (the layout of `root_state[..., :13]`), followed by the rotor throttles.
+    Actions are rotor commands in [-1, 1], as passed to `MultirotorBase.apply_action`.
+
+    Like the controllers, all parameters can be replaced by per-env (or
+    per-sample) tensors with :meth:`set_params`, and parameters of shape
+    [*E, *event] are aligned with the leading dims of the state, which is also
+    how many parameter sets can be evaluated at once, e.g., for system
+    identification with `torch.func.functional_call`.
+
+    Examples:
+        >>> dynamics = MultirotorDynamics(drone.params, dt=0.016)
+        >>> dynamics.set_params(mass=drone.masses.squeeze(-1))
+        >>> state = dynamics.init_state(root_state[..., :13])
+        >>> next_state = dynamics(state, actions)
+    """
+
+    def __init__(
+        self,
+        uav_params,
+        dt: float,
+        g: float = 9.81,
+        substeps: int = 1,
+        max_ang_vel: float = 100.,
+    ):
+        super().__init__()
+        rotor_config = uav_params["rotor_configuration"]
+        inertia = uav_params["inertia"]
+        force_constants = torch.as_tensor(rotor_config["force_constants"])
+        moment_constants = torch.as_tensor(rotor_config["moment_constants"])
+        max_rot_vels = torch.as_tensor(rotor_config["max_rotation_velocities"]).float()
+        rotor_angles = torch.as_tensor(rotor_config["rotor_angles"]).float()
+        arm_lengths = torch.as_tensor(rotor_config["arm_lengths"]).float()
+        self.num_rotors = len(force_constants)
+        self.dt = dt
+        self.substeps = substeps
+        # PhysX clamps the angular velocity of rigid bodies (100 rad/s by default),
+        # which also keeps the explicit integration of small airframes stable
+        self.max_ang_vel = max_ang_vel
+
+        self.mass = nn.Parameter(torch.tensor(float(uav_params["mass"])))
+        self.inertia = nn.Parameter(torch.tensor([inertia["xx"], inertia["yy"], inertia["zz"]]).float())
+        # linear drag, the force is `-drag_coef * mass * vel`
+        self.drag_coef = nn.Parameter(torch.tensor(float(uav_params.get("drag_coef", 0.))))
+        self.g = nn.Parameter(torch.tensor(float(g)))
+        # the same parameterization as `RotorGroup`
+        self.KF = nn.Parameter(max_rot_vels.square() * force_constants)
+        self.KM = nn.Parameter(max_rot_vels.square() * moment_constants)
+        self.tau_up = nn.Parameter(torch.as_tensor(rotor_config.get("tau_up", 0.43)).float().expand(self.num_rotors).clone())
+        self.tau_down = nn.Parameter(torch.as_tensor(rotor_config.get("tau_down", 0.43)).float().expand(self.num_rotors).clone())
+        self.directions = nn.Parameter(torch.as_tensor(rotor_config["directions"]).float())
+        self.rotor_pos = nn.Parameter(torch.stack([
+            torch.cos(rotor_angles) * arm_lengths,
+            torch.sin(rotor_angles) * arm_lengths,
+            torch.zeros_like(arm_lengths),
+        ], dim=-1))
+
+        self.requires_grad_(False)
+        self._event_dims: Dict[str, int] = {
+            name: param.dim() for name, param in self.named_parameters()
+        }
+
+    def get_param(self, name: str, batch_ndim: int) -> torch.Tensor:
+        return _align(getattr(self, name), self._event_dims[name], batch_ndim)
+
+    def set_params(self, **params: torch.Tensor):
+        """Replaces the given parameters, which can be batched, e.g., `mass` of
+        shape [*E], `inertia` (the diagonal) of shape [*E, 3] or `KF` of shape
+        [*E, num_rotors]. To differentiate with respect to the parameters, pass
+        them to `torch.func.functional_call` instead."""
+        device = self.KF.device
+        for name, value in params.items():
+            if name not in self._event_dims:
+                raise KeyError(f"{self.__class__.__name__} has no parameter {name}.")
+            value = torch.as_tensor(value, device=device).float()
+            setattr(self, name, nn.Parameter(value, requires_grad=False))
+
+    def hover_throttle(self) -> torch.Tensor:
+        """The throttle at which the rotors balance gravity, of shape [*E, 1]."""
+        weight = (self.mass * self.g).unsqueeze(-1)
+        return (weight / self.KF.sum(-1, keepdim=True)).sqrt()
+
+    def hover_action(self) -> torch.Tensor:
+        """The rotor command that keeps the vehicle hovering at steady state, of shape [*E, 1]."""
+        return self.hover_throttle().square() * 2 - 1
+
+    def init_state(self, root_state: torch.Tensor, throttle: torch.Tensor = None) -> torch.Tensor:
+        """Appends the rotor throttles (hover throttle by default) to a [*, 13] root state."""
+        if throttle is None:
+            hover = _align(self.hover_throttle(), 1, root_state.dim() - 1)
+            throttle = hover.expand(*root_state.shape[:-1], self.num_rotors)
+        return torch.cat([root_state, throttle], dim=-1)
+
+    def get_state(self, state: torch.Tensor) -> torch.Tensor:
+        """The observation layout of `MultirotorBase.get_state` (without force
+        sensors): position, rotation, velocities, heading, up and throttle * 2 - 1."""
+        rot = state[..., 3:7]
+        R = quat_to_matrix(rot)
+        return torch.cat([
+            state[..., :13], R[..., 0], R[..., 2], state[..., 13:] * 2 - 1
+        ], dim=-1)
+
+    def rotors(self, throttle: torch.Tensor, cmds: torch.Tensor, batch_ndim: int):
+        """One step of `RotorGroup`. Returns the new throttle, thrusts and moments."""
+        target = torch.clamp((cmds + 1) / 2, 1e-6, 1).sqrt()
+        tau_up = self.get_param("tau_up", batch_ndim)
+        tau_down = self.get_param("tau_down", batch_ndim)
+        tau = torch.where(target > throttle, tau_up, tau_down).clamp(0, 1)
+        throttle = throttle + tau * (target - throttle)
+        t = throttle.square().clamp(0, 1)
+        thrusts = t * self.get_param("KF", batch_ndim)
+        moments = t * self.get_param("KM", batch_ndim) * -self.get_param("directions", batch_ndim)
+        return throttle, thrusts, moments
+
+    def forward(self, state: torch.Tensor, cmds: torch.Tensor) -> torch.Tensor:
+        """Advances `state` of shape [*, 13 + num_rotors] by `dt` under rotor commands of shape [*, num_rotors]."""
+        batch_ndim = state.dim() - 1
+        pos, rot, vel, ang_vel, throttle = state.split([3, 4, 3, 3, self.num_rotors], dim=-1)
+        throttle, thrusts, moments = self.rotors(throttle, cmds, batch_ndim)
+
+        mass = self.get_param("mass", batch_ndim).unsqueeze(-1)
+        inertia = self.get_param("inertia", batch_ndim)
+        drag_coef = self.get_param("drag_coef", batch_ndim).unsqueeze(-1)
+        g = self.get_param("g", batch_ndim)
+        rotor_pos = self.get_param("rotor_pos", batch_ndim)
+
+        thrust = thrusts.sum(-1, keepdim=True)
+        # r x (0, 0, f) = (r_y f, -r_x f, 0)
+        torque = torch.cat([
+            (rotor_pos[..., 1] * thrusts).sum(-1, keepdim=True),
+            -(rotor_pos[..., 0] * thrusts).sum(-1, keepdim=True),
+            moments.sum(-1, keepdim=True),
+        ], dim=-1)
+
+        dt = self.dt / self.substeps
+        for _ in range(self.substeps):
+            R = quat_to_matrix(rot)
+            acc = R[..., 2] * (thrust / mass) - drag_coef * vel
+            acc = torch.cat([acc[..., :2], acc[..., 2:] - g.unsqueeze(-1)], dim=-1)
+            ang_vel_b = (R.transpose(-1, -2) @ ang_vel.unsqueeze(-1)).squeeze(-1)
+            ang_acc_b = (torque - torch.cross(ang_vel_b, inertia * ang_vel_b, dim=-1)) / inertia
+            ang_vel_b = ang_vel_b + ang_acc_b * dt
+            ang_speed = (ang_vel_b.square().sum(-1, keepdim=True) + 1e-12).sqrt()
+            ang_vel_b = ang_vel_b * (self.max_ang_vel / ang_speed).clamp(max=1.)
+            vel = vel + acc * dt
+            pos = pos + vel * dt
+            rot = quat_integrate(rot, ang_vel_b, dt)
+            ang_vel = (quat_to_matrix(rot) @ ang_vel_b.unsqueeze(-1)).squeeze(-1)
+
+        return torch.cat([pos, rot, vel, ang_vel, throttle], dim=-1)
+
+    def rollout(self, state: torch.Tensor, cmds: torch.Tensor) -> torch.Tensor:
+        """Rolls out command sequences of shape [*, T, num_rotors] from `state` of
+        shape [*, 13 + num_rotors]. Returns the visited states of shape [*, T, 13 + num_rotors]."""
+        states = []
+        for t in range(cmds.shape[-2]):
+            state = self(state, cmds[..., t, :])
+            states.append(state)
+        return torch.stack(states, dim=-2)
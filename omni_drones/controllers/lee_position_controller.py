@@ -23,7 +23,6 @@
 
 import torch
 import torch.nn as nn
-from tensordict import TensorDict
 
 from omni_drones.utils.torch import (
     quat_mul,
@@ -36,12 +35,17 @@ from omni_drones.utils.torch import (
 )
 import yaml
 import os.path as osp
+from typing import Dict
 
 
 def compute_parameters(
     rotor_config,
     inertia_matrix,
 ):
+    """Computes the mixer that maps angular accelerations and collective thrust
+    to rotor thrusts. `inertia_matrix` may be batched, i.e., of shape [*E, 4, 4],
+    in which case the mixer is of shape [*E, num_rotors, 4].
+    """
     rotor_angles = torch.as_tensor(rotor_config["rotor_angles"])
     arm_lengths = torch.as_tensor(rotor_config["arm_lengths"])
     force_constants = torch.as_tensor(rotor_config["force_constants"])
@@ -54,27 +58,118 @@ def compute_parameters(
             -torch.cos(rotor_angles) * arm_lengths,
             -directions * moment_constants / force_constants,
             torch.ones_like(rotor_angles),
-        ]
+        ],
+        dim=-2
     )
-    mixer = A.T @ (A @ A.T).inverse() @ inertia_matrix
+    A_T = A.transpose(-2, -1)
+    mixer = A_T @ (A @ A_T).inverse() @ inertia_matrix.to(A.dtype)
 
     return mixer
 
-class LeePositionController(nn.Module):
+
+def _align(param: torch.Tensor, event_dim: int, batch_ndim: int) -> torch.Tensor:
+    """Views a parameter of shape [*E, *event] as [*E, 1, ..., 1, *event] so that
+    it broadcasts against inputs with `batch_ndim` leading batch dims."""
+    param_ndim = param.dim() - event_dim
+    if param_ndim == 0:
+        return param
+    if param_ndim > batch_ndim:
+        raise ValueError(
+            f"Parameter of shape {tuple(param.shape)} has more batch dims than the input ({batch_ndim})."
+        )
+    shape = param.shape[:param_ndim] + (1,) * (batch_ndim - param_ndim) + param.shape[param_ndim:]
+    return param.reshape(shape)
+
+
+class _BatchedController(nn.Module):
+    """
+    Base class of the controllers below. All parameters may be replaced by
+    per-env (or per-drone) tensors with :meth:`set_params`, e.g., to follow the
+    masses and inertias sampled by domain randomization. Parameters of shape
+    [*E, *event] are aligned with the leading dims of the inputs, so that a
+    controller with parameters of shape [num_envs, ...] can be called with a
+    state of shape [num_envs, num_drones, 13] directly, without `torch.vmap`.
+
+    Examples:
+        >>> controller = LeePositionController(9.81, drone.params)
+        >>> controller.set_params(mass=drone.masses.squeeze(-1), inertia=drone.inertias)
+        >>> cmds = controller(drone_state[..., :13], target_vel=target_vel)
+    """
+
+    # the parameters that are scaled by the inverse of the inertia
+    INERTIA_SCALED = ()
+
+    def _init_rotor_params(self, uav_params):
+        self._unscaled_gains = []
+        rotor_config = uav_params["rotor_configuration"]
+        inertia = uav_params["inertia"]
+        force_constants = torch.as_tensor(rotor_config["force_constants"])
+        max_rot_vel = torch.as_tensor(rotor_config["max_rotation_velocities"])
+
+        self.rotor_config = rotor_config
+        self.max_thrusts = nn.Parameter(max_rot_vel.square() * force_constants)
+        I = torch.diag_embed(
+            torch.tensor([inertia["xx"], inertia["yy"], inertia["zz"], 1])
+        )
+        self.mixer = nn.Parameter(compute_parameters(rotor_config, I))
+        return I
+
+    def _scale_by_inertia(self, gain, I: torch.Tensor) -> nn.Parameter:
+        gain = torch.as_tensor(gain).float()
+        self._unscaled_gains.append(gain)
+        return nn.Parameter(gain @ I[:3, :3].inverse())
+
+    def _freeze(self):
+        self.requires_grad_(False)
+        # number of trailing (non-batch) dims of each parameter
+        self._event_dims: Dict[str, int] = {
+            name: param.dim() for name, param in self.named_parameters()
+        }
+
+    def get_param(self, name: str, batch_ndim: int) -> torch.Tensor:
+        return _align(getattr(self, name), self._event_dims[name], batch_ndim)
+
+    def set_params(self, inertia: torch.Tensor=None, **params: torch.Tensor):
+        """Replaces the given parameters, which can be batched.
+
+        Args:
+            inertia: the diagonal of the inertia matrix of shape [*E, 3]. If given,
+                the mixer and the inertia-scaled gains are recomputed.
+            **params: any of the parameters of the controller, e.g., `mass` of
+                shape [*E] or `mixer` of shape [*E, num_rotors, 4].
+        """
+        device = self.mixer.device
+        if inertia is not None:
+            inertia = torch.as_tensor(inertia, device=device).float()
+            I = torch.diag_embed(torch.cat([inertia, torch.ones_like(inertia[..., :1])], dim=-1))
+            params.setdefault("mixer", compute_parameters(self.rotor_config, I.cpu()).to(device))
+            for name, gain in zip(self.INERTIA_SCALED, self._unscaled_gains):
+                params.setdefault(name, gain.to(device) / inertia)
+        for name, value in params.items():
+            if name not in self._event_dims:
+                raise KeyError(f"{self.__class__.__name__} has no parameter {name}.")
+            value = torch.as_tensor(value, device=device).float()
+            setattr(self, name, nn.Parameter(value, requires_grad=False))
+
+
+class LeePositionController(_BatchedController):
     """
     Computes rotor commands for the given control target using the controller
     described in https://arxiv.org/abs/1003.2005.
 
     Inputs:
-        * root_state: tensor of shape (13,) containing position, rotation (in quaternion),
+        * root_state: tensor of shape (*, 13) containing position, rotation (in quaternion),
         linear velocity, and angular velocity.
-        * control_target: tensor of shape (7,) contining target position, linear velocity,
+        * control_target: tensor of shape (*, 7) contining target position, linear velocity,
         and yaw angle.
     
     Outputs:
-        * cmd: tensor of shape (num_rotors,) containing the computed rotor commands.
+        * cmd: tensor of shape (*, num_rotors) containing the computed rotor commands.
         * controller_state: empty dict.
     """
+
+    INERTIA_SCALED = ("attitute_gain", "ang_rate_gain")
+
     def __init__(
         self, 
         g: float, 
@@ -92,25 +187,10 @@ class LeePositionController(nn.Module):
         self.mass = nn.Parameter(torch.tensor(uav_params["mass"]))
         self.g = nn.Parameter(torch.tensor([0.0, 0.0, g]).abs())
 
-        rotor_config = uav_params["rotor_configuration"]
-        inertia = uav_params["inertia"]
-
-        force_constants = torch.as_tensor(rotor_config["force_constants"])
-        max_rot_vel = torch.as_tensor(rotor_config["max_rotation_velocities"])
-
-        self.max_thrusts = nn.Parameter(max_rot_vel.square() * force_constants)
-        
-        I = torch.diag_embed(
-            torch.tensor([inertia["xx"], inertia["yy"], inertia["zz"], 1])
-        )
-        self.mixer = nn.Parameter(compute_parameters(rotor_config, I))
-        self.attitute_gain = nn.Parameter(
-            torch.as_tensor(controller_params["attitude_gain"]).float() @ I[:3, :3].inverse()
-        )
-        self.ang_rate_gain = nn.Parameter(
-            torch.as_tensor(controller_params["angular_rate_gain"]).float() @ I[:3, :3].inverse()
-        )
-        self.requires_grad_(False)
+        I = self._init_rotor_params(uav_params)
+        self.attitute_gain = self._scale_by_inertia(controller_params["attitude_gain"], I)
+        self.ang_rate_gain = self._scale_by_inertia(controller_params["angular_rate_gain"], I)
+        self._freeze()
 
     def forward(
         self, 
@@ -136,24 +216,23 @@ class LeePositionController(nn.Module):
         else:
             target_acc = target_acc.expand(batch_shape+(3,))
         if target_yaw is None:
-            target_yaw = quaternion_to_euler(root_state[..., 3:7])[..., -1]
+            target_yaw = quaternion_to_euler(root_state[..., 3:7])[..., -1:]
         else:
             if not target_yaw.shape[-1] == 1:
                 target_yaw = target_yaw.unsqueeze(-1)
             target_yaw = target_yaw.expand(batch_shape+(1,))
         
-        cmd = self._compute(
-            root_state.reshape(-1, 13),
-            target_pos.reshape(-1, 3),
-            target_vel.reshape(-1, 3),
-            target_acc.reshape(-1, 3),
-            target_yaw.reshape(-1, 1),
+        return self._compute(
+            root_state,
+            target_pos,
+            target_vel,
+            target_acc,
+            target_yaw,
             body_rate
         )
-
-        return cmd.reshape(*batch_shape, -1)
     
     def _compute(self, root_state, target_pos, target_vel, target_acc, target_yaw, body_rate):
+        batch_ndim = root_state.dim() - 1
         pos, rot, vel, ang_vel = torch.split(root_state, [3, 4, 3, 3], dim=-1)
         if not body_rate:
             # convert angular velocity from world frame to body frame
@@ -163,9 +242,9 @@ class LeePositionController(nn.Module):
         vel_error = vel - target_vel
 
         acc = (
-            pos_error * self.pos_gain 
-            + vel_error * self.vel_gain 
-            - self.g
+            pos_error * self.get_param("pos_gain", batch_ndim)
+            + vel_error * self.get_param("vel_gain", batch_ndim)
+            - self.get_param("g", batch_ndim)
             - target_acc
         )
         R = quaternion_to_rotation_matrix(rot)
@@ -175,61 +254,53 @@ class LeePositionController(nn.Module):
             torch.zeros_like(target_yaw)
         ],dim=-1)
         b3_des = -normalize(acc)
-        b2_des = normalize(torch.cross(b3_des, b1_des, 1))
+        b2_des = normalize(torch.cross(b3_des, b1_des, dim=-1))
         R_des = torch.stack([
-            b2_des.cross(b3_des, 1), 
+            b2_des.cross(b3_des, dim=-1), 
             b2_des, 
             b3_des
         ], dim=-1)
         ang_error_matrix = 0.5 * (
-            torch.bmm(R_des.transpose(-2, -1), R) 
-            - torch.bmm(R.transpose(-2, -1), R_des)
+            R_des.transpose(-2, -1) @ R
+            - R.transpose(-2, -1) @ R_des
         )
         ang_error = torch.stack([
-            ang_error_matrix[:, 2, 1], 
-            ang_error_matrix[:, 0, 2], 
-            ang_error_matrix[:, 1, 0]
+            ang_error_matrix[..., 2, 1], 
+            ang_error_matrix[..., 0, 2], 
+            ang_error_matrix[..., 1, 0]
         ],dim=-1)
         ang_rate_err = ang_vel
         ang_acc = (
-            - ang_error * self.attitute_gain
-            - ang_rate_err * self.ang_rate_gain
-            + torch.cross(ang_vel, ang_vel)
+            - ang_error * self.get_param("attitute_gain", batch_ndim)
+            - ang_rate_err * self.get_param("ang_rate_gain", batch_ndim)
+            + torch.cross(ang_vel, ang_vel, dim=-1)
         )
-        thrust = (-self.mass * (acc * R[:, :, 2]).sum(-1, True))
+        mass = self.get_param("mass", batch_ndim).unsqueeze(-1)
+        thrust = (-mass * (acc * R[..., :, 2]).sum(-1, True))
         ang_acc_thrust = torch.cat([ang_acc, thrust], dim=-1)
-        cmd = (self.mixer @ ang_acc_thrust.T).T
-        cmd = (cmd / self.max_thrusts) * 2 - 1
+        cmd = (self.get_param("mixer", batch_ndim) @ ang_acc_thrust.unsqueeze(-1)).squeeze(-1)
+        cmd = (cmd / self.get_param("max_thrusts", batch_ndim)) * 2 - 1
         return cmd
 
     
-class AttitudeController(nn.Module):
+class AttitudeController(_BatchedController):
     r"""
     
     """
+
+    INERTIA_SCALED = ("gain_attitude", "gain_angular_rate")
+
     def __init__(self, g, uav_params):
         super().__init__()
-        rotor_config = uav_params["rotor_configuration"]
-        inertia = uav_params["inertia"]
-        force_constants = torch.as_tensor(rotor_config["force_constants"])
-        max_rot_vel = torch.as_tensor(rotor_config["max_rotation_velocities"])
-
         self.mass = nn.Parameter(torch.tensor(uav_params["mass"]))
         self.g = nn.Parameter(torch.tensor(g))
-        self.max_thrusts = nn.Parameter(max_rot_vel.square() * force_constants)
-        I = torch.diag_embed(
-            torch.tensor([inertia["xx"], inertia["yy"], inertia["zz"], 1])
-        )
+        I = self._init_rotor_params(uav_params)
 
 #torch.tensor([3., 3., 0.035]) @ I[:3, :3].inverse()
 #torch.tensor([0.52, 0.52, 0.025]) @ I[:3, :3].inverse()
-        self.mixer = nn.Parameter(compute_parameters(rotor_config, I))
-        self.gain_attitude = nn.Parameter(
-            torch.tensor([250., 500., 2.5]) @ I[:3, :3].inverse()
-        )
-        self.gain_angular_rate = nn.Parameter(
-            torch.tensor([120.0, 16.0, 0.]) @ I[:3, :3].inverse()
-        )
+        self.gain_attitude = self._scale_by_inertia([250., 500., 2.5], I)
+        self.gain_angular_rate = self._scale_by_inertia([120.0, 16.0, 0.], I)
+        self._freeze()
 
 
     def forward(
@@ -250,14 +321,13 @@ class AttitudeController(nn.Module):
         if target_roll is None:
             target_roll = torch.zeros(*batch_shape, 1, device=device)
         
-        cmd = self._compute(
-            root_state.reshape(-1, 13),
-            target_thrust.reshape(-1, 1),
-            target_yaw_rate=target_yaw_rate.reshape(-1, 1),
-            target_roll=target_roll.reshape(-1, 1),
-            target_pitch=target_pitch.reshape(-1, 1),
+        return self._compute(
+            root_state,
+            target_thrust.reshape(*batch_shape, 1),
+            target_yaw_rate=target_yaw_rate.reshape(*batch_shape, 1),
+            target_roll=target_roll.reshape(*batch_shape, 1),
+            target_pitch=target_pitch.reshape(*batch_shape, 1),
         )
-        return cmd.reshape(*batch_shape, -1)
 
     def _compute(
         self, 
@@ -267,60 +337,52 @@ class AttitudeController(nn.Module):
         target_roll: torch.Tensor,
         target_pitch: torch.Tensor
     ):
+        batch_ndim = root_state.dim() - 1
         pos, rot, vel, ang_vel = torch.split(root_state, [3, 4, 3, 3], dim=-1)
         device = pos.device
 
         R = quaternion_to_rotation_matrix(rot)
-        yaw = torch.atan2(R[:, 1, 0], R[:, 0, 0]).unsqueeze(-1)
+        yaw = torch.atan2(R[..., 1, 0], R[..., 0, 0]).unsqueeze(-1)
         yaw = axis_angle_to_matrix(yaw, torch.tensor([0., 0., 1.], device=device))
         roll = axis_angle_to_matrix(target_roll, torch.tensor([1., 0., 0.], device=device))
         pitch = axis_angle_to_matrix(target_pitch, torch.tensor([0., 1., 0.], device=device))
-        R_des = torch.bmm(torch.bmm(yaw,  roll), pitch)
+        R_des = yaw @ roll @ pitch
         angle_error_matrix = 0.5 * (
-            torch.bmm(R_des.transpose(-2, -1), R) 
-            - torch.bmm(R.transpose(-2, -1), R_des)
+            R_des.transpose(-2, -1) @ R
+            - R.transpose(-2, -1) @ R_des
         )
 
         angle_error = torch.stack([
-            angle_error_matrix[:, 2, 1], 
-            angle_error_matrix[:, 0, 2], 
-            torch.zeros(yaw.shape[0], device=device)
+            angle_error_matrix[..., 2, 1], 
+            angle_error_matrix[..., 0, 2], 
+            torch.zeros_like(angle_error_matrix[..., 0, 0])
         ], dim=-1)
 
         angular_rate_des = torch.zeros_like(ang_vel)
-        angular_rate_des[:, 2] = target_yaw_rate.squeeze(1)
-        angular_rate_error = ang_vel - torch.bmm(torch.bmm(R_des.transpose(-2, -1), R), angular_rate_des.unsqueeze(2)).squeeze(2)
+        angular_rate_des[..., 2] = target_yaw_rate.squeeze(-1)
+        angular_rate_error = ang_vel - (R_des.transpose(-2, -1) @ R @ angular_rate_des.unsqueeze(-1)).squeeze(-1)
 
         angular_acc = (
-            - angle_error * self.gain_attitude 
-            - angular_rate_error * self.gain_angular_rate 
-            + torch.cross(ang_vel, ang_vel)
+            - angle_error * self.get_param("gain_attitude", batch_ndim)
+            - angular_rate_error * self.get_param("gain_angular_rate", batch_ndim)
+            + torch.cross(ang_vel, ang_vel, dim=-1)
         )
-        angular_acc_thrust = torch.cat([angular_acc, target_thrust], dim=1)
-        cmd = (self.mixer @ angular_acc_thrust.T).T
-        cmd = (cmd / self.max_thrusts) * 2 - 1
+        angular_acc_thrust = torch.cat([angular_acc, target_thrust], dim=-1)
+        cmd = (self.get_param("mixer", batch_ndim) @ angular_acc_thrust.unsqueeze(-1)).squeeze(-1)
+        cmd = (cmd / self.get_param("max_thrusts", batch_ndim)) * 2 - 1
         return cmd
 
 
-class RateController(nn.Module):
+class RateController(_BatchedController):
+
+    INERTIA_SCALED = ("gain_angular_rate",)
 
     def __init__(self, g, uav_params) -> None:
         super().__init__()
-        rotor_config = uav_params["rotor_configuration"]
-        inertia = uav_params["inertia"]
-        force_constants = torch.as_tensor(rotor_config["force_constants"])
-        max_rot_vel = torch.as_tensor(rotor_config["max_rotation_velocities"])
-
         self.g = nn.Parameter(torch.tensor(g))
-        self.max_thrusts = nn.Parameter(max_rot_vel.square() * force_constants)
-        I = torch.diag_embed(
-            torch.tensor([inertia["xx"], inertia["yy"], inertia["zz"], 1])
-        )
-
-        self.mixer = nn.Parameter(compute_parameters(rotor_config, I))
-        self.gain_angular_rate = nn.Parameter(
-            torch.tensor([0.52, 0.52, 0.025]) @ I[:3, :3].inverse()
-        )
+        I = self._init_rotor_params(uav_params)
+        self.gain_angular_rate = self._scale_by_inertia([0.52, 0.52, 0.025], I)
+        self._freeze()
 
     
     def forward(
@@ -331,22 +393,18 @@ class RateController(nn.Module):
     ):
         assert root_state.shape[:-1] == target_rate.shape[:-1]
 
-        batch_shape = root_state.shape[:-1]
-        root_state = root_state.reshape(-1, 13)
-        target_rate = target_rate.reshape(-1, 3)
-        target_thrust = target_thrust.reshape(-1, 1)
+        batch_ndim = root_state.dim() - 1
+        target_thrust = target_thrust.reshape(*root_state.shape[:-1], 1)
 
-        pos, rot, linvel, angvel = root_state.split([3, 4, 3, 3], dim=1)
+        pos, rot, linvel, angvel = root_state.split([3, 4, 3, 3], dim=-1)
         body_rate = quat_rotate_inverse(rot, angvel)
 
         rate_error = body_rate - target_rate
         acc_des = (
-            - rate_error * self.gain_angular_rate
-            + angvel.cross(angvel)
+            - rate_error * self.get_param("gain_angular_rate", batch_ndim)
+            + angvel.cross(angvel, dim=-1)
         )
-        angacc_thrust = torch.cat([acc_des, target_thrust], dim=1)
-        cmd = (self.mixer @ angacc_thrust.T).T
-        cmd = (cmd / self.max_thrusts) * 2 - 1
-        cmd = cmd.reshape(*batch_shape, -1)
+        angacc_thrust = torch.cat([acc_des, target_thrust], dim=-1)
+        cmd = (self.get_param("mixer", batch_ndim) @ angacc_thrust.unsqueeze(-1)).squeeze(-1)
+        cmd = (cmd / self.get_param("max_thrusts", batch_ndim)) * 2 - 1
         return cmd
-
@@ -0,0 +1,185 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import torch
+import torch.nn as nn
+from typing import Callable, Optional, Tuple
+
+from .dynamics import MultirotorDynamics
+from .lee_position_controller import _align
+
+
+def tracking_cost(
+    states: torch.Tensor,
+    actions: torch.Tensor,
+    target_pos: torch.Tensor,
+    target_heading: Optional[torch.Tensor] = None,
+    pos_weight: float = 1.0,
+    vel_weight: float = 0.05,
+    up_weight: float = 0.2,
+    heading_weight: float = 0.1,
+    ang_vel_weight: float = 0.01,
+) -> torch.Tensor:
+    """
+    Quadratic tracking cost of rollouts, summed over the horizon.
+
+    Args:
+        states: [*E, K, T, 13 + num_rotors] rolled-out states.
+        actions: [*E, K, T, num_rotors] sampled commands.
+        target_pos: [*E, 3] or [*E, T, 3] (a reference trajectory) target positions.
+        target_heading: optional [*E, 3] or [*E, T, 3] target headings.
+
+    Returns:
+        costs of shape [*E, K].
+    """
+    if target_pos.dim() < states.dim() - 1:
+        target_pos = target_pos.unsqueeze(-2)
+    pos, rot, vel, ang_vel = states[..., :3], states[..., 3:7], states[..., 7:10], states[..., 10:13]
+    w, x, y, z = rot.unbind(-1)
+    up_z = 1 - 2 * (x * x + y * y)
+    cost = (
+        pos_weight * (pos - target_pos.unsqueeze(-3)).square().sum(-1)
+        + vel_weight * vel.square().sum(-1)
+        + up_weight * (1 - up_z)
+        + ang_vel_weight * ang_vel.square().sum(-1)
+    )
+    if target_heading is not None:
+        if target_heading.dim() < states.dim() - 1:
+            target_heading = target_heading.unsqueeze(-2)
+        heading = torch.stack([1 - 2 * (y * y + z * z), 2 * (x * y + w * z), 2 * (x * z - w * y)], dim=-1)
+        cost = cost + heading_weight * (heading - target_heading.unsqueeze(-3)).square().sum(-1)
+    return cost.sum(-1)
+
+
+def sphere_obstacle_cost(
+    states: torch.Tensor,
+    centers: torch.Tensor,
+    radii: torch.Tensor,
+    margin: float = 0.3,
+    weight: float = 100.0,
+) -> torch.Tensor:
+    """
+    Penalizes rollouts entering within `margin` of spherical obstacles, using
+    their signed distance function.
+
+    Args:
+        states: [*E, K, T, 13 + num_rotors] rolled-out states.
+        centers: [*E, M, 3] obstacle centers.
+        radii: [*E, M] obstacle radii.
+
+    Returns:
+        costs of shape [*E, K].
+    """
+    pos = states[..., :3].unsqueeze(-2)  # [*E, K, T, 1, 3]
+    centers = centers.unsqueeze(-3).unsqueeze(-3)  # [*E, 1, 1, M, 3]
+    sdf = (pos - centers).norm(dim=-1) - radii.unsqueeze(-2).unsqueeze(-2)
+    return weight * torch.relu(margin - sdf).square().sum((-1, -2))
+
+
+class MPPIController(nn.Module):
+    """
+    Model predictive path integral control (https://arxiv.org/abs/1707.02342)
+    on :class:`MultirotorDynamics`. For every env, `num_samples` perturbed
+    command sequences are rolled out through the model in one batch, weighted by
+    the exponentiated negative cost and averaged into the new plan. The plan is
+    returned shifted by one step to warm-start the next call.
+
+    The cost function is called as `cost_fn(states, actions, **cost_kwargs)`
+    with `states` of shape [*E, K, T, 13 + num_rotors] and `actions` of shape
+    [*E, K, T, num_rotors] and must return costs of shape [*E, K]. Per-env cost
+    parameters (targets, obstacles) are passed as keyword arguments to
+    :meth:`forward`, see :func:`tracking_cost` and :func:`sphere_obstacle_cost`.
+
+    Inputs:
+        * state: tensor of shape (*E, 13 + num_rotors) containing the root state
+        and the rotor throttles, e.g., `torch.cat([root_state[..., :13], drone.throttle], -1)`.
+        * plan: tensor of shape (*E, T, num_rotors), the plan returned by the last call.
+        If None, a hover plan is used.
+
+    Outputs:
+        * cmd: tensor of shape (*E, num_rotors) containing the rotor commands to apply.
+        * plan: tensor of shape (*E, T, num_rotors), the shifted plan for the next call.
+
+    Examples:
+        >>> mppi = MPPIController(MultirotorDynamics(drone.params, dt=env.dt))
+        >>> plan = None
+        >>> cmds, plan = mppi(state, plan, target_pos=target_pos)
+    """
+
+    def __init__(
+        self,
+        dynamics: MultirotorDynamics,
+        horizon: int = 25,
+        num_samples: int = 256,
+        noise_std: float = 0.2,
+        temperature: float = 0.1,
+        control_cost: float = 0.0,
+        cost_fn: Callable[..., torch.Tensor] = tracking_cost,
+    ):
+        super().__init__()
+        self.dynamics = dynamics
+        self.horizon = horizon
+        self.num_samples = num_samples
+        self.noise_std = noise_std
+        self.temperature = temperature
+        self.control_cost = control_cost
+        self.cost_fn = cost_fn
+
+    def init_plan(self, batch_shape: Tuple[int, ...]) -> torch.Tensor:
+        hover = _align(self.dynamics.hover_action(), 1, len(batch_shape)).unsqueeze(-2)
+        return hover.expand(*batch_shape, self.horizon, self.dynamics.num_rotors).clone()
+
+    @torch.no_grad()
+    def forward(
+        self,
+        state: torch.Tensor,
+        plan: Optional[torch.Tensor] = None,
+        **cost_kwargs: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        batch_shape = state.shape[:-1]
+        if plan is None:
+            plan = self.init_plan(batch_shape)
+
+        # [*E, K, T, num_rotors]
+        noise = torch.randn(
+            *batch_shape, self.num_samples, self.horizon, self.dynamics.num_rotors,
+            device=state.device
+        ) * self.noise_std
+        actions = (plan.unsqueeze(-3) + noise).clamp(-1, 1)
+        noise = actions - plan.unsqueeze(-3)
+
+        states = self.dynamics.rollout(
+            state.unsqueeze(-2).expand(*batch_shape, self.num_samples, state.shape[-1]),
+            actions,
+        )
+        cost = self.cost_fn(states, actions, **cost_kwargs)
+        if self.control_cost > 0:
+            cost = cost + self.control_cost * (plan.unsqueeze(-3) * noise).sum((-1, -2)) / self.noise_std ** 2
+
+        cost = cost - cost.min(-1, keepdim=True).values
+        weights = torch.softmax(-cost / self.temperature, dim=-1)
+        plan = (plan + (weights[..., None, None] * noise).sum(-3)).clamp(-1, 1)
+
+        cmd = plan[..., 0, :]
+        next_plan = torch.cat([plan[..., 1:, :], plan[..., -1:, :]], dim=-2)
+        return cmd, next_plan
@@ -20,24 +20,43 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-
-from .single import Hover, Track, TrackV1, HoverTo
-from .platform import PlatformHover, PlatformFlyThrough
-from .inv_pendulum import InvPendulumHover, InvPendulumFlyThrough
-from .transport import TransportHover, TransportFlyThrough, TransportTrack
-from .formation import Formation
-from .payload import PayloadTrack, PayloadFlyThrough
-from .gate import GateFlyThrough
-from .dragon import DragonHover
-from .rearrange import Rearrange
+from omni_drones.utils.registry import lazy_attributes
 from .isaac_env import IsaacEnv
 
-try:
-    from .pinball import Pinball
-    from .forest import Forest
-except ModuleNotFoundError:
-    print(
-        "To run the environments which use `ContactSensor` and `RayCaster`,"
-        "please install Isaac Orbit (https://github.com/NVIDIA-Omniverse/orbit)."
-    )
+# Tasks are registered by name and only imported when looked up in
+# `IsaacEnv.REGISTRY` (or accessed as attributes of this package), so that a
+# run does not pay for importing every task module.
+_TASKS = {
+    "Hover": "omni_drones.envs.single.hover",
+    "HoverTo": "omni_drones.envs.single.hover_to",
+    "Track": "omni_drones.envs.single.track",
+    "TrackV1": "omni_drones.envs.single.trackV1",
+    "FlyThrough": "omni_drones.envs.single.fly_through",
+    "SDFNav": "omni_drones.envs.single.nav",
+    "PlatformHover": "omni_drones.envs.platform.platform_hover",
+    "PlatformTrack": "omni_drones.envs.platform.platform_track",
+    "PlatformFlyThrough": "omni_drones.envs.platform.platform_fly_through",
+    "InvPendulumHover": "omni_drones.envs.inv_pendulum.inv_pendulum_hover",
+    "InvPendulumTrack": "omni_drones.envs.inv_pendulum.inv_pendulum_track",
+    "InvPendulumFlyThrough": "omni_drones.envs.inv_pendulum.inv_pendulum_fly_through",
+    "TransportHover": "omni_drones.envs.transport.transport_hover",
+    "TransportTrack": "omni_drones.envs.transport.transport_track",
+    "TransportFlyThrough": "omni_drones.envs.transport.transport_fly_through",
+    "Formation": "omni_drones.envs.formation",
+    "PayloadHover": "omni_drones.envs.payload.payload_hover",
+    "PayloadTrack": "omni_drones.envs.payload.payload_track",
+    "PayloadFlyThrough": "omni_drones.envs.payload.payload_fly_through",
+    "GateFlyThrough": "omni_drones.envs.gate.gate_fly_through",
+    "DragonHover": "omni_drones.envs.dragon.hover",
+    "Rearrange": "omni_drones.envs.rearrange",
+    # `Pinball` and `Forest` use `ContactSensor` and `RayCaster`, which require
+    # Isaac Orbit (https://github.com/NVIDIA-Omniverse/orbit).
+    "Pinball": "omni_drones.envs.pinball",
+    "Forest": "omni_drones.envs.forest",
+}
+
+for _name, _module in _TASKS.items():
+    IsaacEnv.REGISTRY.register_lazy(_name, f"{_module}:{_name}")
 
+__getattr__, __all__ = lazy_attributes(__name__, _TASKS)
+__all__ = ["IsaacEnv"] + __all__
@@ -21,6 +21,9 @@
 # SOFTWARE.
 
 
+import functools
+import logging
+
 import omni_drones.utils.kit as kit_utils
 import omni_drones.utils.scene as scene_utils
 import torch
@@ -28,6 +31,11 @@ import torch.distributions as D
 
 from omni_drones.envs.isaac_env import AgentSpec, IsaacEnv, List, Optional
 from omni_drones.utils.torch import cpos, off_diag, others, make_cells, euler_to_quaternion
+from omni_drones.utils.formation import (
+    FORMATION_COSTS,
+    cost_formation_hausdorff,
+    sample_from_grid,
+)
 from omni_drones.robots.drone import MultirotorBase
 from tensordict.tensordict import TensorDict, TensorDictBase
 from torchrl.data import CompositeSpec, UnboundedContinuousTensorSpec, DiscreteTensorSpec
@@ -55,9 +63,9 @@ FORMATIONS = {
     "tetragon": REGULAR_TETRAGON,
 }
 
-def sample_from_grid(cells: torch.Tensor, n):
-    idx = torch.randperm(cells.shape[0], device=cells.device)[:n]
-    return cells[idx]
+# with more drones, both assignment-based formation costs take well over 0.1 s
+# per step for 4096 envs (see the `formation_cost` config of `Formation`)
+MAX_ASSIGNMENT_DRONES = 10
 
 class Formation(IsaacEnv):
     """
@@ -70,7 +78,7 @@ class Formation(IsaacEnv):
 
     ## Reward
     
-    - `formation`: the negative of the formation cost.
+    - `formation`: the negative of the formation cost (see `formation_cost`).
     - `pos`: the negative of the distance to the target position.
     - `heading`: the negative of the heading error.
 
@@ -84,12 +92,45 @@ class Formation(IsaacEnv):
 
     ## Config 
 
+    - `formation_cost` (str): how the formation is scored, one of `"hausdorff"`
+      (default), `"sinkhorn"` or `"auction"`. The latter two match each drone
+      to a formation slot and measure the mean distance to the assigned slot.
+      They are meant for small formations like the built-in ones (5 and 7
+      drones): their cost grows superlinearly with the number of drones and a
+      warning is logged above 10. Per step on a single CPU core, measured with
+      `benchmarks/formation_cost.py` (ms, hausdorff / sinkhorn / auction):
+
+      | drones | 4096 envs          | 16384 envs          |
+      |--------|--------------------|---------------------|
+      | 5      | 3 / 34 / 115       | 9 / 122 / 308       |
+      | 10     | 6 / 101 / 368      | 23 / 327 / 1467     |
+      | 20     | 27 / 377 / 1758    | 95 / 2320 / 6992    |
+      | 50     | 89 / 3262 / 20870  | 482 / 12892 / 77673 |
+
+    - `cost_chunk_size` (int): if set, the Hausdorff cost is evaluated for at
+      most this many envs at a time to bound peak memory.
+
     """
     def __init__(self, cfg, headless):
         self.time_encoding = cfg.task.time_encoding
         self.safe_distance = cfg.task.safe_distance
+        formation_cost = cfg.task.get("formation_cost", "hausdorff")
+        if formation_cost not in FORMATION_COSTS:
+            raise ValueError(f"Unknown formation cost: {formation_cost}")
+        if formation_cost == "hausdorff":
+            self.cost_formation = functools.partial(
+                cost_formation_hausdorff,
+                chunk_size=cfg.task.get("cost_chunk_size", None),
+            )
+        else:
+            self.cost_formation = FORMATION_COSTS[formation_cost]
 
         super().__init__(cfg, headless)
+        if formation_cost != "hausdorff" and self.drone.n > MAX_ASSIGNMENT_DRONES:
+            logging.warning(
+                f"The {formation_cost} formation cost is slow for {self.drone.n} drones, "
+                "consider the hausdorff cost."
+            )
 
         self.drone.initialize()
         self.init_poses = self.drone.get_world_poses(clone=True)
@@ -198,18 +239,17 @@ class Formation(IsaacEnv):
     def _reset_idx(self, env_ids: torch.Tensor):
         self.drone._reset_idx(env_ids)
         
-        pos = torch.vmap(sample_from_grid, randomness="different")(
-            self.cells.expand(len(env_ids), *self.cells.shape), n=self.drone.n
-        ) + self.envs_positions[env_ids].unsqueeze(1)
+        pos = (
+            sample_from_grid(self.cells, self.drone.n, len(env_ids))
+            + self.envs_positions[env_ids].unsqueeze(1)
+        )
         rpy = self.init_rpy_dist.sample((*env_ids.shape, self.drone.n))
         rot = euler_to_quaternion(rpy)
         vel = torch.zeros(len(env_ids), self.drone.n, 6, device=self.device)
         self.drone.set_world_poses(pos, rot, env_ids)
         self.drone.set_velocities(vel, env_ids)
 
-        self.last_cost_h[env_ids] = torch.vmap(cost_formation_hausdorff)(
-            pos, desired_p=self.formation
-        )
+        self.last_cost_h[env_ids] = self.cost_formation(pos, desired_p=self.formation)
         # self.last_cost_l[env_ids] = vmap(cost_formation_laplacian)(
         #     pos, desired_p=self.formation
         # )
@@ -264,7 +304,7 @@ class Formation(IsaacEnv):
         # cost_l = vmap(cost_formation_laplacian)(pos, desired_L=self.formation_L)
         pos = self.drone.pos
 
-        cost_h = cost_formation_hausdorff(pos, desired_p=self.formation)
+        cost_h = self.cost_formation(pos, desired_p=self.formation)
         
         distance = torch.norm(pos.mean(-2, keepdim=True) - self.target_pos, dim=-1)
 
@@ -343,19 +383,3 @@ def laplacian(p: torch.Tensor, normalize=False):
     else:
         L = D - A
     return L
-
-@torch.vmap
-def cost_formation_hausdorff(p: torch.Tensor, desired_p: torch.Tensor) -> torch.Tensor:
-    p = p - p.mean(-2, keepdim=True)
-    desired_p = desired_p - desired_p.mean(-2, keepdim=True)
-    cost = torch.max(directed_hausdorff(p, desired_p), directed_hausdorff(desired_p, p))
-    return cost.unsqueeze(-1)
-
-
-def directed_hausdorff(p: torch.Tensor, q: torch.Tensor) -> torch.Tensor:
-    """
-    p: (*, n, dim)
-    q: (*, m, dim)
-    """
-    d = torch.cdist(p, q, p=2).min(-1).values.max(-1).values
-    return d
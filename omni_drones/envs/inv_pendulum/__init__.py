@@ -20,7 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from omni_drones.utils.registry import lazy_attributes
 
-from .inv_pendulum_hover import InvPendulumHover
-from .inv_pendulum_track import InvPendulumTrack
-from .inv_pendulum_fly_through import InvPendulumFlyThrough
\ No newline at end of file
+__getattr__, __all__ = lazy_attributes(__name__, {
+    "InvPendulumHover": ".inv_pendulum_hover",
+    "InvPendulumTrack": ".inv_pendulum_track",
+    "InvPendulumFlyThrough": ".inv_pendulum_fly_through",
+})
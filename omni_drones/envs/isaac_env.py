@@ -28,6 +28,7 @@ from typing import Dict, List, Optional, Tuple, Type, Union, Callable
 import omni.usd
 import torch
 import logging
+import time
 import carb
 import numpy as np
 from omni.isaac.cloner import GridCloner
@@ -36,15 +37,22 @@ from omni.isaac.core.utils import prims as prim_utils, stage as stage_utils
 from omni.isaac.core.utils.extensions import enable_extension
 from omni.isaac.core.utils.viewports import set_camera_view
 
+from omegaconf import OmegaConf
 from tensordict.tensordict import TensorDict, TensorDictBase
 from torchrl.data import CompositeSpec, TensorSpec, DiscreteTensorSpec
 from torchrl.envs import EnvBase
 
-from omni_drones.robots.robot import RobotBase
+from omni_drones import patch_tensordict
+from omni_drones.robots.robot import ASSET_PATH, RobotBase
 from omni_drones.utils.torchrl import AgentSpec
+from omni_drones.utils.registry import LazyRegistry
+from omni_drones.utils.stage_cache import StageCache, stage_cache_key
 
 from omni.isaac.debug_draw import _debug_draw
 
+# `TensorDict.shapes`, used by `IsaacEnv.__init__` below
+patch_tensordict()
+
 class DebugDraw:
     def __init__(self):
         self._draw = _debug_draw.acquire_debug_draw_interface()
@@ -79,7 +87,7 @@ class IsaacEnv(EnvBase):
     env_ns = "/World/envs"
     template_env_ns = "/World/envs/env_0"
 
-    REGISTRY: Dict[str, Type["IsaacEnv"]] = {}
+    REGISTRY: LazyRegistry = LazyRegistry("task", case_insensitive=True)
 
     def __init__(self, cfg, headless):
         super().__init__(
@@ -125,6 +133,7 @@ class IsaacEnv(EnvBase):
         self._is_closed = False
         # set camera view
         # create cloner for duplicating the scenes
+        scene_start = time.perf_counter()
         cloner = GridCloner(spacing=self.cfg.env.env_spacing)
         cloner.define_base_env("/World/envs")
         # create the xform prim to hold the template environment
@@ -140,10 +149,28 @@ class IsaacEnv(EnvBase):
             self.env_ns + "/env", self.num_envs
         )
         assert len(self.envs_prim_paths) == self.num_envs
-        self.envs_positions = cloner.clone(
-            source_prim_path=self.template_env_ns,
-            prim_paths=self.envs_prim_paths,
-            replicate_physics=self.cfg.sim.replicate_physics,
+        stage_cache, cache_key = self._get_stage_cache()
+        self.envs_positions = None
+        if stage_cache is not None:
+            self.envs_positions = stage_cache.load(stage_utils.get_current_stage(), cache_key)
+        cache_hit = self.envs_positions is not None
+        if not cache_hit:
+            self.envs_positions = cloner.clone(
+                source_prim_path=self.template_env_ns,
+                prim_paths=self.envs_prim_paths,
+                replicate_physics=self.cfg.sim.replicate_physics,
+            )
+            if stage_cache is not None:
+                stage_cache.save(
+                    stage_utils.get_current_stage(),
+                    cache_key,
+                    self.envs_prim_paths[1:],
+                    self.envs_positions,
+                    template_path=self.template_env_ns,
+                )
+        logging.info(
+            f"Constructed {self.num_envs} envs in {time.perf_counter() - scene_start:.2f}s "
+            f"(stage cache: {'disabled' if stage_cache is None else 'warm' if cache_hit else 'cold'})."
         )
         # convert environment positions to torch tensor
         self.envs_positions = torch.tensor(
@@ -184,12 +211,35 @@ class IsaacEnv(EnvBase):
 
     @classmethod
     def __init_subclass__(cls, **kwargs):
-        if cls.__name__ in IsaacEnv.REGISTRY:
-            raise ValueError
         super().__init_subclass__(**kwargs)
         if not cls.__name__.startswith("_"):
-            IsaacEnv.REGISTRY[cls.__name__] = cls
-            IsaacEnv.REGISTRY[cls.__name__.lower()] = cls
+            # replaces the lazy entry added in `omni_drones.envs`, if any
+            IsaacEnv.REGISTRY.register(cls)
+
+    def _get_stage_cache(self) -> Tuple[Optional[StageCache], Optional[str]]:
+        """Returns the stage cache and the key of this scene if `cfg.env.stage_cache`
+        is set to a cache directory. Physics replication is not stored in the
+        stage, so the cache is not used with `cfg.sim.replicate_physics`.
+        """
+        cache_dir = self.cfg.env.get("stage_cache", None)
+        if cache_dir is None:
+            return None, None
+        if self.cfg.sim.replicate_physics:
+            logging.warning("The stage cache is not used with `replicate_physics`.")
+            return None, None
+        cfg = OmegaConf.to_container(
+            OmegaConf.create({"task": self.cfg.task, "env": self.cfg.env}), resolve=True
+        )
+        cfg["cls"] = self.__class__.__qualname__
+        cfg["seed"] = self.cfg.get("seed", None)
+        cloner_params = {
+            "env_ns": self.env_ns,
+            "template_env_ns": self.template_env_ns,
+            "num_envs": self.num_envs,
+            "spacing": self.cfg.env.env_spacing,
+        }
+        key = stage_cache_key(cfg, cloner_params, [ASSET_PATH])
+        return StageCache(cache_dir), key
 
     @property
     def agent_spec(self):
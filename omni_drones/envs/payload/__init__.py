@@ -20,7 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from omni_drones.utils.registry import lazy_attributes
 
-from .payload_hover import PayloadHover
-from .payload_track import PayloadTrack
-from .payload_fly_through import PayloadFlyThrough
\ No newline at end of file
+__getattr__, __all__ = lazy_attributes(__name__, {
+    "PayloadHover": ".payload_hover",
+    "PayloadTrack": ".payload_track",
+    "PayloadFlyThrough": ".payload_fly_through",
+})
@@ -20,7 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from omni_drones.utils.registry import lazy_attributes
 
-from .platform_fly_through import PlatformFlyThrough
-from .platform_hover import PlatformHover
-from .platform_track import PlatformTrack
\ No newline at end of file
+__getattr__, __all__ = lazy_attributes(__name__, {
+    "PlatformFlyThrough": ".platform_fly_through",
+    "PlatformHover": ".platform_hover",
+    "PlatformTrack": ".platform_track",
+})
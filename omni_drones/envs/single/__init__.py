@@ -20,10 +20,13 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from omni_drones.utils.registry import lazy_attributes
 
-from .hover import Hover
-from .hover_to import HoverTo
-from .track import Track
-from .trackV1 import TrackV1
-from .fly_through import FlyThrough
-from .nav import SDFNav
\ No newline at end of file
+__getattr__, __all__ = lazy_attributes(__name__, {
+    "Hover": ".hover",
+    "HoverTo": ".hover_to",
+    "Track": ".track",
+    "TrackV1": ".trackV1",
+    "FlyThrough": ".fly_through",
+    "SDFNav": ".nav",
+})
@@ -20,7 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from omni_drones.utils.registry import lazy_attributes
 
-from .transport_hover import TransportHover
-from .transport_fly_through import TransportFlyThrough
-from .transport_track import TransportTrack
\ No newline at end of file
+__getattr__, __all__ = lazy_attributes(__name__, {
+    "TransportHover": ".transport_hover",
+    "TransportFlyThrough": ".transport_fly_through",
+    "TransportTrack": ".transport_track",
+})
@@ -0,0 +1,157 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Reports the import cost of the simulator-independent parts of `omni_drones`.
+
+Each module is imported in a fresh interpreter (after preloading `torch`, whose
+cost is shared by everything) and its wall-clock import time is compared
+against a budget. The report also flags modules that pull in Isaac Sim and
+lists the most expensive transitive imports as reported by ``-X importtime``.
+
+    python -m omni_drones.importtime
+    python -m omni_drones.importtime omni_drones.learning --top 10
+
+The exit code is non-zero if any module exceeds its budget or fails to import.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# module -> budget in milliseconds, measured on top of `import torch`; only the
+# torchrl integration pays for `tensordict` and `torchrl` (about 1.5-2 s)
+DEFAULT_BUDGETS: Dict[str, float] = {
+    "omni_drones": 50.,
+    "omni_drones.utils.torch": 50.,
+    "omni_drones.utils.math": 50.,
+    "omni_drones.utils.formation": 50.,
+    "omni_drones.utils.bspline": 50.,
+    "omni_drones.utils.poisson_disk": 50.,
+    "omni_drones.actuators": 50.,
+    "omni_drones.controllers": 150.,
+    "omni_drones.utils.torchrl": 3000.,
+    "omni_drones.utils.torchrl.transforms": 3000.,
+    "omni_drones.learning": 500.,
+}
+
+# top-level packages that belong to Isaac Sim / Omniverse
+SIMULATOR_PACKAGES = ("omni", "pxr", "carb")
+
+# written to stderr between the preload and the measured import, so that the
+# ``-X importtime`` lines of the preload can be told apart
+_MARKER = "omni_drones.importtime: preloaded"
+
+_SNIPPET = """
+import importlib, json, sys, time
+for name in {preload!r}:
+    importlib.import_module(name)
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+before = set(sys.modules)
+start = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+new = set(sys.modules) - before
+sim = sorted(m for m in new if m.split(".")[0] in {sim!r})
+print(json.dumps({{"time": elapsed, "num_modules": len(new), "simulator": sim[:5]}}))
+"""
+
+
+def _parse_importtime(stderr: str, top: int) -> List[Tuple[str, float]]:
+    # lines look like: "import time:       self [us] |  cumulative | imported package"
+    # and only those after the marker belong to the measured module
+    lines = stderr.splitlines()
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, _, name = line[len("import time:"):].split("|")
+            entries.append((name.strip(), int(self_us) / 1e3))
+        except ValueError:
+            continue
+    entries.sort(key=lambda entry: entry[1], reverse=True)
+    return entries[:top]
+
+
+def measure(module: str, preload=("torch",), top: int = 5) -> Dict:
+    snippet = _SNIPPET.format(preload=tuple(preload), marker=_MARKER, module=module, sim=SIMULATOR_PACKAGES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        # the traceback is interleaved with the ``-X importtime`` lines
+        error = [
+            line for line in proc.stderr.strip().splitlines()
+            if line.strip() and not line.startswith("import time:") and line != _MARKER
+        ]
+        return {"error": error[-1] if error else f"exit code {proc.returncode}"}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["heaviest"] = _parse_importtime(proc.stderr, top)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_BUDGETS))
+    parser.add_argument("--budget", type=float, default=None, help="override all budgets (ms)")
+    parser.add_argument("--budget-scale", type=float, default=1., help="scale the default budgets")
+    parser.add_argument("--preload", nargs="*", default=["torch"])
+    parser.add_argument("--top", type=int, default=3, help="number of heaviest imports to list")
+    parser.add_argument("--json", type=str, default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = {}
+    failed = False
+    print(f"{'module':<40} {'time [ms]':>10} {'budget':>8} {'#mods':>6}  status")
+    for module in args.modules:
+        budget = args.budget or DEFAULT_BUDGETS.get(module, 500.) * args.budget_scale
+        result = measure(module, args.preload, args.top)
+        result["budget"] = budget
+        report[module] = result
+        if "error" in result:
+            failed = True
+            print(f"{module:<40} {'-':>10} {budget:>8.0f} {'-':>6}  FAILED: {result['error']}")
+            continue
+        ms = result["time"] * 1e3
+        status = "ok" if ms <= budget else "OVER BUDGET"
+        if result["simulator"]:
+            status += f" (imports simulator: {', '.join(result['simulator'])})"
+        failed |= ms > budget or bool(result["simulator"])
+        print(f"{module:<40} {ms:>10.1f} {budget:>8.0f} {result['num_modules']:>6}  {status}")
+        for name, self_ms in result["heaviest"]:
+            print(f"{'':<4}{name:<36} {self_ms:>10.1f}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
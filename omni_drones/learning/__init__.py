@@ -20,26 +20,40 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from omni_drones.utils.registry import LazyRegistry, lazy_attributes
 
-from .mappo import MAPPOPolicy
-from .mappo_new import MAPPO
-from .ppo import *
-from .happo import HAPPOPolicy
-from .qmix import QMIXPolicy
+# registers the Hydra configs of the PPO family without importing the algorithms
+from .ppo import config as _ppo_config
 
-from .dqn import DQNPolicy
-from .sac import SACPolicy
-from .td3 import TD3Policy
-from .matd3 import MATD3Policy
-from .tdmpc import TDMPCPolicy
+# Algorithms are imported on first lookup. Third-party algorithms can be added
+# with `ALGOS.register`, e.g.
+#
+#   @ALGOS.register(name="my_ppo")
+#   class MyPPOPolicy(TensorDictModuleBase):
+#       ...
+ALGOS = LazyRegistry("algorithm", {
+    "mappo_old": "omni_drones.learning.mappo:MAPPOPolicy",
+    "mappo": "omni_drones.learning.mappo_new:MAPPO",
+    "happo": "omni_drones.learning.happo:HAPPOPolicy",
+    "ppo": "omni_drones.learning.ppo.ppo:PPOPolicy",
+    "ppo_rnn": "omni_drones.learning.ppo.ppo_rnn:PPORNNPolicy",
+    "ppo_adapt": "omni_drones.learning.ppo.ppo_adapt:PPOAdaptivePolicy",
+    "sac": "omni_drones.learning.sac:SACPolicy",
+    "td3": "omni_drones.learning.td3:TD3Policy",
+})
 
-ALGOS = {
-    "mappo_old": MAPPOPolicy,
-    "mappo": MAPPO,
-    "happo": HAPPOPolicy,
-    "ppo": PPOPolicy,
-    "ppo_rnn": PPORNNPolicy,
-    "ppo_adapt": PPOAdaptivePolicy,
-    "sac": SACPolicy,
-    "td3": TD3Policy,
-}
+__getattr__, __all__ = lazy_attributes(__name__, {
+    "MAPPOPolicy": ".mappo",
+    "MAPPO": ".mappo_new",
+    "HAPPOPolicy": ".happo",
+    "QMIXPolicy": ".qmix",
+    "DQNPolicy": ".dqn",
+    "SACPolicy": ".sac",
+    "TD3Policy": ".td3",
+    "MATD3Policy": ".matd3",
+    "TDMPCPolicy": ".tdmpc",
+    "PPOPolicy": ".ppo",
+    "PPORNNPolicy": ".ppo",
+    "PPOAdaptivePolicy": ".ppo",
+})
+__all__ = ["ALGOS"] + __all__
@@ -0,0 +1,331 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+Analytic policy gradients through :class:`~omni_drones.controllers.MultirotorDynamics`.
+
+Instead of estimating the policy gradient from sampled returns, the actor is
+unrolled through the differentiable model for a short horizon and the
+discounted task reward is maximized by backpropagating through the dynamics
+(truncated BPTT: the state is detached between updates). The tasks below
+reformulate the rewards and observations of the `Hover` and `Track` envs on
+the model's state, so that an actor trained here has the same interface as
+one trained with PPO in Isaac Sim and can be exported with
+`omni_drones.learning.export`. Everything runs on plain tensors, without
+Isaac Sim.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Union
+
+import torch
+import torch.distributions as D
+import torch.nn as nn
+from hydra.core.config_store import ConfigStore
+
+from omni_drones.controllers.dynamics import MultirotorDynamics, quat_to_matrix
+from omni_drones.utils.torch import euler_to_quaternion
+
+from .ppo.ppo import make_mlp
+
+
+@dataclass
+class APGConfig:
+    name: str = "apg"
+    # number of steps to backpropagate through per update
+    horizon: int = 32
+    gamma: float = 0.99
+    lr: float = 5e-4
+    max_grad_norm: float = 1.0
+
+    checkpoint_path: Union[str, None] = None
+
+
+cs = ConfigStore.instance()
+cs.store("apg", node=APGConfig, group="algo")
+
+
+def lemniscate(t: torch.Tensor, c: torch.Tensor) -> torch.Tensor:
+    # as in `omni_drones.envs.utils`, which cannot be imported without Isaac Sim
+    sin_t = torch.sin(t)
+    cos_t = torch.cos(t)
+    sin2p1 = torch.square(sin_t) + 1
+    return torch.stack([cos_t, sin_t * cos_t, c * sin_t], dim=-1) / sin2p1.unsqueeze(-1)
+
+
+def scale_time(t: torch.Tensor, a: float = 1.0) -> torch.Tensor:
+    return t / (1 + 1 / (a * torch.abs(t)))
+
+
+class DifferentiableTask:
+    """
+    A batch of episodes of a single-drone task on :class:`MultirotorDynamics`.
+    Subclasses sample initial states in :meth:`reset_idx` and define the
+    observation and a differentiable reward of the model state.
+    """
+
+    def __init__(self, cfg, dynamics: MultirotorDynamics, num_envs: int, device="cpu"):
+        self.cfg = cfg
+        self.dynamics = dynamics
+        self.num_envs = num_envs
+        self.device = device
+        self.max_episode_length = cfg.env.max_episode_length
+        self.reward_effort_weight = cfg.task.reward_effort_weight
+        self.reward_action_smoothness_weight = cfg.task.reward_action_smoothness_weight
+        self.reward_distance_scale = cfg.task.reward_distance_scale
+        self.time_encoding = cfg.task.time_encoding
+        self.time_encoding_dim = 4
+
+        self.state = torch.zeros(num_envs, 13 + dynamics.num_rotors, device=device)
+        self.progress_buf = torch.zeros(num_envs, dtype=torch.long, device=device)
+
+    def reset(self):
+        self.reset_idx(torch.arange(self.num_envs, device=self.device))
+
+    def reset_idx(self, env_ids: torch.Tensor):
+        raise NotImplementedError
+
+    def observation(self, state: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+    def reward_and_done(self, state: torch.Tensor, last_state: torch.Tensor):
+        raise NotImplementedError
+
+    def _time_encoding(self) -> torch.Tensor:
+        t = (self.progress_buf / self.max_episode_length).unsqueeze(-1)
+        return t.expand(-1, self.time_encoding_dim)
+
+    def _reward_effort(self, state: torch.Tensor, last_state: torch.Tensor):
+        throttle = state[..., 13:]
+        effort = throttle.sum(-1)
+        reward = self.reward_effort_weight * torch.exp(-effort)
+        if self.reward_action_smoothness_weight > 0:
+            # the gradient of `torch.norm` is undefined at zero
+            throttle_difference = ((throttle - last_state[..., 13:]).square().sum(-1) + 1e-12).sqrt()
+            reward = reward + self.reward_action_smoothness_weight * torch.exp(-throttle_difference)
+        return reward
+
+
+class DifferentiableHover(DifferentiableTask):
+    """The `Hover` task: reach and hold a position and heading."""
+
+    def __init__(self, cfg, dynamics: MultirotorDynamics, num_envs: int, device="cpu"):
+        super().__init__(cfg, dynamics, num_envs, device)
+        self.init_pos_dist = D.Uniform(
+            torch.tensor([-2.5, -2.5, 1.], device=device),
+            torch.tensor([2.5, 2.5, 2.5], device=device)
+        )
+        self.init_rpy_dist = D.Uniform(
+            torch.tensor([-.2, -.2, 0.], device=device) * torch.pi,
+            torch.tensor([0.2, 0.2, 2.], device=device) * torch.pi
+        )
+        self.target_rpy_dist = D.Uniform(
+            torch.tensor([0., 0., 0.], device=device) * torch.pi,
+            torch.tensor([0., 0., 2.], device=device) * torch.pi
+        )
+        self.target_pos = torch.tensor([0.0, 0.0, 2.], device=device)
+        self.target_heading = torch.zeros(num_envs, 3, device=device)
+
+    def reset_idx(self, env_ids: torch.Tensor):
+        root_state = torch.zeros(len(env_ids), 13, device=self.device)
+        root_state[:, :3] = self.init_pos_dist.sample(env_ids.shape)
+        root_state[:, 3:7] = euler_to_quaternion(self.init_rpy_dist.sample(env_ids.shape))
+        self.state[env_ids] = self.dynamics.init_state(root_state)
+        target_rot = euler_to_quaternion(self.target_rpy_dist.sample(env_ids.shape))
+        self.target_heading[env_ids] = quat_to_matrix(target_rot)[..., 0]
+        self.progress_buf[env_ids] = 0
+
+    def observation(self, state: torch.Tensor) -> torch.Tensor:
+        drone_state = self.dynamics.get_state(state)
+        obs = [
+            self.target_pos - drone_state[..., :3],
+            drone_state[..., 3:],
+            self.target_heading - drone_state[..., 13:16],
+        ]
+        if self.time_encoding:
+            obs.append(self._time_encoding())
+        return torch.cat(obs, dim=-1)
+
+    def reward_and_done(self, state: torch.Tensor, last_state: torch.Tensor):
+        R = quat_to_matrix(state[..., 3:7])
+        rpos = self.target_pos - state[..., :3]
+        rheading = self.target_heading - R[..., 0]
+        distance = torch.norm(torch.cat([rpos, rheading], dim=-1), dim=-1)
+
+        reward_pose = 1.0 / (1.0 + torch.square(self.reward_distance_scale * distance))
+        reward_up = torch.square((R[..., 2, 2] + 1) / 2)
+        spinnage = torch.square(state[..., 12])
+        reward_spin = 1.0 / (1.0 + torch.square(spinnage))
+        reward = (
+            reward_pose
+            + reward_pose * (reward_up + reward_spin)
+            + self._reward_effort(state, last_state)
+        )
+        terminated = (state[..., 2] < 0.2) | (distance > 4)
+        return reward, terminated.detach()
+
+
+class DifferentiableTrack(DifferentiableTask):
+    """The `Track` task: follow a randomly scaled and rotated lemniscate."""
+
+    def __init__(self, cfg, dynamics: MultirotorDynamics, num_envs: int, device="cpu"):
+        super().__init__(cfg, dynamics, num_envs, device)
+        self.reset_thres = cfg.task.reset_thres
+        self.future_traj_steps = int(cfg.task.future_traj_steps)
+        self.dt = dynamics.dt
+        self.init_rpy_dist = D.Uniform(
+            torch.tensor([-.2, -.2, 0.], device=device) * torch.pi,
+            torch.tensor([0.2, 0.2, 2.], device=device) * torch.pi
+        )
+        self.traj_rpy_dist = D.Uniform(
+            torch.tensor([0., 0., 0.], device=device) * torch.pi,
+            torch.tensor([0., 0., 2.], device=device) * torch.pi
+        )
+        self.traj_c_dist = D.Uniform(torch.tensor(-0.6, device=device), torch.tensor(0.6, device=device))
+        self.traj_scale_dist = D.Uniform(
+            torch.tensor([1.8, 1.8, 1.], device=device),
+            torch.tensor([3.2, 3.2, 1.5], device=device)
+        )
+        self.traj_w_dist = D.Uniform(torch.tensor(0.8, device=device), torch.tensor(1.1, device=device))
+        self.origin = torch.tensor([0., 0., 2.], device=device)
+        self.traj_t0 = torch.pi / 2
+        self.traj_c = torch.zeros(num_envs, device=device)
+        self.traj_scale = torch.zeros(num_envs, 3, device=device)
+        self.traj_rot = torch.zeros(num_envs, 3, 3, device=device)
+        self.traj_w = torch.ones(num_envs, device=device)
+
+    def reset_idx(self, env_ids: torch.Tensor):
+        self.traj_c[env_ids] = self.traj_c_dist.sample(env_ids.shape)
+        self.traj_rot[env_ids] = quat_to_matrix(euler_to_quaternion(self.traj_rpy_dist.sample(env_ids.shape)))
+        self.traj_scale[env_ids] = self.traj_scale_dist.sample(env_ids.shape)
+        traj_w = self.traj_w_dist.sample(env_ids.shape)
+        self.traj_w[env_ids] = torch.randn_like(traj_w).sign() * traj_w
+
+        root_state = torch.zeros(len(env_ids), 13, device=self.device)
+        t0 = torch.full((len(env_ids),), self.traj_t0, device=self.device)
+        root_state[:, :3] = lemniscate(t0, self.traj_c[env_ids]) + self.origin
+        root_state[:, 3:7] = euler_to_quaternion(self.init_rpy_dist.sample(env_ids.shape))
+        self.state[env_ids] = self.dynamics.init_state(root_state)
+        self.progress_buf[env_ids] = 0
+
+    def target_pos(self, steps: int, step_size: float = 1.) -> torch.Tensor:
+        t = self.progress_buf.unsqueeze(1) + step_size * torch.arange(steps, device=self.device)
+        t = self.traj_t0 + scale_time(self.traj_w.unsqueeze(1) * t * self.dt)
+        target_pos = lemniscate(t, self.traj_c.unsqueeze(1))
+        target_pos = (self.traj_rot.unsqueeze(1) @ target_pos.unsqueeze(-1)).squeeze(-1)
+        return self.origin + target_pos * self.traj_scale.unsqueeze(1)
+
+    def observation(self, state: torch.Tensor) -> torch.Tensor:
+        drone_state = self.dynamics.get_state(state)
+        rpos = self.target_pos(self.future_traj_steps, step_size=5) - drone_state[..., :3].unsqueeze(1)
+        obs = [rpos.flatten(1), drone_state[..., 3:]]
+        if self.time_encoding:
+            obs.append(self._time_encoding())
+        return torch.cat(obs, dim=-1)
+
+    def reward_and_done(self, state: torch.Tensor, last_state: torch.Tensor):
+        R = quat_to_matrix(state[..., 3:7])
+        distance = torch.norm(self.target_pos(1)[:, 0] - state[..., :3], dim=-1)
+        reward_pose = torch.exp(-self.reward_distance_scale * distance)
+        tiltage = torch.abs(1 - R[..., 2, 2])
+        reward_up = 0.5 / (1.0 + torch.square(tiltage))
+        spin = torch.square(state[..., 12])
+        reward_spin = 0.5 / (1.0 + torch.square(spin))
+        reward = reward_pose * (reward_up + reward_spin) + self._reward_effort(state, last_state)
+        terminated = (state[..., 2] < 0.1) | (distance > self.reset_thres)
+        return reward, terminated.detach()
+
+
+TASKS = {
+    "Hover": DifferentiableHover,
+    "Track": DifferentiableTrack,
+}
+
+
+class APGPolicy:
+    """
+    Trains a deterministic actor (the PPO actor's MLP with a tanh-squashed
+    linear head) by analytic policy gradients. Each call to :meth:`train_op` unrolls
+    `cfg.horizon` steps, maximizes the discounted reward collected along the
+    way and continues the episodes from the detached final states.
+    """
+
+    def __init__(self, cfg: APGConfig, task: DifferentiableTask, device="cpu"):
+        self.cfg = cfg
+        self.task = task
+        self.device = device
+        # squashed rather than clipped, so that saturated commands still get gradients
+        self.actor = nn.Sequential(
+            make_mlp([256, 256, 256]),
+            nn.LazyLinear(task.dynamics.num_rotors),
+            nn.Tanh(),
+        ).to(device)
+        task.reset()
+        self.actor(task.observation(task.state))
+        self.opt = torch.optim.Adam(self.actor.parameters(), lr=cfg.lr)
+
+    def __call__(self, observation: torch.Tensor) -> torch.Tensor:
+        return self.actor(observation)
+
+    def train_op(self) -> Dict[str, float]:
+        task = self.task
+        state = task.state
+        task.state = state.clone()
+        discount = 1.0
+        total_reward = 0.
+        num_terminated = 0
+        for _ in range(self.cfg.horizon):
+            action = self(task.observation(state))
+            next_state = task.dynamics(state, action)
+            reward, terminated = task.reward_and_done(next_state, state)
+            total_reward = total_reward + discount * reward
+            discount = discount * self.cfg.gamma
+            task.progress_buf += 1
+
+            # episodes are reset within the unroll, which cuts the gradient there
+            done = terminated | (task.progress_buf >= task.max_episode_length)
+            if done.any():
+                env_ids = done.nonzero().squeeze(-1)
+                task.reset_idx(env_ids)
+                next_state = torch.where(done.unsqueeze(-1), task.state, next_state)
+                num_terminated += terminated.sum().item()
+            state = next_state
+
+        loss = -total_reward.mean() / self.cfg.horizon
+        self.opt.zero_grad()
+        loss.backward()
+        grad_norm = nn.utils.clip_grad_norm_(self.actor.parameters(), self.cfg.max_grad_norm)
+        self.opt.step()
+
+        task.state = state.detach()
+        return {
+            "loss": loss.item(),
+            "terminated": num_terminated / task.num_envs,
+            "grad_norm": grad_norm.item(),
+        }
+
+    def state_dict(self):
+        return self.actor.state_dict()
+
+    def load_state_dict(self, state_dict):
+        self.actor.load_state_dict(state_dict)
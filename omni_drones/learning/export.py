@@ -0,0 +1,267 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Exporting trained actors for deployment.
+
+The actors built by the PPO family are ``TensorDictModule`` graphs of
+``LazyLinear`` MLPs ending in a Gaussian head, wrapped by a
+``ProbabilisticActor``. For deployment only the mean action is needed, so
+:func:`strip_actor` turns such a graph into a plain deterministic
+``nn.Module`` that maps a flat observation tensor to the action mean. The
+result can be traced to TorchScript and optionally quantized.
+"""
+
+import copy
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+from tensordict import TensorDictBase
+from tensordict.nn import (
+    ProbabilisticTensorDictModule,
+    TensorDictModule,
+    TensorDictSequential,
+)
+from torch.nn.parameter import UninitializedParameter
+from torchrl.envs.transforms import CatTensors
+
+from .modules.distributions import IndependentNormalModule
+from .utils.precision import reset_precision
+
+
+def _key(key) -> str:
+    return ".".join(key) if isinstance(key, tuple) else key
+
+
+class NormalMean(nn.Module):
+    """Deterministic replacement for a Gaussian head: returns the mean only."""
+
+    def __init__(self, operator: nn.Linear, chunks: int = 1):
+        super().__init__()
+        self.operator = operator
+        self.chunks = chunks
+
+    def forward(self, features: torch.Tensor) -> torch.Tensor:
+        loc = self.operator(features)
+        if self.chunks > 1:
+            loc = loc.chunk(self.chunks, -1)[0]
+        return loc
+
+
+def _mean_head(module: nn.Module):
+    if isinstance(module, IndependentNormalModule):
+        return NormalMean(module.operator, 2 if module.state_dependent_std else 1)
+    # the `Actor` heads of ppo, ppo_adapt and mappo
+    if hasattr(module, "actor_mean") and hasattr(module, "actor_std"):
+        return module.actor_mean
+    return None
+
+
+def _replace_heads(module: nn.Module) -> Tuple[nn.Module, bool]:
+    head = _mean_head(module)
+    if head is not None:
+        return head, True
+    found = False
+    for name, child in module.named_children():
+        new_child, replaced = _replace_heads(child)
+        if replaced:
+            setattr(module, name, new_child)
+            found = True
+    return module, found
+
+
+class _ModuleStage(nn.Module):
+    def __init__(self, module: nn.Module, in_key: str, out_key: str):
+        super().__init__()
+        self.module = module
+        self.in_key = in_key
+        self.out_key = out_key
+
+    def forward(self, inputs: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        inputs[self.out_key] = self.module(inputs[self.in_key])
+        return inputs
+
+
+class _CatStage(nn.Module):
+    def __init__(self, in_keys: List[str], out_key: str):
+        super().__init__()
+        self.in_keys = in_keys
+        self.out_key = out_key
+
+    def forward(self, inputs: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        inputs[self.out_key] = torch.cat([inputs[key] for key in self.in_keys], dim=-1)
+        return inputs
+
+
+class DeterministicActor(nn.Module):
+    """A stripped actor taking its inputs concatenated along the last dimension.
+
+    ``in_keys`` and ``in_dims`` record the order and sizes of the concatenated
+    inputs, e.g. ``["agents.observation", "agents.intrinsics"]``.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[nn.Module],
+        in_keys: List[str],
+        in_dims: List[int],
+        out_key: str,
+    ):
+        super().__init__()
+        self.stages = nn.ModuleList(stages)
+        self.in_keys = in_keys
+        self.in_dims = in_dims
+        self.out_key = out_key
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        inputs: Dict[str, torch.Tensor] = {}
+        for key, value in zip(self.in_keys, x.split(self.in_dims, dim=-1)):
+            inputs[key] = value
+        for stage in self.stages:
+            inputs = stage(inputs)
+        return inputs[self.out_key]
+
+
+def _collect_stages(module, stages: list):
+    if isinstance(module, ProbabilisticTensorDictModule):
+        # the sampling step; the deterministic output is its first input (the mean)
+        return _key(module.in_keys[0])
+    if isinstance(module, TensorDictSequential):
+        out_key = None
+        for m in module.module:
+            out_key = _collect_stages(m, stages) or out_key
+        return out_key
+    if isinstance(module, TensorDictModule):
+        if len(module.in_keys) != 1:
+            raise NotImplementedError(
+                f"Only single-input modules can be exported, got in_keys={module.in_keys}."
+            )
+        inner, replaced = _replace_heads(module.module)
+        out_key = _key(module.out_keys[0])
+        if not replaced and len(module.out_keys) != 1:
+            raise NotImplementedError(
+                f"Don't know how to strip {type(module.module).__name__} with out_keys={module.out_keys}."
+            )
+        stages.append(_ModuleStage(inner, _key(module.in_keys[0]), out_key))
+        return out_key
+    # used to merge features with privileged context
+    if isinstance(module, CatTensors):
+        out_key = _key(module.out_keys[0])
+        stages.append(_CatStage([_key(k) for k in module.in_keys], out_key))
+        return out_key
+    raise NotImplementedError(f"Cannot export a module of type {type(module).__name__}.")
+
+
+def strip_actor(actor: TensorDictModule, example: TensorDictBase) -> Tuple[nn.Module, List[str]]:
+    """Strip a (probabilistic) actor down to a deterministic ``nn.Module``.
+
+    ``example`` is a tensordict holding the actor's inputs (e.g. from
+    ``observation_spec.zero()``). It is run through the actor first so that any
+    lazy layers are materialized, and is used to infer the input sizes.
+    The copy is always float32, whatever ``algo.precision`` was trained with.
+
+    The stripped module takes the actor's inputs flattened and concatenated
+    along the last dimension and returns the action mean. For a single-input
+    actor it is simply the underlying network. The input keys are returned
+    alongside, in the order they are expected, as dot-joined strings.
+    """
+    with torch.no_grad():
+        actor(example.clone())
+    actor = reset_precision(copy.deepcopy(actor)).cpu()
+    for name, param in actor.named_parameters():
+        if isinstance(param, UninitializedParameter):
+            raise RuntimeError(f"Parameter {name} is still uninitialized after a forward pass.")
+
+    stages = []
+    out_key = _collect_stages(actor, stages)
+    produced = set()
+    in_keys = []
+    for stage in stages:
+        needed = [stage.in_key] if isinstance(stage, _ModuleStage) else stage.in_keys
+        in_keys.extend(k for k in needed if k not in produced and k not in in_keys)
+        produced.add(stage.out_key)
+    in_dims = [example[tuple(k.split("."))].shape[-1] for k in in_keys]
+
+    if len(stages) == 1 and len(in_keys) == 1:
+        return stages[0].module.eval(), in_keys
+    return DeterministicActor(stages, in_keys, in_dims, out_key).eval(), in_keys
+
+
+def quantize_actor(module: nn.Module) -> nn.Module:
+    """Dynamic int8 quantization of the ``nn.Linear`` layers (weights int8, activations fp32)."""
+    from torch.ao.quantization import quantize_dynamic
+    return quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+
+
+def to_torchscript(module: nn.Module, example: torch.Tensor) -> torch.jit.ScriptModule:
+    with torch.no_grad():
+        scripted = torch.jit.trace(module.eval(), example)
+    return torch.jit.optimize_for_inference(torch.jit.freeze(scripted))
+
+
+def _latency(module: nn.Module, observations: torch.Tensor, iters: int) -> Dict[str, float]:
+    x = observations[:1]
+    times = torch.empty(iters)
+    with torch.inference_mode():
+        for _ in range(10):
+            module(x)
+        for i in range(iters):
+            start = time.perf_counter()
+            module(x)
+            times[i] = time.perf_counter() - start
+    times = times * 1e6
+    return {
+        "mean_us": times.mean().item(),
+        "p50_us": times.quantile(0.5).item(),
+        "p99_us": times.quantile(0.99).item(),
+    }
+
+
+def parity_report(
+    reference: nn.Module,
+    candidate: nn.Module,
+    observations: torch.Tensor,
+    iters: int = 1000,
+) -> Dict[str, Dict[str, float]]:
+    """Compare the actions and single-sample CPU latency of two exported actors.
+
+    ``observations`` is a ``[N, observation_dim]`` batch of recorded
+    observations, ideally from rollouts of the policy being exported so that the
+    activation ranges seen by the quantized layers are representative.
+    """
+    with torch.inference_mode():
+        ref = reference(observations)
+        out = candidate(observations)
+    err = (out - ref).abs()
+    action_range = (ref.max(0).values - ref.min(0).values).clamp_min(1e-6)
+    return {
+        "accuracy": {
+            "max_abs_err": err.max().item(),
+            "mean_abs_err": err.mean().item(),
+            "rmse": err.square().mean().sqrt().item(),
+            "max_rel_err": (err / action_range).max().item(),
+        },
+        "reference": _latency(reference, observations, iters),
+        "candidate": _latency(candidate, observations, iters),
+    }
@@ -25,8 +25,9 @@ import torch
 from tensordict import TensorDict
 from collections import defaultdict
 
-from .mappo import MAPPOPolicy, make_dataset_naive
+from .mappo import MAPPOPolicy
 from .utils.gae import compute_gae
+from .utils.minibatch import MinibatchSampler
 
 class HAPPOPolicy(MAPPOPolicy):
 
@@ -70,17 +71,20 @@ class HAPPOPolicy(MAPPOPolicy):
     
     def train_op(self, tensordict: TensorDict):
         tensordict = tensordict.select(*self.train_in_keys, strict=False)
-        next_tensordict = tensordict["next"][:, -1]
-        with torch.no_grad():
-            value_output = self.value_op(next_tensordict)
+        if self.defer_values:
+            values, next_value = self.rollout_values(tensordict)
+            tensordict.set("state_value", values)
+        else:
+            next_tensordict = tensordict["next"][:, -1]
+            with torch.no_grad():
+                value_output = self.value_op(next_tensordict)
+            values = tensordict["state_value"]
+            next_value = value_output["state_value"].squeeze(0)
 
         rewards = tensordict.get(("next", "reward", f"{self.agent_spec.name}.reward"))
         if rewards.shape[-1] != 1:
             rewards = rewards.sum(-1, keepdim=True)
 
-        values = tensordict["state_value"]
-        next_value = value_output["state_value"].squeeze(0)
-
         if hasattr(self, "value_normalizer"):
             values = self.value_normalizer.denormalize(values)
             next_value = self.value_normalizer.denormalize(next_value)
@@ -111,13 +115,13 @@ class HAPPOPolicy(MAPPOPolicy):
 
         train_info = []
 
+        sampler = MinibatchSampler(
+            tensordict,
+            int(self.cfg.num_minibatches),
+            self.minibatch_seq_len if hasattr(self, "minibatch_seq_len") else 1,
+        )
         for ppo_epoch in range(self.ppo_epoch):
-            dataset = make_dataset_naive(
-                tensordict,
-                int(self.cfg.num_minibatches),
-                self.minibatch_seq_len if hasattr(self, "minibatch_seq_len") else 1,
-            )
-            for minibatch in dataset:
+            for minibatch in sampler:
                 factor = torch.ones(minibatch[self.act_logps_name].shape[0], 1, device=minibatch.device)
                 actor_batch = minibatch.select(*self.actor_in_keys, "advantages", self.act_logps_name)
                 actor_batch.batch_size = [*minibatch.shape, self.agent_spec.n]
@@ -45,6 +45,8 @@ from omni_drones.utils.torchrl.env import AgentSpec
 
 from .utils import valuenorm
 from .utils.gae import compute_gae
+from .utils.minibatch import MinibatchSampler
+from .utils.precision import setup_precision
 
 LR_SCHEDULER = lr_scheduler._LRScheduler
 
@@ -70,6 +72,8 @@ class MAPPOPolicy(object):
         self.entropy_coef = cfg.entropy_coef
         self.gae_gamma = cfg.gamma
         self.gae_lambda = cfg.gae_lambda
+        # run only the actor during rollouts, see `rollout_values`
+        self.defer_values = getattr(cfg, "defer_values", False)
 
         self.act_dim = agent_spec.action_spec.shape[-1]
 
@@ -86,6 +90,13 @@ class MAPPOPolicy(object):
 
         self.make_actor()
         self.make_critic()
+        # the encoders run in `cfg.precision`, the distribution and value heads in float32
+        setup_precision(
+            self,
+            getattr(cfg, "precision", "fp32"),
+            [self.actor.module.encoder, self.critic.module.base],
+            getattr(cfg, "fp32_modules", None) or (),
+        )
 
         self.train_in_keys = list(
             set(
@@ -207,9 +218,24 @@ class MAPPOPolicy(object):
         )
 
         tensordict.update(actor_output)
-        tensordict.update(self.value_op(tensordict))
+        if not self.defer_values:
+            tensordict.update(self.value_op(tensordict))
         return tensordict
 
+    @torch.no_grad()
+    def rollout_values(self, tensordict: TensorDict):
+        """
+        The values of the T steps of a rollout and the bootstrap value of the
+        last next step, computed in a single critic forward over all T+1 steps.
+        """
+        critic_input = torch.cat([
+            tensordict.select(*self.critic_in_keys),
+            tensordict["next"][:, -1:].select(*self.critic_in_keys)
+        ], dim=1)
+        values = self.value_op(critic_input.reshape(-1))["state_value"]
+        values = values.unflatten(0, critic_input.shape)
+        return values[:, :-1], values[:, -1]
+
     def update_actor(self, batch: TensorDict) -> Dict[str, Any]:
         advantages = batch["advantages"]
         actor_input = batch.select(*self.actor_in_keys)
@@ -288,17 +314,20 @@ class MAPPOPolicy(object):
 
     def train_op(self, tensordict: TensorDict):
         tensordict = tensordict.select(*self.train_in_keys, strict=False)
-        next_tensordict = tensordict["next"][:, -1]
-        with torch.no_grad():
-            value_output = self.value_op(next_tensordict)
+        if self.defer_values:
+            values, next_value = self.rollout_values(tensordict)
+            tensordict.set("state_value", values)
+        else:
+            next_tensordict = tensordict["next"][:, -1]
+            with torch.no_grad():
+                value_output = self.value_op(next_tensordict)
+            values = tensordict["state_value"]
+            next_value = value_output["state_value"].squeeze(0)
 
         rewards = tensordict.get(("next", *self.reward_name))
         if rewards.shape[-1] != 1:
             rewards = rewards.sum(-1, keepdim=True)
 
-        values = tensordict["state_value"]
-        next_value = value_output["state_value"].squeeze(0)
-
         if hasattr(self, "value_normalizer"):
             values = self.value_normalizer.denormalize(values)
             next_value = self.value_normalizer.denormalize(next_value)
@@ -328,13 +357,13 @@ class MAPPOPolicy(object):
             )
 
         train_info = []
+        sampler = MinibatchSampler(
+            tensordict,
+            int(self.cfg.num_minibatches),
+            self.minibatch_seq_len if hasattr(self, "minibatch_seq_len") else 1,
+        )
         for ppo_epoch in range(self.ppo_epoch):
-            dataset = make_dataset_naive(
-                tensordict,
-                int(self.cfg.num_minibatches),
-                self.minibatch_seq_len if hasattr(self, "minibatch_seq_len") else 1,
-            )
-            for minibatch in dataset:
+            for minibatch in sampler:
                 train_info.append(
                     TensorDict(
                         {
@@ -371,29 +400,6 @@ class MAPPOPolicy(object):
         self.value_normalizer.load_state_dict(state_dict["value_normalizer"])
 
 
-def make_dataset_naive(
-    tensordict: TensorDict, num_minibatches: int = 4, seq_len: int = 1
-):
-    if seq_len > 1:
-        N, T = tensordict.shape
-        T = (T // seq_len) * seq_len
-        tensordict = tensordict[:, :T].reshape(-1, seq_len)
-        perm = torch.randperm(
-            (tensordict.shape[0] // num_minibatches) * num_minibatches,
-            device=tensordict.device,
-        ).reshape(num_minibatches, -1)
-        for indices in perm:
-            yield tensordict[indices]
-    else:
-        tensordict = tensordict.reshape(-1)
-        perm = torch.randperm(
-            (tensordict.shape[0] // num_minibatches) * num_minibatches,
-            device=tensordict.device,
-        ).reshape(num_minibatches, -1)
-        for indices in perm:
-            yield tensordict[indices]
-
-
 from .modules.distributions import (
     DiagGaussian,
     MultiCategoricalModule,
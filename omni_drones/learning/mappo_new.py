@@ -31,12 +31,8 @@ import einops
 
 from tensordict import TensorDict
 from tensordict.nn import (
-    EnsembleModule as _EnsembleModule, 
     TensorDictSequential,
     TensorDictModule, 
-    TensorDictModuleBase, 
-    make_functional, 
-    TensorDictParams
 )
 from torchrl.modules import ProbabilisticActor
 from torchrl.data import TensorSpec, CompositeSpec
@@ -44,7 +40,10 @@ from torchrl.envs.transforms import CatTensors
 from einops.layers.torch import Rearrange, Reduce
 
 from .ppo.common import GAE, make_mlp
-from .modules.distributions import IndependentNormal
+from .modules.distributions import DiagNormal
+from .modules.networks import GroupedMLP, GroupedLinear
+from .utils.minibatch import MinibatchSampler
+from .utils.precision import setup_precision
 from .utils.valuenorm import ValueNorm1
 
 def make_transformer(
@@ -97,24 +96,18 @@ class Actor(nn.Module):
         return loc, scale
 
 
-class EnsembleModule(_EnsembleModule):
-
-    def __init__(self, module: TensorDictModuleBase, num_copies: int):
-        super(_EnsembleModule, self).__init__()
-        self.in_keys = module.in_keys
-        self.out_keys = module.out_keys
-        self.num_copies = num_copies
+class GroupedActor(nn.Module):
+    """`Actor` with separate parameters for each agent."""
+    def __init__(self, num_agents: int, in_features: int, action_dim: int) -> None:
+        super().__init__()
+        self.actor_mean = GroupedLinear(num_agents, in_features, action_dim)
+        self.actor_std = nn.Parameter(torch.zeros(num_agents, action_dim))
+        self.scale_mapping = torch.exp
 
-        params_td = make_functional(module).expand(num_copies).to_tensordict()
-        self.module = module
-        self.vmapped_forward = torch.vmap(self.module, (1, 0), 1)
-        self.reset_parameters_recursive(params_td)
-        self.params_td = TensorDictParams(params_td)
-    
-    def forward(self, tensordict: TensorDict):
-        tensordict = tensordict.select(*self.in_keys)
-        tensordict.batch_size = [tensordict.shape[0], self.num_copies]
-        return self.vmapped_forward(tensordict, self.params_td)
+    def forward(self, features: torch.Tensor):
+        loc = self.actor_mean(features)
+        scale = self.scale_mapping(self.actor_std).expand_as(loc)
+        return loc, scale
 
 
 def init_(module):
@@ -147,25 +140,32 @@ class MAPPO:
         self.num_agents, self.action_dim = action_spec.shape[-2:]
         fake_input = observation_spec.zero()
 
-        actor_module = TensorDictModule(
-            nn.Sequential(
-                make_mlp([256, 256], nn.Mish),
-                Actor(self.action_dim)
-            ),
-            [("agents", "observation")], ["loc", "scale"]
-        ).to(self.device)
-        actor_module(fake_input)
-        
-        if not cfg.share_actor:
-            actor_module = EnsembleModule(actor_module, self.num_agents)
-        else:
+        if cfg.share_actor:
+            actor_module = TensorDictModule(
+                nn.Sequential(
+                    make_mlp([256, 256], nn.Mish),
+                    Actor(self.action_dim)
+                ),
+                [("agents", "observation")], ["loc", "scale"]
+            ).to(self.device)
+            actor_module(fake_input)
             actor_module.apply(init_)
+        else:
+            # one set of parameters per agent, all agents computed with batched matmuls
+            observation_dim = observation_spec[("agents", "observation")].shape[-1]
+            actor_module = TensorDictModule(
+                nn.Sequential(
+                    GroupedMLP(self.num_agents, [observation_dim, 256, 256], nn.LayerNorm, nn.Mish),
+                    GroupedActor(self.num_agents, 256, self.action_dim)
+                ),
+                [("agents", "observation")], ["loc", "scale"]
+            ).to(self.device)
 
         self.actor = ProbabilisticActor(
             module=actor_module,
             in_keys=["loc", "scale"],
             out_keys=[("agents", "action")],
-            distribution_class=IndependentNormal,
+            distribution_class=DiagNormal,
             return_log_prob=True
         ).to(self.device)
 
@@ -180,19 +180,39 @@ class MAPPO:
         self.critic(fake_input)
         self.critic.apply(init_)
 
+        # the trunks run in `cfg.precision`, the distribution and value heads in float32
+        setup_precision(
+            nn.ModuleDict({"actor": self.actor, "critic": self.critic}),
+            getattr(cfg, "precision", "fp32"),
+            [actor_module.module[0], self.critic.module[0]],
+            getattr(cfg, "fp32_modules", None) or (),
+        )
+        # run only the actor during rollouts and evaluate the critic over the
+        # whole rollout in a single batched forward in `train_op`
+        self.defer_values = getattr(cfg, "defer_values", False)
+
         self.actor_opt = torch.optim.Adam(self.actor.parameters(), lr=5e-4)
         self.critic_opt = torch.optim.Adam(self.critic.parameters(), lr=5e-4)
         self.value_norm = ValueNorm1(input_shape=1).to(self.device)
     
     def __call__(self, tensordict: TensorDict):
         tensordict.update(self.actor(tensordict))
-        self.critic(tensordict)
+        if not self.defer_values:
+            self.critic(tensordict)
         return tensordict
     
     def train_op(self, tensordict: TensorDict):
         next_tensordict = tensordict["next"]
         with torch.no_grad():
-            next_values = self.critic(next_tensordict)["state_value"]
+            if self.defer_values:
+                critic_input = torch.stack([
+                    tensordict.select(*self.critic.in_keys),
+                    next_tensordict.select(*self.critic.in_keys)
+                ])
+                values, next_values = self.critic(critic_input)["state_value"]
+                tensordict.set("state_value", values)
+            else:
+                next_values = self.critic(next_tensordict)["state_value"]
         rewards = tensordict[("next", "agents", "reward")]
         dones = tensordict[("next", "terminated")]
         dones = einops.repeat(dones, "t n 1 -> t n a 1", a=self.num_agents)
@@ -211,9 +231,9 @@ class MAPPO:
         tensordict.set("ret", ret)
 
         infos = []
+        sampler = MinibatchSampler(tensordict, self.cfg.num_minibatches)
         for epoch in range(self.cfg.ppo_epochs):
-            batch = make_batch(tensordict, self.cfg.num_minibatches)
-            for minibatch in batch:
+            for minibatch in sampler:
                 infos.append(self._update(minibatch))
         
         infos: TensorDict = torch.stack(infos).to_tensordict()
@@ -260,13 +280,3 @@ class MAPPO:
             "critic_grad_norm": critic_grad_norm,
             "explained_var": explained_var
         }, [])
-
-
-def make_batch(tensordict: TensorDict, num_minibatches: int):
-    tensordict = tensordict.reshape(-1)
-    perm = torch.randperm(
-        (tensordict.shape[0] // num_minibatches) * num_minibatches,
-        device=tensordict.device,
-    ).reshape(num_minibatches, -1)
-    for indices in perm:
-        yield tensordict[indices]
\ No newline at end of file
@@ -78,8 +78,7 @@ class DiagGaussian(nn.Module):
     def forward(self, x):
         action_mean = self.fc_mean(x)
         action_std = torch.broadcast_to(torch.exp(self.log_std), action_mean.shape)
-        dist = D.Independent(D.Normal(action_mean, action_std), 1)
-        return dist
+        return DiagNormal(action_mean, action_std)
 
 
 # class SafeTanhTransform(D.TanhTransform):
@@ -145,6 +144,69 @@ class IndependentNormal(D.Independent):
         super().__init__(base_dist, 1, validate_args=validate_args)
 
 
+def diag_normal_log_prob(loc: torch.Tensor, scale: torch.Tensor, value: torch.Tensor):
+    """The log-density of a diagonal Gaussian, summed over the last dimension."""
+    z = (value - loc) / scale
+    return -torch.addcmul(scale.log(), z, z, value=0.5).sum(-1) - 0.5 * math.log(2 * math.pi) * loc.shape[-1]
+
+
+def diag_normal_entropy(scale: torch.Tensor):
+    return scale.log().sum(-1) + (0.5 + 0.5 * math.log(2 * math.pi)) * scale.shape[-1]
+
+
+class DiagNormal(D.Distribution):
+    """
+    A drop-in for `IndependentNormal` that skips `D.Independent(D.Normal)`:
+    sampling is `loc + scale * randn` and `log_prob`/`entropy` are closed-form
+    expressions over the event dimension, with argument validation off.
+    """
+
+    arg_constraints = {"loc": constraints.real, "scale": constraints.positive}
+    support = constraints.real_vector
+    has_rsample = True
+
+    def __init__(self, loc: torch.Tensor, scale: torch.Tensor, validate_args=None):
+        self.loc = loc
+        self.scale = torch.clamp_min(scale, 1e-6).expand_as(loc)
+        super().__init__(loc.shape[:-1], loc.shape[-1:], validate_args=False)
+
+    @property
+    def mean(self):
+        return self.loc
+
+    @property
+    def mode(self):
+        return self.loc
+
+    @property
+    def deterministic_sample(self):
+        return self.loc
+
+    @property
+    def stddev(self):
+        return self.scale
+
+    @property
+    def variance(self):
+        return self.scale.pow(2)
+
+    def rsample(self, sample_shape: torch.Size = torch.Size()):
+        shape = self._extended_shape(sample_shape)
+        eps = torch.randn(shape, dtype=self.loc.dtype, device=self.loc.device)
+        return self.loc + eps * self.scale
+
+    def sample(self, sample_shape: torch.Size = torch.Size()):
+        shape = self._extended_shape(sample_shape)
+        with torch.no_grad():
+            return torch.normal(self.loc.expand(shape), self.scale.expand(shape))
+
+    def log_prob(self, value: torch.Tensor):
+        return diag_normal_log_prob(self.loc, self.scale, value)
+
+    def entropy(self):
+        return diag_normal_entropy(self.scale)
+
+
 class IndependentBeta(D.Independent):
     def __init__(
         self,
@@ -284,60 +346,73 @@ class IndependentBetaModule(nn.Module):
 
 
 class MultiCategorical(D.Distribution):
+    """
+    Independent categoricals over D action dimensions with possibly different
+    numbers of choices, held as one padded logits tensor [*, D, K_max] and a
+    validity mask [D, K_max], so that sampling (Gumbel-max), `log_prob`
+    (gather) and `entropy` are single vectorized ops regardless of D.
+
+    `logits`/`probs` are either such a padded tensor (with `mask`, which
+    defaults to all valid) or a list of [*, K_i] tensors, one per dimension.
+    """
+
     def __init__(
         self,
-        logits: List[torch.Tensor] = None,
-        probs: List[torch.Tensor] = None,
+        logits: Union[torch.Tensor, List[torch.Tensor]] = None,
+        probs: Union[torch.Tensor, List[torch.Tensor]] = None,
+        mask: torch.Tensor = None,
     ):
         if (probs is None) == (logits is None):
             raise ValueError(
                 "Either `probs` or `logits` must be specified, but not both."
             )
 
-        if probs is not None:
-            self.base_dists = [D.Categorical(probs=probs_) for probs_ in probs]
-        else:
-            self.base_dists = [D.Categorical(logits=logits_) for logits_ in logits]
-
-    def sample(self, sample_shape=torch.Size()):
-        if not isinstance(sample_shape, torch.Size):
-            sample_shape = torch.Size(sample_shape)
-        return torch.stack(
-            [dist.sample(sample_shape) for dist in self.base_dists], dim=-1
-        )
-
-    @lazy_property
-    def logits(self):
-        return [dist.logits for dist in self.base_dists]
+        if logits is None:
+            logits = [p.log() for p in probs] if isinstance(probs, (list, tuple)) else probs.log()
+        if isinstance(logits, (list, tuple)):
+            logits, mask = _pad_logits(logits)
+        self.mask = mask
+        if mask is not None:
+            logits = logits.masked_fill(~mask, torch.finfo(logits.dtype).min)
+        self.logits = logits - logits.logsumexp(-1, keepdim=True)
+        super().__init__(self.logits.shape[:-2], self.logits.shape[-2:-1], validate_args=False)
 
     @lazy_property
     def probs(self):
-        return [dist.probs for dist in self.base_dists]
+        return self.logits.exp()
 
     @property
     def mode(self):
-        return torch.stack([dist.mode for dist in self.base_dists], dim=-1)
+        return self.logits.argmax(-1)
 
     def sample(self, sample_shape=torch.Size()):
         if not isinstance(sample_shape, torch.Size):
             sample_shape = torch.Size(sample_shape)
-        return torch.stack(
-            [dist.sample(sample_shape) for dist in self.base_dists], dim=-1
-        )
+        logits = self.logits.expand(sample_shape + self.logits.shape)
+        # Gumbel-max: argmax(logits + g) with g = -log(-log(u)), u ~ U(0, 1)
+        with torch.no_grad():
+            return (logits - torch.rand_like(logits).log_().neg_().log_()).argmax(-1)
 
     def log_prob(self, value):
-        return torch.stack(
-            [
-                dist.log_prob(v)
-                for dist, v in zip(self.base_dists, value.unbind(dim=-1))
-            ],
-            dim=-1,
-        ).sum(dim=-1)
+        logits = self.logits
+        if value.shape[:-1] != self.batch_shape:
+            shape = torch.broadcast_shapes(value.shape, self.batch_shape + self.event_shape)
+            logits = logits.expand(shape + logits.shape[-1:])
+            value = value.expand(shape)
+        return logits.gather(-1, value.long().unsqueeze(-1)).squeeze(-1).sum(-1)
 
     def entropy(self):
-        return torch.stack([dist.entropy() for dist in self.base_dists], dim=-1).sum(
-            dim=-1
-        )
+        # padded entries have a zero probability, keep 0 * -inf out of the sum
+        logits = self.logits.clamp(min=torch.finfo(self.logits.dtype).min)
+        return -(self.probs * logits).sum((-2, -1))
+
+
+def _pad_logits(logits: List[torch.Tensor]):
+    sizes = [l.shape[-1] for l in logits]
+    k_max = max(sizes)
+    padded = torch.stack([F.pad(l, (0, k_max - k)) for l, k in zip(logits, sizes)], dim=-2)
+    mask = torch.arange(k_max, device=padded.device) < torch.as_tensor(sizes, device=padded.device).unsqueeze(-1)
+    return padded, mask
 
 
 class MultiCategoricalModule(nn.Module):
@@ -353,10 +428,22 @@ class MultiCategoricalModule(nn.Module):
             if isinstance(output_dims, torch.Tensor)
             else output_dims
         )
+        # which output of `operator` each entry of the padded [D, K_max] logits is
+        sizes = torch.as_tensor(self.output_dims)
+        offsets = torch.cumsum(sizes, 0) - sizes
+        arange = torch.arange(int(sizes.max()))
+        mask = arange < sizes.unsqueeze(-1)
+        index = torch.where(mask, offsets.unsqueeze(-1) + arange, 0)
+        self.register_buffer("index", index, persistent=False)
+        self.register_buffer("mask", mask, persistent=False)
 
     def forward(self, tensor: torch.Tensor) -> Tuple[torch.Tensor]:
-        logits = self.operator(tensor)
-        logits = logits.split(self.output_dims, dim=-1)
+        # gather and mask the rows of the parameters rather than the batch of
+        # outputs, padded entries get a zero weight and the lowest bias
+        index, mask = self.index.flatten(), self.mask.flatten()
+        weight = self.operator.weight[index] * mask.unsqueeze(-1)
+        bias = self.operator.bias[index].masked_fill(~mask, torch.finfo(self.operator.bias.dtype).min)
+        logits = F.linear(tensor, weight, bias).unflatten(-1, self.index.shape)
         return MultiCategorical(logits=logits)
 
 
@@ -28,6 +28,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from tensordict import TensorDict
+from torch.utils.checkpoint import checkpoint
 
 from torch import Tensor
 from torchrl.data import CompositeSpec, TensorSpec
@@ -71,6 +72,159 @@ class MLP(nn.Module):
         return self.layers(x)
 
 
+class GroupedLinear(nn.Module):
+    """
+    `num_groups` independent linear layers, e.g., one per agent, computed with
+    a single batched matmul instead of `vmap` over stacked parameters.
+
+    input: [*, num_groups, in_features] -> [*, num_groups, out_features]
+    """
+
+    def __init__(self, num_groups: int, in_features: int, out_features: int, bias: bool = True):
+        super().__init__()
+        self.num_groups = num_groups
+        self.in_features = in_features
+        self.out_features = out_features
+        self.weight = nn.Parameter(torch.empty(num_groups, in_features, out_features))
+        if bias:
+            self.bias = nn.Parameter(torch.empty(num_groups, 1, out_features))
+        else:
+            self.register_parameter("bias", None)
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        # the same distribution as the default of `nn.Linear`
+        bound = 1 / self.in_features ** 0.5
+        nn.init.uniform_(self.weight, -bound, bound)
+        if self.bias is not None:
+            nn.init.uniform_(self.bias, -bound, bound)
+
+    @classmethod
+    def from_linears(cls, linears: Sequence[nn.Linear]) -> "GroupedLinear":
+        linear = linears[0]
+        module = cls(len(linears), linear.in_features, linear.out_features, linear.bias is not None)
+        with torch.no_grad():
+            module.weight.copy_(torch.stack([linear.weight.T for linear in linears]))
+            if module.bias is not None:
+                module.bias.copy_(torch.stack([linear.bias for linear in linears]).unsqueeze(1))
+        return module.to(linear.weight.device)
+
+    def forward(self, x: torch.Tensor):
+        batch_shape = x.shape[:-2]
+        x = self.forward_grouped(x.reshape(-1, self.num_groups, self.in_features).transpose(0, 1))
+        return x.transpose(0, 1).reshape(*batch_shape, self.num_groups, self.out_features)
+
+    def forward_grouped(self, x: torch.Tensor):
+        """input: [num_groups, N, in_features] -> [num_groups, N, out_features]"""
+        if self.bias is None:
+            return torch.bmm(x, self.weight)
+        return torch.baddbmm(self.bias, x, self.weight)
+
+    def extra_repr(self) -> str:
+        return f"num_groups={self.num_groups}, in_features={self.in_features}, out_features={self.out_features}, bias={self.bias is not None}"
+
+
+class GroupedLayerNorm(nn.Module):
+    """`nn.LayerNorm` over the last dimension with a separate affine transform per group."""
+
+    def __init__(self, num_groups: int, normalized_shape: int, eps: float = 1e-5):
+        super().__init__()
+        self.normalized_shape = (normalized_shape,)
+        self.eps = eps
+        self.weight = nn.Parameter(torch.ones(num_groups, normalized_shape))
+        self.bias = nn.Parameter(torch.zeros(num_groups, normalized_shape))
+
+    @classmethod
+    def from_layer_norms(cls, layer_norms: Sequence[nn.LayerNorm]) -> "GroupedLayerNorm":
+        layer_norm = layer_norms[0]
+        module = cls(len(layer_norms), layer_norm.normalized_shape[-1], layer_norm.eps)
+        with torch.no_grad():
+            module.weight.copy_(torch.stack([layer_norm.weight for layer_norm in layer_norms]))
+            module.bias.copy_(torch.stack([layer_norm.bias for layer_norm in layer_norms]))
+        return module.to(layer_norm.weight.device)
+
+    def forward(self, x: torch.Tensor):
+        return torch.addcmul(self.bias, F.layer_norm(x, self.normalized_shape, eps=self.eps), self.weight)
+
+    def extra_repr(self) -> str:
+        return f"num_groups={self.weight.shape[0]}, normalized_shape={self.normalized_shape}, eps={self.eps}"
+
+    def forward_grouped(self, x: torch.Tensor):
+        """input: [num_groups, N, normalized_shape]"""
+        x = F.layer_norm(x, self.normalized_shape, eps=self.eps)
+        return torch.addcmul(self.bias.unsqueeze(1), x, self.weight.unsqueeze(1))
+
+
+class GroupedMLP(nn.Module):
+    """
+    A drop-in for `num_groups` non-shared `MLP`s (one per agent) that holds the
+    weights of each layer as a [num_groups, in, out] tensor and computes all the
+    groups with one `torch.baddbmm` per layer.
+
+    input: [*, num_groups, num_units[0]] -> [*, num_groups, num_units[-1]]
+    """
+
+    def __init__(
+        self,
+        num_groups: int,
+        num_units: Sequence[int],
+        normalization: Union[str, nn.Module] = None,
+        activation_class: nn.Module = nn.ELU,
+        activation_kwargs: Optional[Dict] = None,
+    ):
+        super().__init__()
+        layers = []
+        if activation_kwargs is not None:
+            activation_class = partial(activation_class, **activation_kwargs)
+        if isinstance(normalization, str):
+            normalization = getattr(nn, normalization, None)
+        if normalization not in (None, nn.LayerNorm):
+            raise NotImplementedError(normalization)
+        for i, (in_dim, out_dim) in enumerate(zip(num_units[:-1], num_units[1:])):
+            layers.append(GroupedLinear(num_groups, in_dim, out_dim))
+            if i < len(num_units) - 1:
+                layers.append(activation_class())
+            if normalization is not None:
+                layers.append(GroupedLayerNorm(num_groups, out_dim))
+        self.layers = nn.Sequential(*layers)
+        self.num_groups = num_groups
+        self.input_dim = num_units[0]
+        self.output_shape = torch.Size((num_units[-1],))
+
+    @classmethod
+    def from_mlps(cls, mlps: Sequence[MLP]) -> "GroupedMLP":
+        """Stack the parameters of identically configured `MLP`s."""
+        module = cls.__new__(cls)
+        nn.Module.__init__(module)
+        layers = []
+        for group in zip(*(mlp.layers for mlp in mlps)):
+            if isinstance(group[0], nn.Linear):
+                layers.append(GroupedLinear.from_linears(group))
+            elif isinstance(group[0], nn.LayerNorm):
+                layers.append(GroupedLayerNorm.from_layer_norms(group))
+            elif any(p.numel() for p in group[0].parameters()):
+                raise NotImplementedError(type(group[0]))
+            else:
+                layers.append(group[0])
+        module.layers = nn.Sequential(*layers)
+        module.num_groups = len(mlps)
+        module.input_dim = mlps[0].input_dim
+        module.output_shape = mlps[0].output_shape
+        return module
+
+    def forward(self, x: torch.Tensor):
+        # the layers run on [num_groups, N, *], so that the input and output
+        # are the only transposes
+        batch_shape = x.shape[:-2]
+        x = x.reshape(-1, self.num_groups, x.shape[-1]).transpose(0, 1)
+        for layer in self.layers:
+            if isinstance(layer, (GroupedLinear, GroupedLayerNorm)):
+                x = layer.forward_grouped(x)
+            else:
+                x = layer(x)
+        return x.transpose(0, 1).reshape(*batch_shape, self.num_groups, x.shape[-1])
+
+
 def split(x, split_shapes, split_sizes):
     return [
         xi.unflatten(-1, shape)
@@ -197,14 +351,65 @@ class RelationEncoder(nn.Module):
         aij = ij(a)
         g_aij = self.g(aij)
         if mask is not None:
-            if mask.shape == x.shape[:-1]:
+            if mask.shape == a.shape[:-1]:
                 mask = mask.unsqueeze(-1)
-            elif not mask.dim() == x.dim():
+            elif not mask.dim() == a.dim():
                 raise RuntimeError(mask.shape)
-            g_aij *= ij(mask).all(-1)
+            g_aij *= ij(mask).all(-1, keepdim=True)
         return self.f(torch.sum(g_aij, dim=(-3, -2)))
 
 
+@register(ENCODERS_MAP)
+class ChunkedRelationEncoder(RelationEncoder):
+    """
+    `RelationEncoder` (same parameters) that never materializes the [N, N] pair
+    tensors. The first layer of g is split into per-entity projections,
+    g(a_i, a_j) = h(W_i a_i + W_j a_j + b), and the sum over pairs is
+    accumulated over blocks of `chunk_size` j's. With gradients enabled, each
+    block is checkpointed (except under `vmap`), so the activation memory is
+    O(N * chunk_size * d) instead of O(N^2 * d) at the cost of recomputing h in
+    the backward pass.
+    """
+
+    def __init__(self, input_spec: CompositeSpec, *, chunk_size: int = 16, **kwargs) -> None:
+        super().__init__(input_spec, **kwargs)
+        self.chunk_size = chunk_size
+
+    def forward(self, x: torch.Tensor, mask: torch.Tensor = None):
+        a: torch.Tensor = self.split_embed(x)
+        mlp, norm = (self.g[0], list(self.g[1:])) if isinstance(self.g, nn.Sequential) else (self.g, [])
+        linear, h = mlp.layers[0], nn.Sequential(*mlp.layers[1:], *norm)
+        w_i, w_j = linear.weight.chunk(2, dim=-1)
+        p_i = F.linear(a, w_i, linear.bias)
+        p_j = F.linear(a, w_j)
+        if mask is not None:
+            if mask.shape == a.shape[:-1]:
+                mask = mask.unsqueeze(-1)
+            elif not mask.dim() == a.dim():
+                raise RuntimeError(mask.shape)
+            mask = mask.to(p_i.dtype)
+
+        total = 0.
+        for j in range(0, a.shape[-2], self.chunk_size):
+            args = (h, p_i, p_j[..., j:j+self.chunk_size, :])
+            if mask is not None:
+                args = args + (mask, mask[..., j:j+self.chunk_size, :])
+            # checkpointed blocks would be recomputed outside of `vmap` (as used
+            # for the per-agent actors of MAPPO), so not for batched tensors
+            if torch.is_grad_enabled() and not torch._C._functorch.is_batchedtensor(p_i):
+                total = total + checkpoint(_pair_sum, *args, use_reentrant=False)
+            else:
+                total = total + _pair_sum(*args)
+        return self.f(total)
+
+
+def _pair_sum(h: nn.Module, p_i: Tensor, p_j: Tensor, mask_i: Tensor = None, mask_j: Tensor = None):
+    g_ij = h(p_i.unsqueeze(-2) + p_j.unsqueeze(-3))
+    if mask_i is not None:
+        g_ij = g_ij * (mask_i.unsqueeze(-2) * mask_j.unsqueeze(-3))
+    return g_ij.sum(dim=(-3, -2))
+
+
 @register(ENCODERS_MAP)
 class PartialRelationEncoder(nn.Module):
     """
@@ -308,6 +513,34 @@ class PartialAttentionEncoder(nn.Module):
     def _ff_block(self, x: Tensor):
         x = self.linear2(self.activation(self.linear1(x)))
         return x
+
+
+@register(ENCODERS_MAP)
+class SDPAttentionEncoder(PartialAttentionEncoder):
+    """
+    `PartialAttentionEncoder` (same parameters) computing the attention with
+    `F.scaled_dot_product_attention`, which dispatches to fused kernels that do
+    not materialize the attention weights.
+    """
+
+    def _pa_block(self, x: Tensor, key_padding_mask: Optional[Tensor] = None):
+        attn = self.attn
+        w_q, w_k, w_v = attn.in_proj_weight.chunk(3)
+        b_q, b_k, b_v = attn.in_proj_bias.chunk(3)
+        q = F.linear(x[:, self.query_index], w_q, b_q)
+        k = F.linear(x, w_k, b_k)
+        v = F.linear(x, w_v, b_v)
+        # [batch, heads, L, head_dim]
+        q, k, v = (t.unflatten(-1, (attn.num_heads, -1)).transpose(-3, -2) for t in (q, k, v))
+        if key_padding_mask is not None:
+            # `nn.MultiheadAttention` masks out True, SDPA keeps True
+            if key_padding_mask.dtype == torch.bool:
+                key_padding_mask = ~key_padding_mask
+            key_padding_mask = key_padding_mask[:, None, None, :]
+        x = F.scaled_dot_product_attention(
+            q, k, v, attn_mask=key_padding_mask, dropout_p=attn.dropout if self.training else 0.
+        )
+        return attn.out_proj(x.transpose(-3, -2).flatten(-2))
     
 
 ################################## Vision Encoders ##################################
@@ -21,8 +21,87 @@
 # SOFTWARE.
 
 
+from typing import Optional, Union
+
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+
+
+def segment_rnn(
+    rnn: Union[nn.GRU, nn.LSTM],
+    input: torch.Tensor,
+    is_init: torch.Tensor,
+    hx: torch.Tensor,
+    cx: Optional[torch.Tensor] = None,
+    packed: Optional[bool] = None,
+):
+    """
+    Run a single-layer, batch-first `nn.GRU`/`nn.LSTM` over rollouts that contain
+    episode boundaries, where the hidden state is reset.
+
+    With `packed`, each row is split at `is_init` into segments that are packed
+    and fed to the fused sequence kernel in one call; segments starting at `t=0`
+    continue from `hx`/`cx`, all others from zeros. The outputs are scattered
+    back in place. Otherwise, the cell is stepped over time with the hidden state
+    masked at the boundaries. By default, only CUDA (cuDNN) tensors are packed:
+    the CPU kernels step over time themselves and their backward pass over
+    packed sequences is several times slower than stepping the cell.
+
+    input: [N, T, H_in], is_init: [N, T], hx/cx: [N, H]
+
+    Returns the output [N, T, H] and the final `hx` (and `cx`), each [N, H].
+    """
+    N, T = is_init.shape
+    is_init = is_init.bool()
+    if packed is None:
+        packed = input.is_cuda
+    if not packed:
+        return _masked_loop(rnn, input, is_init, hx, cx)
+    start = is_init.clone()
+    start[:, 0] = True
+    start = start.flatten()
+    seg_id = start.cumsum(0) - 1
+    first = start.nonzero().squeeze(-1)
+    lengths = torch.diff(first, append=first.new_tensor([N * T]))
+    pos = torch.arange(N * T, device=input.device) - first[seg_id]
+    # `pack_padded_sequence` wants the lengths on the cpu, this is the only sync
+    lengths_cpu = lengths.cpu()
+    S, L = first.shape[0], int(lengths_cpu.max())
+    index = seg_id * L + pos
+
+    padded = input.new_zeros(S * L, input.shape[-1]).index_copy(0, index, input.reshape(N * T, -1))
+    packed = pack_padded_sequence(padded.reshape(S, L, -1), lengths_cpu, batch_first=True, enforce_sorted=False)
+
+    env = first // T
+    carry = ((first % T == 0) & ~is_init.flatten()[first]).unsqueeze(-1)
+    if cx is None:
+        output, h_n = rnn(packed, (hx[env] * carry).unsqueeze(0))
+    else:
+        output, (h_n, c_n) = rnn(packed, ((hx[env] * carry).unsqueeze(0), (cx[env] * carry).unsqueeze(0)))
+    output, _ = pad_packed_sequence(output, batch_first=True, total_length=L)
+    output = output.reshape(S * L, -1).index_select(0, index).reshape(N, T, -1)
+
+    last = seg_id.reshape(N, T)[:, -1]
+    if cx is None:
+        return output, h_n[0, last]
+    return output, h_n[0, last], c_n[0, last]
+
+
+
+def _masked_loop(rnn: Union[nn.GRU, nn.LSTM], input: torch.Tensor, is_init: torch.Tensor, hx: torch.Tensor, cx: Optional[torch.Tensor]):
+    weights = (rnn.weight_ih_l0, rnn.weight_hh_l0, rnn.bias_ih_l0, rnn.bias_hh_l0)
+    mask = (~is_init).unsqueeze(-1).to(input.dtype)
+    output = []
+    for t in range(input.shape[1]):
+        if cx is None:
+            hx = torch.gru_cell(input[:, t], hx * mask[:, t], *weights)
+        else:
+            hx, cx = torch.lstm_cell(input[:, t], (hx * mask[:, t], cx * mask[:, t]), *weights)
+        output.append(hx)
+    output = torch.stack(output, dim=1)
+    return (output, hx) if cx is None else (output, hx, cx)
+
 
 """
 These modules are walk-arounds for using functorch.vmap since the batching rules for
@@ -20,8 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from omni_drones.utils.registry import lazy_attributes
 
-from .ppo import PPOPolicy
-from .ppo_rnn import PPORNNPolicy
-from .ppo_adapt import PPOAdaptivePolicy
-# from .mappo import MAPPOPolicy
+__getattr__, __all__ = lazy_attributes(__name__, {
+    "PPOPolicy": ".ppo",
+    "PPORNNPolicy": ".ppo_rnn",
+    "PPOAdaptivePolicy": ".ppo_adapt",
+})
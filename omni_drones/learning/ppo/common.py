@@ -25,6 +25,8 @@ import torch
 import torch.nn as nn
 from typing import Sequence
 
+from ..utils.gae import gae
+
 class GAE(nn.Module):
     def __init__(self, gamma, lmbda):
         super().__init__()
@@ -38,21 +40,15 @@ class GAE(nn.Module):
         reward: torch.Tensor, 
         terminated: torch.Tensor, 
         value: torch.Tensor, 
-        next_value: torch.Tensor
+        next_value: torch.Tensor,
+        done: torch.Tensor = None,
     ):
-        num_steps = terminated.shape[1]
-        advantages = torch.zeros_like(reward)
-        not_done = 1 - terminated.float()
-        gae = 0
-        for step in reversed(range(num_steps)):
-            delta = (
-                reward[:, step] 
-                + self.gamma * next_value[:, step] * not_done[:, step] 
-                - value[:, step]
-            )
-            advantages[:, step] = gae = delta + (self.gamma * self.lmbda * not_done[:, step] * gae)
-        returns = advantages + value
-        return advantages, returns
+        """`next_value` holds the values of the next states for every step; `done`
+        (terminated or truncated) ends the trace and defaults to `terminated`."""
+        return gae(
+            reward, value, next_value, terminated, done,
+            gamma=self.gamma, lmbda=self.lmbda, time_dim=1
+        )
 
 
 def make_mlp(num_units: Sequence[int,], activation=nn.LeakyReLU):
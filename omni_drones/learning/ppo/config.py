@@ -0,0 +1,107 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# The configs of the PPO family are kept apart from the algorithms so that they
+# can be registered with Hydra without importing the algorithm modules, which
+# are only loaded when looked up in `omni_drones.learning.ALGOS`.
+
+from dataclasses import dataclass, field
+from typing import Any, List, Union
+
+from hydra.core.config_store import ConfigStore
+
+
+@dataclass
+class PPOConfig:
+    name: str = "ppo"
+    train_every: int = 32
+    ppo_epochs: int = 4
+    num_minibatches: int = 16
+
+    # whether to use privileged information
+    priv_actor: bool = False
+    priv_critic: bool = False
+
+    # "compile" runs the minibatch update as a `torch.compile`d loss function
+    # with foreach gradient clipping and fused Adam (non-privileged actor and critic only)
+    compile: str = "eager"
+
+    # "bf16" runs the actor and critic trunks under bfloat16 autocast, both for
+    # rollout inference and in the update; heads, losses, GAE, value normalization
+    # and optimizer states stay float32. `fp32_modules` opts submodules (named
+    # relative to the policy, e.g. "critic.module.0.0" for the first layer of
+    # the critic trunk or "critic.module.0" for all of it) back out
+    precision: str = "fp32"
+    fp32_modules: List[str] = field(default_factory=list)
+
+    # run only the actor during rollouts and evaluate the critic over the whole
+    # rollout in a single batched forward in `train_op`
+    defer_values: bool = False
+
+    checkpoint_path: Union[str, None] = None
+
+
+@dataclass
+class PPORNNConfig:
+    name: str = "ppo_rnn"
+    train_every: int = 32
+    ppo_epochs: int = 4
+    num_minibatches: int = 16
+    seq_len: int = 16
+
+    # whether to take in priviledged infomation
+    priv: bool = False
+
+    rnn: str = "gru"
+    skip_conn: Union[str, None] = None
+    hidden_size: int = 128
+
+    checkpoint_path: Union[str, None] = None
+
+
+@dataclass
+class PPOAdaptConfig:
+    name: str = "ppo_adapt"
+    train_every: int = 32
+    ppo_epochs: int = 4
+    num_minibatches: int = 16
+
+    checkpoint_path: Union[str, None] = None
+    phase: str = "encoder"
+    condition_mode: str = "cat"
+
+    # what the adaptation module learns to predict
+    adaptation_key: Any = "context"
+
+    def __post_init__(self):
+        assert self.condition_mode.lower() in ("cat", "film")
+        assert self.adaptation_key in ("context", ("agents", "intrinsics"), "_feature")
+        assert self.phase in ("encoder", "adaptation", "joint", "finetune")
+
+
+cs = ConfigStore.instance()
+cs.store("ppo", node=PPOConfig, group="algo")
+cs.store("ppo_priv", node=PPOConfig(priv_actor=True, priv_critic=True), group="algo")
+cs.store("ppo_priv_critic", node=PPOConfig(priv_critic=True), group="algo")
+cs.store("ppo_gru", node=PPORNNConfig, group="algo")
+cs.store("ppo_lstm", node=PPORNNConfig(rnn="lstm"), group="algo")
+cs.store("ppo_adapt", node=PPOAdaptConfig, group="algo")
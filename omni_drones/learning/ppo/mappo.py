@@ -36,8 +36,9 @@ from hydra.core.config_store import ConfigStore
 from dataclasses import dataclass
 import logging
 
+from ..utils.minibatch import MinibatchSampler
 from ..utils.valuenorm import ValueNorm1
-from ..modules.distributions import IndependentNormal
+from ..modules.distributions import DiagNormal
 from .common import GAE
 
 @dataclass
@@ -106,7 +107,7 @@ class MAPPOPolicy:
             module=actor_module,
             in_keys=["loc", "scale"],
             out_keys=[("agents", "action")],
-            distribution_class=IndependentNormal,
+            distribution_class=DiagNormal,
             return_log_prob=True
         ).to(self.device)
 
@@ -166,9 +167,9 @@ class MAPPOPolicy:
         tensordict.set("ret", ret)
 
         infos = []
+        sampler = MinibatchSampler(tensordict, self.cfg.num_minibatches)
         for epoch in range(self.cfg.ppo_epochs):
-            batch = make_batch(tensordict, self.cfg.num_minibatches)
-            for minibatch in batch:
+            for minibatch in sampler:
                 infos.append(self._update(minibatch))
         
         infos: TensorDict = torch.stack(infos).to_tensordict()
@@ -214,13 +215,3 @@ class MAPPOPolicy:
             "critic_grad_norm": critic_grad_norm,
             "explained_var": explained_var
         }, [])
-
-
-def make_batch(tensordict: TensorDict, num_minibatches: int):
-    tensordict = tensordict.reshape(-1)
-    perm = torch.randperm(
-        (tensordict.shape[0] // num_minibatches) * num_minibatches,
-        device=tensordict.device,
-    ).reshape(num_minibatches, -1)
-    for indices in perm:
-        yield tensordict[indices]
\ No newline at end of file
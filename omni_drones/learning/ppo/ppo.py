@@ -32,32 +32,17 @@ from torchrl.envs.transforms import CatTensors
 from tensordict import TensorDict
 from tensordict.nn import TensorDictModuleBase, TensorDictModule, TensorDictSequential
 
-from hydra.core.config_store import ConfigStore
 from dataclasses import dataclass
 from typing import Union
 import einops
 
+from omni_drones.utils.torch import maybe_compile
+from ..utils.minibatch import MinibatchSampler
+from ..utils.precision import setup_precision
 from ..utils.valuenorm import ValueNorm1
-from ..modules.distributions import IndependentNormal
+from ..modules.distributions import DiagNormal, diag_normal_entropy, diag_normal_log_prob
 from .common import GAE
-
-@dataclass
-class PPOConfig:
-    name: str = "ppo"
-    train_every: int = 32
-    ppo_epochs: int = 4
-    num_minibatches: int = 16
-
-    # whether to use privileged information
-    priv_actor: bool = False
-    priv_critic: bool = False
-
-    checkpoint_path: Union[str, None] = None
-
-cs = ConfigStore.instance()
-cs.store("ppo", node=PPOConfig, group="algo")
-cs.store("ppo_priv", node=PPOConfig(priv_actor=True, priv_critic=True), group="algo")
-cs.store("ppo_priv_critic", node=PPOConfig(priv_critic=True), group="algo")
+from .config import PPOConfig
 
 
 def make_mlp(num_units):
@@ -81,6 +66,16 @@ class Actor(nn.Module):
         return loc, scale
 
 
+def _trunks(module: Union[TensorDictModule, TensorDictSequential]):
+    # the feature extractors of an actor/critic, i.e., everything but the output head
+    if isinstance(module, TensorDictSequential):
+        return sum((_trunks(m) for m in module.module if isinstance(m, TensorDictModule)), [])
+    net = module.module
+    if isinstance(net, nn.Sequential) and isinstance(net[-1], (Actor, nn.Linear)):
+        return list(net[:-1])
+    return [net]
+
+
 class PPOPolicy(TensorDictModuleBase):
 
     def __init__(
@@ -126,7 +121,7 @@ class PPOPolicy(TensorDictModuleBase):
             module=actor_module,
             in_keys=["loc", "scale"],
             out_keys=[("agents", "action")],
-            distribution_class=IndependentNormal,
+            distribution_class=DiagNormal,
             return_log_prob=True
         ).to(self.device)
 
@@ -165,20 +160,49 @@ class PPOPolicy(TensorDictModuleBase):
             self.actor.apply(init_)
             self.critic.apply(init_)
 
-        self.actor_opt = torch.optim.Adam(self.actor.parameters(), lr=5e-4)
-        self.critic_opt = torch.optim.Adam(self.critic.parameters(), lr=5e-4)
+        setup_precision(
+            self,
+            self.cfg.precision,
+            _trunks(actor_module) + _trunks(self.critic),
+            self.cfg.fp32_modules
+        )
+
+        if self.cfg.compile in (None, "eager", "none"):
+            self.actor_opt = torch.optim.Adam(self.actor.parameters(), lr=5e-4)
+            self.critic_opt = torch.optim.Adam(self.critic.parameters(), lr=5e-4)
+            self._update = self._update_eager
+        else:
+            if self.cfg.priv_actor or self.cfg.priv_critic:
+                raise NotImplementedError("The compiled update does not support privileged actors or critics.")
+            # plain references, so that the state_dict keys are the same as in eager mode
+            object.__setattr__(self, "actor_net", actor_module.module)
+            object.__setattr__(self, "critic_net", self.critic.module)
+            self.actor_opt = _fast_adam(self.actor.parameters(), lr=5e-4)
+            self.critic_opt = _fast_adam(self.critic.parameters(), lr=5e-4)
+            # the sampler drops the remainder, so minibatch shapes are static
+            self._loss = maybe_compile(self._loss_fn, self.cfg.compile, dynamic=False)
+            self._update = self._update_compiled
         self.value_norm = ValueNorm1(reward_spec.shape[-2:]).to(self.device)
     
     def __call__(self, tensordict: TensorDict):
         self.actor(tensordict)
-        self.critic(tensordict)
+        if not self.cfg.defer_values:
+            self.critic(tensordict)
         tensordict.exclude("loc", "scale", "feature", inplace=True)
         return tensordict
 
     def train_op(self, tensordict: TensorDict):
         next_tensordict = tensordict["next"]
         with torch.no_grad():
-            next_values = self.critic(next_tensordict)["state_value"]
+            if self.cfg.defer_values:
+                critic_input = torch.stack([
+                    tensordict.select(*self.critic.in_keys),
+                    next_tensordict.select(*self.critic.in_keys)
+                ])
+                values, next_values = self.critic(critic_input)["state_value"]
+                tensordict.set("state_value", values)
+            else:
+                next_values = self.critic(next_tensordict)["state_value"]
         rewards = tensordict[("next", "agents", "reward")]
         dones = einops.repeat(
             tensordict[("next", "terminated")],
@@ -200,16 +224,16 @@ class PPOPolicy(TensorDictModuleBase):
         tensordict.set("ret", ret)
 
         infos = []
+        sampler = MinibatchSampler(tensordict, self.cfg.num_minibatches)
         for epoch in range(self.cfg.ppo_epochs):
-            batch = make_batch(tensordict, self.cfg.num_minibatches)
-            for minibatch in batch:
+            for minibatch in sampler:
                 infos.append(self._update(minibatch))
         
         infos: TensorDict = torch.stack(infos).to_tensordict()
         infos = infos.apply(torch.mean, batch_size=[])
         return {k: v.item() for k, v in infos.items()}
 
-    def _update(self, tensordict: TensorDict):
+    def _update_eager(self, tensordict: TensorDict):
         dist = self.actor.get_dist(tensordict)
         log_probs = dist.log_prob(tensordict[("agents", "action")])
         entropy = dist.entropy()
@@ -249,12 +273,68 @@ class PPOPolicy(TensorDictModuleBase):
             "explained_var": explained_var
         }, [])
 
+    def _loss_fn(
+        self,
+        observation: torch.Tensor,
+        action: torch.Tensor,
+        sample_log_prob: torch.Tensor,
+        adv: torch.Tensor,
+        b_values: torch.Tensor,
+        b_returns: torch.Tensor,
+    ):
+        """The loss of :meth:`_update_eager` as a pure function of flat tensors."""
+        loc, scale = self.actor_net(observation)
+        scale = torch.clamp_min(scale, 1e-6)
+        log_probs = diag_normal_log_prob(loc, scale, action)
+        entropy = diag_normal_entropy(scale)
+
+        ratio = torch.exp(log_probs - sample_log_prob).unsqueeze(-1)
+        surr1 = adv * ratio
+        surr2 = adv * ratio.clamp(1.-self.clip_param, 1.+self.clip_param)
+        policy_loss = - torch.mean(torch.min(surr1, surr2)) * self.action_dim
+        entropy_loss = - self.entropy_coef * torch.mean(entropy)
+
+        values = self.critic_net(observation)
+        values_clipped = b_values + (values - b_values).clamp(
+            -self.clip_param, self.clip_param
+        )
+        value_loss_clipped = F.huber_loss(values_clipped, b_returns, delta=10.)
+        value_loss = torch.max(F.huber_loss(values, b_returns, delta=10.), value_loss_clipped)
+
+        loss = policy_loss + entropy_loss + value_loss
+        explained_var = 1 - F.mse_loss(values.detach(), b_returns) / b_returns.var()
+        return loss, policy_loss.detach(), value_loss.detach(), entropy.detach().mean(), explained_var
+
+    def _update_compiled(self, tensordict: TensorDict):
+        loss, policy_loss, value_loss, entropy, explained_var = self._loss(
+            tensordict[("agents", "observation")],
+            tensordict[("agents", "action")],
+            tensordict["sample_log_prob"],
+            tensordict["adv"],
+            tensordict["state_value"],
+            tensordict["ret"],
+        )
+        self.actor_opt.zero_grad()
+        self.critic_opt.zero_grad()
+        loss.backward()
+        actor_grad_norm = nn.utils.clip_grad_norm_(self.actor.parameters(), 5, foreach=True)
+        critic_grad_norm = nn.utils.clip_grad_norm_(self.critic.parameters(), 5, foreach=True)
+        self.actor_opt.step()
+        self.critic_opt.step()
+        return TensorDict({
+            "policy_loss": policy_loss,
+            "value_loss": value_loss,
+            "entropy": entropy,
+            "actor_grad_norm": actor_grad_norm,
+            "critic_grad_norm": critic_grad_norm,
+            "explained_var": explained_var
+        }, [])
+
 
-def make_batch(tensordict: TensorDict, num_minibatches: int):
-    tensordict = tensordict.reshape(-1)
-    perm = torch.randperm(
-        (tensordict.shape[0] // num_minibatches) * num_minibatches,
-        device=tensordict.device,
-    ).reshape(num_minibatches, -1)
-    for indices in perm:
-        yield tensordict[indices]
\ No newline at end of file
+def _fast_adam(params, lr: float):
+    """Adam with the fused implementation where the device supports it, else foreach."""
+    params = list(params)
+    try:
+        return torch.optim.Adam(params, lr=lr, fused=True)
+    except (RuntimeError, TypeError):
+        return torch.optim.Adam(params, lr=lr, foreach=True)
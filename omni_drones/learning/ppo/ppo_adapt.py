@@ -34,36 +34,14 @@ from torchrl.objectives.utils import hold_out_net
 from tensordict import TensorDict, TensorDictBase
 from tensordict.nn import TensorDictModule, TensorDictSequential, TensorDictModuleBase
 
-from hydra.core.config_store import ConfigStore
 from dataclasses import dataclass
 from typing import Any, Mapping, Union, Tuple
 
+from ..utils.minibatch import MinibatchSampler
 from ..utils.valuenorm import ValueNorm1
-from ..modules.distributions import IndependentNormal
+from ..modules.distributions import DiagNormal
 from .common import GAE
-
-@dataclass
-class PPOConfig:
-    name: str = "ppo_adapt"
-    train_every: int = 32
-    ppo_epochs: int = 4
-    num_minibatches: int = 16
-
-    checkpoint_path: Union[str, None] = None
-    phase: str = "encoder"
-    condition_mode: str = "cat"
-
-    # what the adaptation module learns to predict
-    adaptation_key: Any = "context"
-
-    def __post_init__(self):
-        assert self.condition_mode.lower() in ("cat", "film")
-        assert self.adaptation_key in ("context", ("agents", "intrinsics"), "_feature")
-        assert self.phase in ("encoder", "adaptation", "joint", "finetune")
-
-
-cs = ConfigStore.instance()
-cs.store("ppo_adapt", node=PPOConfig, group="algo")
+from .config import PPOAdaptConfig as PPOConfig
 
 
 def make_mlp(num_units):
@@ -173,7 +151,7 @@ class PPOAdaptivePolicy(TensorDictModuleBase):
             module=actor_module,
             in_keys=["loc", "scale"],
             out_keys=[("agents", "action")],
-            distribution_class=IndependentNormal,
+            distribution_class=DiagNormal,
             return_log_prob=True
         ).to(self.device)
 
@@ -276,9 +254,9 @@ class PPOAdaptivePolicy(TensorDictModuleBase):
         tensordict.set("ret", ret)
 
         infos = []
+        sampler = MinibatchSampler(tensordict, self.cfg.num_minibatches)
         for epoch in range(self.cfg.ppo_epochs):
-            batch = make_batch(tensordict, self.cfg.num_minibatches)
-            for minibatch in batch:
+            for minibatch in sampler:
                 infos.append(self._update(minibatch))
         
         infos: TensorDict = torch.stack(infos).to_tensordict()
@@ -354,21 +332,12 @@ class MSE(nn.Module):
 
     def update(self, tensordict):
         info = []
+        sampler = MinibatchSampler(tensordict, 8)
         for epoch in range(4):
-            for batch in make_batch(tensordict, 8):
+            for batch in sampler:
                 loss = self(batch).mean()
                 self.opt.zero_grad()
                 loss.backward()
                 self.opt.step()
                 info.append(loss)
         return {"adapt_loss": torch.stack(info).mean().item()}
-
-
-def make_batch(tensordict: TensorDict, num_minibatches: int):
-    tensordict = tensordict.reshape(-1)
-    perm = torch.randperm(
-        (tensordict.shape[0] // num_minibatches) * num_minibatches,
-        device=tensordict.device,
-    ).reshape(num_minibatches, -1)
-    for indices in perm:
-        yield tensordict[indices]
\ No newline at end of file
@@ -29,7 +29,6 @@ import torch.distributions as D
 import torch.nn as nn
 import torch.nn.functional as F
 
-from hydra.core.config_store import ConfigStore
 from tensordict import TensorDict
 from tensordict.nn import TensorDictModuleBase, TensorDictModule, TensorDictSequential
 
@@ -37,10 +36,13 @@ from torchrl.data import CompositeSpec, TensorSpec, UnboundedContinuousTensorSpe
 from torchrl.envs import CatTensors, TensorDictPrimer
 from torchrl.modules import ProbabilisticActor
 
-from ..modules.distributions import IndependentNormal
+from ..modules.distributions import DiagNormal
+from ..modules.rnn import segment_rnn
 
 from ..utils.gae import compute_gae
+from ..utils.minibatch import MinibatchSampler
 from ..utils.valuenorm import ValueNorm1
+from .config import PPORNNConfig as PPOConfig
 
 
 def make_mlp(num_units):
@@ -64,23 +66,52 @@ class Actor(nn.Module):
         return loc, scale
 
 
+def _from_cells(name: str):
+    # checkpoints from before the sequence kernels hold `nn.GRUCell`/`nn.LSTMCell`
+    # parameters, which have the same layout as those of a single-layer `nn.GRU`/`nn.LSTM`
+    def hook(state_dict, prefix, *args):
+        for key in ("weight_ih", "weight_hh", "bias_ih", "bias_hh"):
+            if f"{prefix}{name}.{key}" in state_dict:
+                state_dict[f"{prefix}{name}.{key}_l0"] = state_dict.pop(f"{prefix}{name}.{key}")
+    return hook
+
+
+def _run_rnn(rnn: Union[nn.GRU, nn.LSTM], x: torch.Tensor, is_init: torch.Tensor, *state: torch.Tensor):
+    """
+    x: [N, T, *B, H_in], is_init: broadcastable to [N, T, *B], state: [N, *B, H]
+    """
+    N, T = x.shape[:2]
+    batch_shape = x.shape[2:-1]
+    is_init = is_init.reshape(is_init.shape + (1,) * (x.ndim - 1 - is_init.ndim))
+    is_init = is_init.expand(x.shape[:-1]).movedim(1, -1).reshape(-1, T)
+    x = x.movedim(1, -2).reshape(-1, T, x.shape[-1])
+    state = [s.reshape(-1, s.shape[-1]) for s in state]
+    if T == 1:
+        # rollout, a single step
+        reset = (1 - is_init.float()).unsqueeze(0)
+        state = [s.unsqueeze(0) * reset for s in state]
+        output, state = rnn(x, state[0] if len(state) == 1 else tuple(state))
+        state = [s[0] for s in (state if isinstance(state, tuple) else (state,))]
+    else:
+        # training, whole sequences split at episode boundaries
+        output, *state = segment_rnn(rnn, x, is_init, *state)
+    output = output.reshape(N, *batch_shape, T, -1).movedim(-2, 1)
+    return (output, *[s.reshape(N, *batch_shape, -1) for s in state])
+
+
 class LSTM(nn.Module):
     def __init__(self, input_size, hidden_size, skip_conn) -> None:
         super().__init__()
-        self.lstm = nn.LSTMCell(input_size, hidden_size)
+        self.lstm = nn.LSTM(input_size, hidden_size, batch_first=True)
         self.ln = nn.LayerNorm(hidden_size)
         self.skip_conn = skip_conn
+        self._register_load_state_dict_pre_hook(_from_cells("lstm"))
 
     def forward(
         self, x: torch.Tensor, is_init: torch.Tensor, hx: torch.Tensor, cx: torch.Tensor
     ):
         T = x.shape[1]
-        hx, cx = hx[:, 0], cx[:, 0]
-        output = []
-        for i in range(T):
-            hx, cx = self._forward(x[:, i], is_init[:, i], hx, cx)
-            output.append(hx)
-        output = torch.stack(output, dim=1)
+        output, hx, cx = _run_rnn(self.lstm, x, is_init, hx[:, 0], cx[:, 0])
         output = self.ln(output)
         if self.skip_conn == "add":
             output = x + output
@@ -92,39 +123,18 @@ class LSTM(nn.Module):
             cx.unsqueeze(1).expand(-1, T, *cx.shape[1:]),
         )
 
-    def _forward(
-        self, x: torch.Tensor, is_init: torch.Tensor, hx: torch.Tensor, cx: torch.Tensor
-    ):
-        batch_shape = x.shape[:-1]
-        reset = (
-            1 - is_init.reshape(is_init.shape + (1,) * (hx.ndim - is_init.ndim)).float()
-        )
-        hx = hx * reset
-        cx = cx * reset
-        x = x.reshape(-1, self.lstm.input_size)
-        hx = hx.reshape(-1, self.lstm.hidden_size)
-        cx = cx.reshape(-1, self.lstm.hidden_size)
-        hx, cx = self.lstm(x, (hx, cx))
-        hx = hx.reshape(*batch_shape, -1)
-        cx = cx.reshape(*batch_shape, -1)
-        return hx, cx
-
 
 class GRU(nn.Module):
     def __init__(self, input_size, hidden_size, skip_conn, bptt_len: int = 8) -> None:
         super().__init__()
-        self.gru = nn.GRUCell(input_size, hidden_size)
+        self.gru = nn.GRU(input_size, hidden_size, batch_first=True)
         self.skip_conn = skip_conn
         # self.ln = nn.LayerNorm(hidden_size)
+        self._register_load_state_dict_pre_hook(_from_cells("gru"))
 
     def forward(self, x: torch.Tensor, is_init: torch.Tensor, hx: torch.Tensor):
         T = x.shape[1]
-        hx = hx[:, 0]
-        output = []
-        for i in range(T):
-            hx = self._forward(x[:, i], is_init[:, i], hx)
-            output.append(hx)
-        output = torch.stack(output, dim=1)
+        output, hx = _run_rnn(self.gru, x, is_init, hx[:, 0])
         # output = self.ln(output)
         if self.skip_conn == "add":
             output = x + output
@@ -132,40 +142,6 @@ class GRU(nn.Module):
             output = torch.cat([x, output], dim=-1)
         return output, hx.unsqueeze(1).expand(-1, T, *hx.shape[1:])
 
-    def _forward(self, x: torch.Tensor, is_init: torch.Tensor, hx: torch.Tensor):
-        batch_shape = x.shape[:-1]
-        reset = (
-            1 - is_init.reshape(is_init.shape + (1,) * (hx.ndim - is_init.ndim)).float()
-        )
-        hx = hx * reset
-        x = x.reshape(-1, x.shape[-1])
-        hx = hx.reshape(-1, hx.shape[-1])
-        hx = self.gru(x, hx)
-        hx = hx.reshape(*batch_shape, -1)
-        return hx
-
-
-@dataclass
-class PPOConfig:
-    name: str = "ppo_rnn"
-    train_every: int = 32
-    ppo_epochs: int = 4
-    num_minibatches: int = 16
-    seq_len: int = 16
-
-    # whether to take in priviledged infomation
-    priv: bool = False
-
-    rnn: str = "gru"
-    skip_conn: Union[str, None] = None
-    hidden_size: int = 128
-
-    checkpoint_path: Union[str, None] = None
-
-cs = ConfigStore.instance()
-cs.store("ppo_gru", node=PPOConfig, group="algo")
-cs.store("ppo_lstm", node=PPOConfig(rnn="lstm"), group="algo")
-
 
 class PPORNNPolicy(TensorDictModuleBase):
     def __init__(
@@ -262,7 +238,7 @@ class PPORNNPolicy(TensorDictModuleBase):
             module=actor,
             in_keys=["loc", "scale"],
             out_keys=[("agents", "action")],
-            distribution_class=IndependentNormal,
+            distribution_class=DiagNormal,
             return_log_prob=True,
         ).to(self.device)
 
@@ -278,8 +254,8 @@ class PPORNNPolicy(TensorDictModuleBase):
                 if isinstance(module, nn.Linear):
                     nn.init.orthogonal_(module.weight, 0.01)
                     nn.init.constant_(module.bias, 0.0)
-                elif isinstance(module, (nn.GRUCell, nn.LSTMCell)):
-                    nn.init.orthogonal_(module.weight_hh)
+                elif isinstance(module, (nn.GRU, nn.LSTM)):
+                    nn.init.orthogonal_(module.weight_hh_l0)
 
             self.actor.apply(init_)
             self.critic.apply(init_)
@@ -340,9 +316,9 @@ class PPORNNPolicy(TensorDictModuleBase):
         tensordict.set("ret", ret)
 
         infos = []
+        sampler = MinibatchSampler(tensordict, self.cfg.num_minibatches, self.cfg.seq_len)
         for epoch in range(self.cfg.ppo_epochs):
-            batch = make_batch(tensordict, self.cfg.num_minibatches, self.cfg.seq_len)
-            for minibatch in batch:
+            for minibatch in sampler:
                 infos.append(self._update(minibatch))
 
         infos: TensorDict = torch.stack(infos).to_tensordict()
@@ -393,24 +369,3 @@ class PPORNNPolicy(TensorDictModuleBase):
             },
             [],
         )
-
-
-def make_batch(tensordict: TensorDict, num_minibatches: int, seq_len: int = -1):
-    if seq_len > 1:
-        N, T = tensordict.shape
-        T = (T // seq_len) * seq_len
-        tensordict = tensordict[:, :T].reshape(-1, seq_len)
-        perm = torch.randperm(
-            (tensordict.shape[0] // num_minibatches) * num_minibatches,
-            device=tensordict.device,
-        ).reshape(num_minibatches, -1)
-        for indices in perm:
-            yield tensordict[indices]
-    else:
-        tensordict = tensordict.reshape(-1)
-        perm = torch.randperm(
-            (tensordict.shape[0] // num_minibatches) * num_minibatches,
-            device=tensordict.device,
-        ).reshape(num_minibatches, -1)
-        for indices in perm:
-            yield tensordict[indices]
@@ -21,8 +21,140 @@
 # SOFTWARE.
 
 
+"""
+Generalized advantage estimation shared by the on-policy algorithms.
+
+The advantages satisfy the reverse linear recurrence
+
+    A_t = delta_t + gamma * lmbda * (1 - done_t) * A_{t+1},
+    delta_t = r_t + gamma * (1 - terminated_t) * V(s'_t) - V(s_t),
+
+which :func:`gae` evaluates without a Python loop over every step: the time
+dimension is cut into blocks, each block is solved in closed form with a
+reverse cumulative sum of discounted deltas (the recurrence coefficient is
+either `gamma * lmbda` or 0, so the products within a segment are powers),
+and only the carry between blocks is propagated sequentially. A (compiled)
+step-by-step loop is used when `gamma` or `lmbda` vary across the batch.
+"""
+
+import functools
+import math
+from typing import Union
+
 import torch
 
+from omni_drones.utils.torch import maybe_compile
+
+
+def _gae_loop(delta: torch.Tensor, coef: torch.Tensor) -> torch.Tensor:
+    # delta, coef: [B, T]
+    advantages = torch.zeros_like(delta)
+    gae = torch.zeros_like(delta[:, 0])
+    for step in range(delta.shape[1] - 1, -1, -1):
+        gae = delta[:, step] + coef[:, step] * gae
+        advantages[:, step] = gae
+    return advantages
+
+
+@functools.lru_cache()
+def _compiled_gae_loop():
+    return maybe_compile(_gae_loop, "script")
+
+
+def _gae_blocked(delta: torch.Tensor, done: torch.Tensor, rho: float, block_size: int) -> torch.Tensor:
+    # delta, done: [B, T]
+    B, T = delta.shape
+    if rho == 0.:
+        return delta.clone()
+    L = min(block_size, T)
+    if rho < 1.:
+        # keep rho ** (L - 1) well within the float32 range
+        L = max(1, min(L, int(math.log(1e-30) / math.log(rho)) + 1))
+    num_blocks = -(-T // L)
+    pad = num_blocks * L - T
+    if pad:
+        delta = torch.nn.functional.pad(delta, (0, pad))
+        done = torch.nn.functional.pad(done, (0, pad), value=True)
+    delta = delta.reshape(B, num_blocks, L)
+    done = done.reshape(B, num_blocks, L)
+
+    arange = torch.arange(L, device=delta.device)
+    weight = torch.pow(torch.tensor(rho, dtype=delta.dtype, device=delta.device), arange)
+    # G_t = sum_{k >= t} rho^k delta_k within the block
+    G = (weight * delta).flip(-1).cumsum(-1).flip(-1)
+    # segments of the block separated by the steps that end the trace; a
+    # step's trace runs to the end of its segment, so subtract G of the next one
+    done_ = done.to(delta.dtype)
+    num_done = done_.cumsum(-1)
+    segment = (num_done - done_).long()
+    G_next = torch.where(done, torch.nn.functional.pad(G[..., 1:], (0, 1)), 0.)
+    G_next = torch.zeros_like(G).scatter_add_(-1, segment, G_next).gather(-1, segment)
+    local = (G - G_next) / weight
+    # the coefficient of A at the start of the next block, zero unless the trace reaches it
+    last_segment = segment == num_done[..., -1:].long()
+    carry_coef = torch.where(last_segment, rho ** (L - arange).to(delta.dtype), 0.)
+
+    advantages = torch.empty_like(local)
+    carry = torch.zeros_like(local[:, 0, :1])
+    for block in range(num_blocks - 1, -1, -1):
+        advantages[:, block] = local[:, block] + carry_coef[:, block] * carry
+        carry = advantages[:, block, :1]
+    return advantages.reshape(B, num_blocks * L)[:, :T]
+
+
+def gae(
+    reward: torch.Tensor,
+    value: torch.Tensor,
+    next_value: torch.Tensor,
+    terminated: torch.Tensor,
+    done: torch.Tensor = None,
+    gamma: Union[float, torch.Tensor] = 0.99,
+    lmbda: Union[float, torch.Tensor] = 0.95,
+    time_dim: int = 1,
+    block_size: int = 64,
+):
+    """
+    Computes the advantages and returns (value targets).
+
+    Args:
+        reward: Rewards of any shape with time at `time_dim`, e.g. [N, T, k] or
+            [N, T, num_agents, k].
+        value: The values of the states, same shape as `reward`.
+        next_value: Either the values of the next states for every step (same
+            shape as `reward`), or only the bootstrap value after the last step
+            (`reward`'s shape without the time dim), in which case the value of
+            the following step is used as the next value.
+        terminated: Steps after which the value is not bootstrapped. Broadcast to `reward`.
+        done: Steps that end the trace, i.e. terminated or truncated episodes.
+            Defaults to `terminated`.
+        gamma, lmbda: Discount and GAE lambda; scalars or tensors broadcastable to `reward`.
+        time_dim: The time dimension.
+        block_size: The block length of the blocked scan.
+
+    Returns:
+        (advantages, returns), both shaped like `reward`.
+    """
+    assert reward.shape == value.shape
+    if next_value.dim() == value.dim() - 1:
+        next_value = torch.cat([value.narrow(time_dim, 1, value.shape[time_dim] - 1), next_value.unsqueeze(time_dim)], time_dim)
+    terminated = terminated.bool().expand_as(reward)
+    done = terminated if done is None else done.bool().expand_as(reward) | terminated
+    not_terminated = 1. - terminated.float()
+    delta = reward + gamma * next_value * not_terminated - value
+
+    shape = delta.movedim(time_dim, -1).shape
+    delta_ = delta.movedim(time_dim, -1).reshape(-1, shape[-1])
+    done_ = done.movedim(time_dim, -1).reshape(-1, shape[-1])
+    if (isinstance(gamma, torch.Tensor) and gamma.numel() > 1) or (isinstance(lmbda, torch.Tensor) and lmbda.numel() > 1):
+        coef = (gamma * lmbda * (1. - done.float())).expand_as(delta)
+        coef_ = coef.movedim(time_dim, -1).reshape(-1, shape[-1])
+        advantages = _compiled_gae_loop()(delta_, coef_)
+    else:
+        advantages = _gae_blocked(delta_, done_, float(gamma) * float(lmbda), block_size)
+    advantages = advantages.reshape(shape).movedim(-1, time_dim)
+    returns = advantages + value  # aka. value targets
+    return advantages, returns
+
 
 def compute_gae(
     reward: torch.Tensor,  # [N, T, k]
@@ -32,23 +164,7 @@ def compute_gae(
     gamma=0.99,
     lmbda=0.95,
 ):
-    assert reward.shape == value.shape
-
-    not_done = 1.0 - done.float()
-    batch_size, num_steps = not_done.shape[:2]
-    gae = 0
-    advantages = torch.zeros_like(reward)
-    for step in reversed(range(num_steps)):
-        delta = (
-            reward[:, step] 
-            + gamma * next_value * not_done[:, step] 
-            - value[:, step]
-        )
-        advantages[:, step] = gae = delta + (gamma * lmbda * not_done[:, step] * gae)
-        next_value = value[:, step]
-
-    returns = advantages + value  # aka. value targets
-    return advantages, returns
+    return gae(reward, value, next_value, done, gamma=gamma, lmbda=lmbda, time_dim=1)
 
 
 def compute_gae_(
@@ -59,16 +175,4 @@ def compute_gae_(
     gamma=0.99,
     lmbda=0.95,
 ):
-    assert reward.shape == value.shape
-
-    not_done = 1.0 - done.float()
-    num_steps = not_done.shape[0]
-    gae = 0
-    advantages = torch.zeros_like(reward)
-    for step in reversed(range(num_steps)):
-        delta = reward[step] + gamma * next_value * not_done[step] - value[step]
-        advantages[step] = gae = delta + (gamma * lmbda * not_done[step] * gae)
-        next_value = value[step]
-
-    returns = advantages + value  # aka. value targets
-    return advantages, returns
+    return gae(reward, value, next_value, done, gamma=gamma, lmbda=lmbda, time_dim=0)
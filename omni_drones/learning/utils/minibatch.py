@@ -0,0 +1,121 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import torch
+from tensordict import TensorDictBase
+
+
+class MinibatchSampler:
+    """
+    Iterates over a rollout in shuffled minibatches, once per epoch.
+
+    The rollout [N, T] is flattened once into contiguous storage, [N * T] or
+    [N * T // seq_len, seq_len] when `seq_len` > 1 (sequence chunks for
+    recurrent policies; each chunk stays in order). Two ways of shuffling:
+
+    - ``"gather"``: every minibatch is gathered with `torch.index_select`
+      into buffers allocated once and reused for all minibatches and epochs.
+      A yielded minibatch is only valid until the next one is drawn.
+    - ``"inplace"``: at the start of each epoch the storage itself is permuted
+      through a single scratch buffer the size of the largest entry, and the
+      minibatches are contiguous slices of it (views, no copies). This
+      reorders the given rollout in place, so it must not be used afterwards
+      for anything order dependent.
+
+    In both cases no memory is allocated per minibatch and the extra memory
+    is bounded by one minibatch ("gather") or one rollout entry ("inplace")
+    instead of a shuffled copy of the rollout per epoch. As before, the
+    remainder of the rollout that does not fill a minibatch is left out of
+    each epoch.
+
+    Example::
+
+        sampler = MinibatchSampler(tensordict, num_minibatches=16)
+        for epoch in range(ppo_epochs):
+            for minibatch in sampler:
+                ...
+    """
+
+    def __init__(
+        self,
+        tensordict: TensorDictBase,
+        num_minibatches: int,
+        seq_len: int = 1,
+        mode: str = "gather",
+    ):
+        if mode not in ("gather", "inplace"):
+            raise ValueError(f"Unknown minibatch mode: {mode}.")
+        if seq_len > 1:
+            N, T = tensordict.shape
+            T = (T // seq_len) * seq_len
+            tensordict = tensordict[:, :T].reshape(-1, seq_len)
+        else:
+            tensordict = tensordict.reshape(-1)
+        self.storage = tensordict.contiguous()
+        self.num_minibatches = num_minibatches
+        self.mode = mode
+        self.minibatch_size = self.storage.shape[0] // num_minibatches
+        if self.minibatch_size == 0:
+            raise ValueError(
+                f"Cannot split {self.storage.shape[0]} samples into {num_minibatches} minibatches."
+            )
+        self._keys = list(self.storage.keys(True, True))
+        self._buffer = None
+        self._scratch = None
+
+    def __len__(self):
+        return self.num_minibatches
+
+    def __iter__(self):
+        num_samples = self.minibatch_size * self.num_minibatches
+        perm = torch.randperm(self.storage.shape[0], device=self.storage.device)
+        if self.mode == "inplace":
+            self._permute_(perm)
+            for i in range(self.num_minibatches):
+                yield self.storage[i * self.minibatch_size: (i + 1) * self.minibatch_size]
+        else:
+            if self._buffer is None:
+                self._buffer = self.storage[:self.minibatch_size].clone()
+            for indices in perm[:num_samples].reshape(self.num_minibatches, -1):
+                for key in self._keys:
+                    torch.index_select(self.storage.get(key), 0, indices, out=self._buffer.get(key))
+                # a new container over the same buffers, so keys set by the
+                # consumer do not leak into the next minibatch
+                yield self._buffer.clone(recurse=False)
+
+    def _permute_(self, perm: torch.Tensor):
+        if self._scratch is None:
+            # one scratch buffer per dtype, large enough for any entry
+            sizes = {}
+            for key in self._keys:
+                tensor = self.storage.get(key)
+                sizes[tensor.dtype] = max(sizes.get(tensor.dtype, 0), tensor.numel())
+            self._scratch = {
+                dtype: torch.empty(numel, dtype=dtype, device=self.storage.device)
+                for dtype, numel in sizes.items()
+            }
+        for key in self._keys:
+            tensor = self.storage.get(key)
+            out = self._scratch[tensor.dtype][:tensor.numel()].view(tensor.shape)
+            torch.index_select(tensor, 0, perm, out=out)
+            tensor.copy_(out)
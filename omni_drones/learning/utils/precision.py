@@ -0,0 +1,157 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Mixed precision for the on-policy algorithms.
+
+Selected submodules (typically the encoders/trunks of the actor and critic)
+run their forward pass under `torch.autocast` and hand float32 tensors back to
+the caller, so that the distribution heads, losses, GAE, value normalization
+and the optimizer states are untouched and stay in float32. The parameters
+themselves are kept in float32 (autocast casts them per-op), which keeps
+checkpoints interchangeable between precisions.
+
+The wrapping patches `forward` on the module instances rather than wrapping
+the modules, so parameter names, `state_dict`s and functional parameters
+(`make_functional`/`vmap` in MAPPO) are the same as without it. The patches
+are bound methods, so a `copy.deepcopy` of a module runs its own parameters,
+and :func:`reset_precision` removes them again (e.g. for export).
+"""
+
+import functools
+import types
+from typing import Iterable, Optional
+
+import torch
+import torch.nn as nn
+from tensordict import TensorDictBase
+
+# float16 is left out on purpose: it would also need loss scaling
+PRECISIONS = {
+    "fp32": None,
+    "bf16": torch.bfloat16,
+}
+
+
+def _to_float32(x):
+    if isinstance(x, torch.Tensor):
+        if x.is_floating_point() and x.dtype != torch.float32 and x.element_size() < 4:
+            return x.float()
+        return x
+    if isinstance(x, TensorDictBase):
+        return x.apply(_to_float32)
+    if isinstance(x, (tuple, list)):
+        return type(x)(_to_float32(v) for v in x)
+    if isinstance(x, dict):
+        return {k: _to_float32(v) for k, v in x.items()}
+    return x
+
+
+def _device_type(module: nn.Module) -> str:
+    for p in module.parameters():
+        return p.device.type
+    return "cpu"
+
+
+def _patched_forward(module: nn.Module):
+    # the forward a new patch wraps: an earlier patch on the instance, or the
+    # class' forward. Kept unbound so that a copy of the module calls into its
+    # own parameters rather than those of the module it was copied from.
+    forward = module.__dict__.get("forward")
+    if isinstance(forward, types.MethodType):
+        return forward.__func__
+    return type(module).forward
+
+
+def _patch(module: nn.Module, forward):
+    forward.__precision__ = True
+    module.forward = types.MethodType(forward, module)
+    return module
+
+
+def autocast_(module: nn.Module, dtype: torch.dtype=torch.bfloat16, device_type: Optional[str]=None) -> nn.Module:
+    """
+    Make `module` run its forward pass under `torch.autocast(dtype=dtype)`
+    and cast the (lower precision) floating point outputs back to float32.
+    """
+    forward = _patched_forward(module)
+
+    @functools.wraps(forward)
+    def autocast_forward(self, *args, **kwargs):
+        with torch.autocast(device_type=device_type or _device_type(self), dtype=dtype):
+            out = forward(self, *args, **kwargs)
+        return _to_float32(out)
+
+    return _patch(module, autocast_forward)
+
+
+def float32_(module: nn.Module, device_type: Optional[str]=None) -> nn.Module:
+    """
+    Opt `module` out of an enclosing autocast region: its inputs are cast to
+    float32 and its forward pass runs with autocast disabled.
+    """
+    forward = _patched_forward(module)
+
+    @functools.wraps(forward)
+    def float32_forward(self, *args, **kwargs):
+        args, kwargs = _to_float32(args), _to_float32(kwargs)
+        with torch.autocast(device_type=device_type or _device_type(self), enabled=False):
+            return forward(self, *args, **kwargs)
+
+    return _patch(module, float32_forward)
+
+
+def reset_precision(root: nn.Module) -> nn.Module:
+    """Undo :func:`autocast_` and :func:`float32_` on `root` and its submodules."""
+    for module in root.modules():
+        forward = module.__dict__.get("forward")
+        if getattr(forward, "__precision__", False):
+            del module.forward
+    return root
+
+
+def setup_precision(
+    root: nn.Module,
+    precision: str,
+    modules: Iterable[nn.Module],
+    fp32_modules: Iterable[str]=(),
+):
+    """
+    Run `modules` in the given precision and opt the submodules of `root`
+    named in `fp32_modules` (e.g. "critic.module.0.0", a layer of the critic
+    trunk, or "critic.module.0" for the whole trunk) back out to float32.
+    A no-op for "fp32".
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision}, expected one of {list(PRECISIONS)}.")
+    dtype = PRECISIONS[precision]
+    if dtype is None:
+        return
+    fp32_modules = [root.get_submodule(name) for name in fp32_modules]
+    # an autocast module inside (or equal to) an opted-out one would turn
+    # autocast back on, so those are left in float32 altogether
+    excluded = {id(m) for module in fp32_modules for m in module.modules()}
+    for module in modules:
+        if id(module) not in excluded:
+            autocast_(module, dtype)
+    for module in fp32_modules:
+        float32_(module)
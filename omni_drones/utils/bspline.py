@@ -25,10 +25,6 @@ import torch
 import numpy as np
 from typing import Optional
 
-from scipy.interpolate import (
-    splev as _splev_scipy_impl, 
-    splint as _splint_scipy_impl,
-)
 
 def splev_scipy(x, t, c, k, der=0):
     """
@@ -52,6 +48,7 @@ def splev_scipy(x, t, c, k, der=0):
         The order of derivative of the spline to compute (must be less than
         or equal to k, the degree of the spline).
     """
+    from scipy.interpolate import splev as _splev_scipy_impl
     return np.stack(_splev_scipy_impl(x, (t, c.T, k), der), axis=-1)
 
 def splint_scipy(a, b, t, c, k):
@@ -69,6 +66,7 @@ def splint_scipy(a, b, t, c, k):
     full_output : int, optional
         Non-zero to return optional output.
     """
+    from scipy.interpolate import splint as _splint_scipy_impl
     return _splint_scipy_impl(a, b, (t, c, k))
 
 def splev_torch(x: torch.Tensor, t: torch.Tensor, c: torch.Tensor, k: int, der: int=0):
@@ -0,0 +1,268 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Batched formation costs and initial-state samplers.
+
+All functions operate on a leading env dimension so that a single call scores
+the formation of every env without ``vmap``. Costs are translation invariant
+(both point sets are centered first) and are returned with shape ``[E, 1]``.
+"""
+
+import math
+from typing import Optional
+
+import torch
+
+
+def _center(p: torch.Tensor) -> torch.Tensor:
+    return p - p.mean(-2, keepdim=True)
+
+
+def _expand_desired(p: torch.Tensor, desired_p: torch.Tensor) -> torch.Tensor:
+    if desired_p.dim() == 2:
+        desired_p = desired_p.expand(p.shape[0], *desired_p.shape)
+    return desired_p
+
+
+def sample_from_grid(cells: torch.Tensor, n: int, batch_size: int) -> torch.Tensor:
+    """Sample `n` distinct cells for each of `batch_size` envs.
+
+    Draws uniform keys for every (env, cell) pair and takes the indices of
+    the `n` largest, i.e. the first `n` entries of a per-env random
+    permutation, with one ``topk`` instead of one ``randperm`` per env.
+
+    Args:
+        cells: (num_cells, dim)
+
+    Returns:
+        (batch_size, n, dim)
+    """
+    if n > cells.shape[0]:
+        raise ValueError(f"Cannot sample {n} distinct cells out of {cells.shape[0]}.")
+    keys = torch.rand(batch_size, cells.shape[0], device=cells.device)
+    idx = keys.topk(n, dim=-1).indices
+    return cells[idx]
+
+
+def cost_formation_hausdorff(
+    p: torch.Tensor,
+    desired_p: torch.Tensor,
+    chunk_size: Optional[int] = None,
+) -> torch.Tensor:
+    """Symmetric Hausdorff distance between the centered formations.
+
+    The pairwise distance tensor is ``[E, n, m]``; pass `chunk_size` to bound
+    peak memory by evaluating at most that many envs at a time.
+
+    Args:
+        p: (E, n, dim)
+        desired_p: (m, dim) or (E, m, dim)
+
+    Returns:
+        (E, 1)
+    """
+    p = _center(p)
+    desired_p = _center(_expand_desired(p, desired_p))
+    if chunk_size is None or chunk_size >= p.shape[0]:
+        return _hausdorff(p, desired_p)
+    return torch.cat([
+        _hausdorff(p_chunk, q_chunk)
+        for p_chunk, q_chunk in zip(p.split(chunk_size), desired_p.split(chunk_size))
+    ])
+
+
+def _hausdorff(p: torch.Tensor, q: torch.Tensor) -> torch.Tensor:
+    d = torch.cdist(p, q)
+    d_pq = d.min(-1).values.max(-1).values
+    d_qp = d.min(-2).values.max(-1).values
+    return torch.max(d_pq, d_qp).unsqueeze(-1)
+
+
+def cost_formation_sinkhorn(
+    p: torch.Tensor,
+    desired_p: torch.Tensor,
+    reg: float = 0.05,
+    num_iters: int = 20,
+) -> torch.Tensor:
+    """Entropy-regularized assignment cost computed with log-domain Sinkhorn.
+
+    Every drone is softly matched to one formation slot with uniform marginals,
+    and the cost is the expected distance under the transport plan, i.e.
+    approximately the mean distance between a drone and its assigned slot.
+    A fixed number of iterations is run so that no host synchronization is
+    needed. Smaller `reg` gets closer to the hard assignment but converges
+    more slowly.
+
+    Args:
+        p: (E, n, dim)
+        desired_p: (m, dim) or (E, m, dim)
+
+    Returns:
+        (E, 1)
+    """
+    p = _center(p)
+    desired_p = _center(_expand_desired(p, desired_p))
+    n, m = p.shape[-2], desired_p.shape[-2]
+    C = torch.cdist(p, desired_p)
+    log_K = -C / reg
+    log_a = -math.log(n)
+    log_b = -math.log(m)
+    f = torch.zeros(p.shape[0], n, device=p.device, dtype=p.dtype)
+    g = torch.zeros(p.shape[0], m, device=p.device, dtype=p.dtype)
+    for _ in range(num_iters):
+        f = log_a - torch.logsumexp(log_K + g.unsqueeze(-2), dim=-1)
+        g = log_b - torch.logsumexp(log_K + f.unsqueeze(-1), dim=-2)
+    plan = torch.exp(log_K + f.unsqueeze(-1) + g.unsqueeze(-2))
+    return (plan * C).sum((-2, -1)).unsqueeze(-1)
+
+
+@torch.no_grad()
+def auction_assignment(
+    cost: torch.Tensor,
+    eps: float = 1e-3,
+    max_iters: int = 1000,
+    check_every: int = 8,
+    eps_factor: float = 8.0,
+) -> torch.Tensor:
+    """Batched Jacobi auction for square min-cost assignment problems.
+
+    All unassigned drones of all envs bid simultaneously; each slot goes to its
+    highest bidder. The result is within ``n * eps`` of the optimal total cost.
+
+    The auction uses eps-scaling: it is first solved with a coarse ``eps`` (a
+    quarter of the cost range), which is divided by `eps_factor` after every
+    phase until it reaches `eps`. Prices carry over between phases and only the
+    pairs that are no longer eps-optimal are unassigned, so each phase takes a
+    bounded number of rounds instead of one long price war at the final
+    ``eps``. Every `check_every` rounds the envs that are fully assigned are
+    dropped from the batch, which is also the only device-to-host
+    synchronization.
+
+    Args:
+        cost: (E, n, n)
+
+    Returns:
+        (E, n) the slot index assigned to each drone.
+
+    Raises:
+        RuntimeError: if some env is still not fully assigned after
+            `max_iters` rounds of one phase.
+    """
+    E, n, m = cost.shape
+    if n != m:
+        raise ValueError(f"Auction requires a square cost matrix, got {n}x{m}.")
+    if n == 1:
+        return torch.zeros(E, 1, dtype=torch.long, device=cost.device)
+    benefit = -cost
+    prices = torch.zeros(E, m, device=cost.device, dtype=cost.dtype)
+    owner = torch.full((E, m), -1, dtype=torch.long, device=cost.device)
+    assignment = torch.full((E, n), -1, dtype=torch.long, device=cost.device)
+    phase_eps = max(float(cost.max() - cost.min()) / 4, eps)
+    first_phase = True
+    while True:
+        if not first_phase:
+            assignment, owner = _auction_refine(benefit, prices, assignment, phase_eps)
+        first_phase = False
+        active = torch.arange(E, device=cost.device)
+        rounds = 0
+        while True:
+            active = active[(assignment[active] < 0).any(-1)]
+            if len(active) == 0:
+                break
+            if rounds >= max_iters:
+                raise RuntimeError(
+                    f"Auction did not converge within {max_iters} rounds at eps={phase_eps:.2e} "
+                    f"({len(active)} of {E} envs unassigned), increase `max_iters` or `eps`."
+                )
+            b, p, o, a = benefit[active], prices[active], owner[active], assignment[active]
+            for _ in range(check_every):
+                p, o, a = _auction_round(b, p, o, a, phase_eps)
+            prices[active], owner[active], assignment[active] = p, o, a
+            rounds += check_every
+        if phase_eps <= eps:
+            return assignment
+        phase_eps = max(phase_eps / eps_factor, eps)
+
+
+def _auction_round(benefit, prices, owner, assignment, eps):
+    n = assignment.shape[-1]
+    arange = torch.arange(n, device=benefit.device).expand_as(assignment)
+    values = benefit - prices.unsqueeze(-2)
+    # best and second best value, cheaper than `topk(2)`
+    best_value, best_slot = values.max(-1)
+    second_value = values.scatter(-1, best_slot.unsqueeze(-1), -torch.inf).amax(-1)
+    bid = prices.gather(-1, best_slot) + best_value - second_value + eps
+    bid = torch.where(assignment < 0, bid, torch.full_like(bid, -torch.inf))
+    max_bid = torch.full_like(prices, -torch.inf).scatter_reduce(-1, best_slot, bid, "amax")
+    has_bid = max_bid > -torch.inf
+    prices = torch.where(has_bid, max_bid, prices)
+    # each slot goes to (one of) its highest bidders, losers are scattered into a dummy column
+    wins = (bid > -torch.inf) & (bid == max_bid.gather(-1, best_slot))
+    owner = torch.cat([owner, owner.new_full((*owner.shape[:-1], 1), -1)], dim=-1)
+    owner.scatter_(-1, torch.where(wins, best_slot, n), arange)
+    owner = owner[..., :n]
+    # rebuild the drone -> slot map; unowned slots are scattered into a dummy column
+    assignment = torch.full((*owner.shape[:-1], n + 1), -1, dtype=torch.long, device=owner.device)
+    assignment.scatter_(-1, torch.where(owner < 0, n, owner), arange)
+    return prices, owner, assignment[..., :n]
+
+
+def _auction_refine(benefit, prices, assignment, eps):
+    """Unassign the drones whose slot is not within `eps` of their best one."""
+    n = assignment.shape[-1]
+    values = benefit - prices.unsqueeze(-2)
+    value = values.gather(-1, assignment.unsqueeze(-1)).squeeze(-1)
+    assignment = torch.where(value >= values.max(-1).values - eps, assignment, -1)
+    drones = torch.arange(n, device=assignment.device).expand_as(assignment)
+    owner = torch.full((*assignment.shape[:-1], n + 1), -1, dtype=torch.long, device=assignment.device)
+    owner.scatter_(-1, torch.where(assignment < 0, n, assignment), drones)
+    return assignment, owner[..., :n]
+
+
+def cost_formation_auction(
+    p: torch.Tensor,
+    desired_p: torch.Tensor,
+    eps: float = 1e-3,
+    max_iters: int = 1000,
+) -> torch.Tensor:
+    """Mean distance between each drone and its slot under an (eps-)optimal
+    one-to-one assignment found by :func:`auction_assignment`.
+
+    Args:
+        p: (E, n, dim)
+        desired_p: (n, dim) or (E, n, dim)
+
+    Returns:
+        (E, 1)
+    """
+    p = _center(p)
+    desired_p = _center(_expand_desired(p, desired_p))
+    C = torch.cdist(p, desired_p)
+    assignment = auction_assignment(C, eps=eps, max_iters=max_iters)
+    return C.gather(-1, assignment.unsqueeze(-1)).mean(-2)
+
+
+FORMATION_COSTS = {
+    "hausdorff": cost_formation_hausdorff,
+    "sinkhorn": cost_formation_sinkhorn,
+    "auction": cost_formation_auction,
+}
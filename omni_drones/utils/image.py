@@ -23,13 +23,14 @@
 
 import torch
 import numpy as np
-import matplotlib.pyplot as plt
 
 from PIL import Image
 from typing import List, Union
 
 
 def save_depth(imgs: Union[torch.Tensor, np.ndarray, List[np.ndarray]], save_path: str = './'):
+    import matplotlib.pyplot as plt
+
     if isinstance(imgs, np.ndarray):
         imgs = [imgs]
     elif isinstance(imgs, torch.Tensor):
@@ -23,7 +23,6 @@
 
 import math
 import random
-import matplotlib.pyplot as plt
 import torch
 
 def poisson_disk_sampling(width, height, r, k=30):
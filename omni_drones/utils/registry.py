@@ -0,0 +1,150 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+import importlib
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+
+def import_target(target: str) -> Any:
+    """Imports an object given as ``"package.module:QualName"``."""
+    module_name, _, qualname = target.partition(":")
+    obj = importlib.import_module(module_name)
+    for attr in filter(None, qualname.split(".")):
+        obj = getattr(obj, attr)
+    return obj
+
+
+class LazyRegistry(MutableMapping):
+    """
+    A name -> object mapping whose entries can be given as ``"module:qualname"``
+    strings. An entry is imported the first time it is looked up, so that
+    populating the registry does not import every registered module.
+
+    Third-party code can add entries with the :meth:`register` decorator.
+
+    Examples:
+        >>> ALGOS = LazyRegistry("algorithm", {"ppo": "omni_drones.learning.ppo.ppo:PPOPolicy"})
+        >>> @ALGOS.register(name="my_ppo")
+        ... class MyPPO:
+        ...     ...
+        >>> ALGOS["ppo"]  # imports omni_drones.learning.ppo.ppo
+    """
+    def __init__(
+        self,
+        name: str,
+        entries: Dict[str, Any] = None,
+        case_insensitive: bool = False
+    ):
+        self.name = name
+        self.case_insensitive = case_insensitive
+        self._entries: Dict[str, Any] = {}
+        self._aliases: Dict[str, str] = {}
+        if entries is not None:
+            for key, value in entries.items():
+                self.register_lazy(key, value)
+
+    def _key(self, key: str) -> str:
+        if key in self._entries:
+            return key
+        if self.case_insensitive and key.lower() in self._aliases:
+            return self._aliases[key.lower()]
+        raise KeyError(f"Unknown {self.name}: {key}. Available: {list(self._entries)}")
+
+    def __getitem__(self, key: str):
+        key = self._key(key)
+        value = self._entries[key]
+        if isinstance(value, str):
+            value = import_target(value)
+            self._entries[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self._entries[key] = value
+        if self.case_insensitive:
+            self._aliases[key.lower()] = key
+
+    def __delitem__(self, key: str):
+        key = self._key(key)
+        del self._entries[key]
+        if self.case_insensitive:
+            del self._aliases[key.lower()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self._key(key)
+        except KeyError:
+            return False
+        return True
+
+    def is_loaded(self, key: str) -> bool:
+        return not isinstance(self._entries[self._key(key)], str)
+
+    def register_lazy(self, key: str, target: str):
+        """Adds a ``"module:qualname"`` entry unless `key` is already registered."""
+        if key not in self:
+            self[key] = target
+
+    def register(self, obj: Any = None, *, name: str = None):
+        """Registers `obj` under `name` (defaults to ``obj.__name__``). Can be used
+        as a decorator with or without arguments. A lazy entry of the same name is
+        replaced, whereas registering a different object twice raises a ValueError.
+        """
+        def decorator(obj):
+            key = name or obj.__name__
+            if key in self:
+                existing = self._entries[self._key(key)]
+                if not isinstance(existing, str) and existing is not obj:
+                    raise ValueError(f"{self.name} {key} is already registered as {existing}.")
+                key = self._key(key)
+            self[key] = obj
+            return obj
+        return decorator if obj is None else decorator(obj)
+
+    def __repr__(self) -> str:
+        entries = ", ".join(
+            f"{key}{'' if self.is_loaded(key) else ' (lazy)'}" for key in self._entries
+        )
+        return f"{self.__class__.__name__}({self.name}: {entries})"
+
+
+def lazy_attributes(
+    package: str,
+    attributes: Dict[str, str]
+) -> Tuple[Callable[[str], Any], List[str]]:
+    """Returns a module-level ``__getattr__`` (PEP 562) and ``__all__`` that import
+    the given attributes from their (relative) modules on first access.
+
+    Examples:
+        >>> __getattr__, __all__ = lazy_attributes(__name__, {"Hover": ".hover"})
+    """
+    def __getattr__(name: str):
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        module = importlib.import_module(attributes[name], package)
+        return getattr(module, name)
+    return __getattr__, list(attributes)
@@ -0,0 +1,285 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+Replaying flight logs through controllers and policies.
+
+A flight log is a directory of columnar ``.npy`` arrays (see
+:func:`save_flight_log`) that are memory-mapped rather than read, so a corpus
+of thousands of logs can be opened instantly and only the pages that are
+actually replayed are touched. :class:`FlightLogCorpus` batches the logs into
+padded ``[B, T, d]`` tensors, and :func:`replay` evaluates an observation
+builder and a policy on all steps of a batch at once (the logged states are
+given, so there is nothing sequential to wait for) and reports how far the
+policy's actions are from the logged commands.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+import torch
+
+from omni_drones.controllers.dynamics import MultirotorDynamics
+from omni_drones.utils.sysid import throttle_sequence
+
+LOG_FIELDS = ("timestamp", "state", "action")
+METADATA_FILE = "meta.json"
+
+
+def save_flight_log(path: str, timestamp, state, action, **metadata):
+    """
+    Write a flight log to the directory `path`.
+
+    Args:
+        timestamp: [T] times of the samples in seconds.
+        state: [T, 13] root states: position, quaternion wxyz, linear and
+            angular velocity in the world frame.
+        action: [T, num_rotors] rotor commands in [-1, 1] applied at each state.
+        **metadata: JSON-serializable extras, e.g. the ``target_pos`` of the flight.
+    """
+    os.makedirs(path, exist_ok=True)
+    columns = {"timestamp": (timestamp, np.float64), "state": (state, np.float32), "action": (action, np.float32)}
+    length = None
+    for name, (value, dtype) in columns.items():
+        if isinstance(value, torch.Tensor):
+            value = value.detach().cpu().numpy()
+        value = np.ascontiguousarray(value, dtype=dtype)
+        if length is not None and len(value) != length:
+            raise ValueError(f"All columns must have the same length, got {len(value)} {name} for {length} samples.")
+        length = len(value)
+        np.save(os.path.join(path, f"{name}.npy"), value)
+    with open(os.path.join(path, METADATA_FILE), "w") as f:
+        json.dump(metadata, f)
+
+
+def load_flight_log(path: str) -> Dict[str, np.ndarray]:
+    """Memory-map the columns of a flight log written by :func:`save_flight_log`."""
+    log = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in LOG_FIELDS
+    }
+    metadata_path = os.path.join(path, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            log["metadata"] = json.load(f)
+    else:
+        log["metadata"] = {}
+    return log
+
+
+@dataclass
+class LogBatch:
+    """A batch of flight logs padded to the length of the longest one."""
+    paths: List[str]
+    timestamp: torch.Tensor # [B, T]
+    state: torch.Tensor # [B, T, 13]
+    action: torch.Tensor # [B, T, num_rotors]
+    mask: torch.Tensor # [B, T], False for padding
+    metadata: List[dict]
+
+    @property
+    def lengths(self) -> torch.Tensor:
+        return self.mask.sum(-1)
+
+
+class FlightLogCorpus:
+    """
+    A collection of flight logs, iterated over in batches of ``[B, T, d]`` tensors.
+
+    Logs are memory-mapped when the corpus is created (only the ``.npy`` headers
+    are read) and copied into a reused host buffer batch by batch.
+    """
+
+    def __init__(self, paths: Sequence[str], max_length: int = None):
+        self.paths = list(paths)
+        if not self.paths:
+            raise ValueError("No flight logs given.")
+        self.logs = [load_flight_log(path) for path in self.paths]
+        self.max_length = max_length
+        num_rotors = {log["action"].shape[-1] for log in self.logs}
+        if len(num_rotors) > 1:
+            raise ValueError(f"Logs of vehicles with different numbers of rotors: {sorted(num_rotors)}.")
+        self.num_rotors = num_rotors.pop()
+
+    def __len__(self):
+        return len(self.logs)
+
+    @property
+    def num_steps(self) -> int:
+        return sum(self._length(log) for log in self.logs)
+
+    def _length(self, log) -> int:
+        length = len(log["timestamp"])
+        return length if self.max_length is None else min(length, self.max_length)
+
+    def batches(self, batch_size: int, device="cpu"):
+        for start in range(0, len(self.logs), batch_size):
+            logs = self.logs[start:start + batch_size]
+            lengths = [self._length(log) for log in logs]
+            B, T = len(logs), max(lengths)
+            timestamp = np.zeros((B, T), dtype=np.float64)
+            state = np.zeros((B, T, 13), dtype=np.float32)
+            state[..., 3] = 1. # keep the padding a valid quaternion
+            action = np.zeros((B, T, self.num_rotors), dtype=np.float32)
+            mask = np.zeros((B, T), dtype=bool)
+            for i, (log, length) in enumerate(zip(logs, lengths)):
+                timestamp[i, :length] = log["timestamp"][:length]
+                state[i, :length] = log["state"][:length]
+                action[i, :length] = log["action"][:length]
+                mask[i, :length] = True
+            yield LogBatch(
+                paths=self.paths[start:start + batch_size],
+                timestamp=torch.from_numpy(timestamp).to(device),
+                state=torch.from_numpy(state).to(device),
+                action=torch.from_numpy(action).to(device),
+                mask=torch.from_numpy(mask).to(device),
+                metadata=[log["metadata"] for log in logs],
+            )
+
+
+class HoverObservation:
+    """
+    The ``Hover`` task observation of every step of a :class:`LogBatch`.
+
+    The throttle is not logged; it is reconstructed from the logged commands
+    with the rotor time constants of `dynamics`. The target position and heading
+    are taken from each log's metadata (``target_pos``, ``target_heading``) if
+    present and default to the given values.
+    """
+
+    def __init__(
+        self,
+        dynamics: MultirotorDynamics,
+        target_pos=(0., 0., 2.),
+        target_heading=(1., 0., 0.),
+        max_episode_length: int = None,
+    ):
+        self.dynamics = dynamics
+        self.target_pos = target_pos
+        self.target_heading = target_heading
+        self.max_episode_length = max_episode_length
+
+    def _target(self, batch: LogBatch, key: str, default) -> torch.Tensor:
+        target = [meta.get(key, default) for meta in batch.metadata]
+        return torch.tensor(target, device=batch.state.device).unsqueeze(1)
+
+    def __call__(self, batch: LogBatch) -> torch.Tensor:
+        throttle = throttle_sequence(batch.action, self.dynamics.tau_up, self.dynamics.tau_down)
+        drone_state = self.dynamics.get_state(torch.cat([batch.state, throttle], dim=-1))
+        obs = [
+            self._target(batch, "target_pos", self.target_pos) - drone_state[..., :3],
+            drone_state[..., 3:],
+            self._target(batch, "target_heading", self.target_heading) - drone_state[..., 13:16],
+        ]
+        if self.max_episode_length is not None:
+            t = torch.arange(batch.state.shape[1], device=batch.state.device) / self.max_episode_length
+            obs.append(t.reshape(1, -1, 1).expand(*batch.state.shape[:2], 4))
+        return torch.cat(obs, dim=-1)
+
+
+class ExportedPolicy:
+    """
+    Applies an actor exported with ``sim2real_omnidrones.save_actor`` to a batch
+    of observations, with the same normalization and action bounds as onboard.
+    """
+
+    def __init__(self, module: torch.nn.Module, metadata: dict, device="cpu"):
+        self.module = module.to(device).eval()
+        self.obs_loc = torch.as_tensor(metadata.get("obs_loc", 0.), device=device)
+        self.obs_scale = torch.as_tensor(metadata.get("obs_scale", 1.), device=device)
+        self.action_low = torch.as_tensor(metadata.get("action_low", -float("inf")), device=device)
+        self.action_high = torch.as_tensor(metadata.get("action_high", float("inf")), device=device)
+
+    def __call__(self, obs: torch.Tensor) -> torch.Tensor:
+        action = self.module((obs - self.obs_loc) / self.obs_scale)
+        return torch.clamp(action, self.action_low, self.action_high)
+
+
+@torch.inference_mode()
+def replay(
+    corpus: FlightLogCorpus,
+    observe: Callable[[LogBatch], torch.Tensor],
+    policy: Callable[[torch.Tensor], torch.Tensor],
+    batch_size: int = 1024,
+    chunk_size: int = 2 ** 16,
+    device="cpu",
+) -> Dict:
+    """
+    Run `policy` on the observations `observe` builds from every logged state
+    and compare its actions with the logged commands.
+
+    Args:
+        observe: Maps a :class:`LogBatch` to observations [B, T, obs_dim].
+        policy: Maps observations [N, obs_dim] to actions [N, num_rotors]. It is
+            called on chunks of at most `chunk_size` steps (of any logs), so it
+            must not keep state between calls.
+
+    Returns:
+        A dict with a per-log summary of the action deltas (``logs``), the
+        aggregate over the corpus and the throughput.
+    """
+    start = time.perf_counter()
+    logs = []
+    total_steps, total_sq, total_abs, max_abs = 0, 0., 0., 0.
+    for batch in corpus.batches(batch_size, device):
+        obs = observe(batch)
+        valid = batch.mask.flatten()
+        obs = obs.flatten(0, 1)[valid]
+        action = torch.cat([policy(chunk) for chunk in obs.split(chunk_size)])
+        delta = torch.zeros_like(batch.action).flatten(0, 1)
+        delta[valid] = action.reshape(-1, corpus.num_rotors) - batch.action.flatten(0, 1)[valid]
+        delta = delta.reshape(batch.action.shape).abs()
+
+        lengths = batch.lengths
+        per_step = delta.amax(-1)
+        mean_abs = delta.sum((1, 2)) / (lengths * corpus.num_rotors)
+        rmse = (delta.square().sum((1, 2)) / (lengths * corpus.num_rotors)).sqrt()
+        for i, path in enumerate(batch.paths):
+            logs.append({
+                "path": path,
+                "steps": lengths[i].item(),
+                "mean_abs_delta": mean_abs[i].item(),
+                "max_abs_delta": per_step[i].max().item(),
+                "rmse": rmse[i].item(),
+                # the step at which the policy disagrees most with the log
+                "worst_step": per_step[i].argmax().item(),
+            })
+        total_steps += lengths.sum().item()
+        total_abs += delta.sum().item()
+        total_sq += delta.square().sum().item()
+        max_abs = max(max_abs, delta.max().item())
+    seconds = time.perf_counter() - start
+    return {
+        "logs": logs,
+        "num_logs": len(logs),
+        "steps": total_steps,
+        "mean_abs_delta": total_abs / (total_steps * corpus.num_rotors),
+        "max_abs_delta": max_abs,
+        "rmse": (total_sq / (total_steps * corpus.num_rotors)) ** 0.5,
+        "seconds": seconds,
+        "steps_per_second": total_steps / seconds,
+    }
@@ -0,0 +1,214 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+A file cache for the cloned environments of a stage.
+
+Building a scene clones the template env ``/World/envs/env_0`` into
+``num_envs`` copies, which dominates startup time for large ``num_envs``.
+:class:`StageCache` saves the cloned envs (everything but the template) to a
+``.usdc`` layer keyed by the config, the cloner parameters and the asset files.
+Later runs insert that layer as a sublayer of the stage instead of cloning.
+The cloner also moves the template env to its cell of the grid, so the
+template's ``xformOp`` attributes are stored too and re-applied on load.
+
+A cache entry is invalidated when any of the files the cloned envs depend on
+has been modified since the entry was written.
+
+Only depends on ``pxr`` and can be used with ``usd-core`` outside Isaac Sim.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from pxr import Sdf, Usd, UsdUtils
+
+ASSET_EXTENSIONS = (".usd", ".usda", ".usdc", ".usdz", ".yaml")
+
+
+def _file_stat(path: str) -> List:
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+
+def asset_manifest(paths: Iterable[str]) -> List[List]:
+    """Returns ``[path, size, mtime_ns]`` of the given files. Directories are
+    searched recursively for USD and robot parameter files."""
+    manifest = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file in files:
+                    if file.endswith(ASSET_EXTENSIONS):
+                        manifest.append(_file_stat(os.path.join(root, file)))
+        elif os.path.isfile(path):
+            manifest.append(_file_stat(path))
+    return sorted(manifest)
+
+
+def stage_cache_key(
+    cfg: Dict[str, Any],
+    cloner_params: Dict[str, Any],
+    asset_paths: Iterable[str] = (),
+) -> str:
+    """Hashes the (resolved) config, the cloner parameters and the size and
+    mtime of the asset files."""
+    content = json.dumps(
+        {
+            "cfg": cfg,
+            "cloner": cloner_params,
+            "assets": asset_manifest(asset_paths),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()[:32]
+
+
+def layer_dependencies(layer: Sdf.Layer, prim_paths: Sequence[str]) -> List[str]:
+    """Returns the resolved asset paths referenced or payloaded under `prim_paths`."""
+    dependencies = set()
+    def visit(path: Sdf.Path):
+        spec = layer.GetPrimAtPath(path)
+        if spec is None:
+            return
+        for item in (spec.referenceList.GetAddedOrExplicitItems() + spec.payloadList.GetAddedOrExplicitItems()):
+            if item.assetPath:
+                dependencies.add(layer.ComputeAbsolutePath(item.assetPath))
+    for prim_path in prim_paths:
+        layer.Traverse(Sdf.Path(prim_path), visit)
+    return sorted(path for path in dependencies if os.path.isfile(path))
+
+
+class StageCache:
+    """
+    Saves and restores cloned envs as ``<cache_dir>/<key>.usdc`` with a
+    ``<key>.json`` sidecar that records the env positions and the files the
+    layer depends on.
+
+    Examples:
+        >>> cache = StageCache("~/.cache/omni_drones/stages")
+        >>> key = stage_cache_key(cfg, {"num_envs": 4096, "spacing": 8.}, [ASSET_PATH])
+        >>> envs_positions = cache.load(stage, key)
+        >>> if envs_positions is None:
+        ...     envs_positions = cloner.clone(...)
+        ...     cache.save(stage, key, envs_prim_paths[1:], envs_positions, envs_prim_paths[0])
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def layer_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.usdc")
+
+    def meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the metadata of a valid entry, or None. Stale entries, whose
+        dependencies have been modified or removed, are deleted."""
+        layer_path, meta_path = self.layer_path(key), self.meta_path(key)
+        if not (os.path.isfile(layer_path) and os.path.isfile(meta_path)):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if "template_path" not in meta:
+            # written before the template transform was cached
+            logging.info(f"Stage cache entry {key} is outdated.")
+            self.remove(key)
+            return None
+        for path, size, mtime_ns in meta["dependencies"]:
+            if not os.path.isfile(path) or _file_stat(path) != [path, size, mtime_ns]:
+                logging.info(f"Stage cache entry {key} is stale: {path} has changed.")
+                self.remove(key)
+                return None
+        return meta
+
+    def remove(self, key: str):
+        for path in (self.layer_path(key), self.meta_path(key)):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def save(
+        self,
+        stage: Usd.Stage,
+        key: str,
+        prim_paths: Sequence[str],
+        envs_positions: Sequence[Sequence[float]],
+        template_path: Optional[str] = None,
+    ) -> str:
+        """Copies the prims at `prim_paths` from the root layer of `stage` to the
+        cache. `envs_positions` are the positions of all envs (including the
+        template) as returned by the cloner. The ``xformOp`` attributes of the
+        template at `template_path`, which the cloner has moved to its grid
+        cell, are stored as well."""
+        source = stage.GetRootLayer()
+        layer = Sdf.Layer.CreateNew(self.layer_path(key))
+        with Sdf.ChangeBlock():
+            for prim_path in prim_paths:
+                Sdf.CreatePrimInLayer(layer, Sdf.Path(prim_path).GetParentPath())
+                Sdf.CopySpec(source, prim_path, layer, prim_path)
+            if template_path is not None:
+                _copy_xform_ops(source, layer, template_path)
+        # the cache dir differs from the source layer's, so anchor asset paths
+        UsdUtils.ModifyAssetPaths(
+            layer, lambda path: source.ComputeAbsolutePath(path) if path else path
+        )
+        layer.Save()
+        meta = {
+            "envs_positions": [list(map(float, p)) for p in envs_positions],
+            "prim_paths": list(prim_paths),
+            "template_path": template_path,
+            "dependencies": [_file_stat(p) for p in layer_dependencies(source, prim_paths)],
+        }
+        with open(self.meta_path(key), "w") as f:
+            json.dump(meta, f)
+        return self.layer_path(key)
+
+    def load(self, stage: Usd.Stage, key: str) -> Optional[List[List[float]]]:
+        """Inserts the cached envs as a sublayer of the root layer of `stage` and
+        moves the template env to its cached transform. Returns the env
+        positions, or None on a cache miss."""
+        meta = self.lookup(key)
+        if meta is None:
+            return None
+        root = stage.GetRootLayer()
+        root.subLayerPaths.append(self.layer_path(key))
+        if meta["template_path"] is not None:
+            # authored on the root layer, as the cloner does, since an opinion
+            # in the (weaker) sublayer would not override the template's own
+            with Sdf.ChangeBlock():
+                _copy_xform_ops(Sdf.Layer.FindOrOpen(self.layer_path(key)), root, meta["template_path"])
+        return meta["envs_positions"]
+
+
+def _copy_xform_ops(source: Sdf.Layer, target: Sdf.Layer, prim_path: str):
+    """Copies the ``xformOp:*`` and ``xformOpOrder`` attributes of a prim."""
+    spec = source.GetPrimAtPath(prim_path)
+    if spec is None:
+        return
+    Sdf.CreatePrimInLayer(target, prim_path)
+    for attribute in spec.attributes:
+        if attribute.name.startswith("xformOp"):
+            Sdf.CopySpec(source, attribute.path, target, attribute.path)
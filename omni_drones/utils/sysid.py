@@ -0,0 +1,221 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+Batched differentiable system identification of multirotor parameters.
+
+Given logged root states and rotor commands, the parameters of
+:class:`~omni_drones.controllers.MultirotorDynamics` are fitted by
+backpropagating a multiple-shooting prediction error through the model:
+the log is cut into short segments, each segment is rolled out from its
+logged initial state, and the predicted states are compared with the logged
+ones. Many random initializations are optimized in parallel as a leading
+batch dim of the (per-env) parameters, and the best one is kept.
+
+Note that from states and commands alone, forces are only identifiable
+relative to the mass and torques relative to the inertia. The mass is
+therefore held at its nominal (weighed) value by default; fit `mass` instead
+of `KF` if the thrust constants are the trusted quantity. Likewise, yaw only
+constrains the ratio of `KM` to the z-inertia, so the two trade off against
+each other unless one of them is fixed.
+"""
+
+import copy
+from typing import Dict, Sequence
+
+import torch
+from torch.func import functional_call
+
+from omni_drones.controllers.dynamics import MultirotorDynamics
+
+DEFAULT_PARAMS = ("KF", "KM", "tau_up", "tau_down", "drag_coef", "inertia")
+
+
+def segment(states: torch.Tensor, actions: torch.Tensor, horizon: int, burn_in: int = 0):
+    """
+    Cuts logs of shape [B, T, 13] and [B, T, num_rotors] into segments,
+    skipping the first `burn_in` steps.
+
+    Returns the indices at which the segments start [S], the initial states
+    [B, S, 13], the commands [B, S, horizon, num_rotors] and the states the
+    commands lead to [B, S, horizon, 13].
+    """
+    T = actions.shape[1]
+    num_segments = (T - 1 - burn_in) // horizon
+    starts = burn_in + torch.arange(num_segments) * horizon
+    idx = starts.unsqueeze(-1) + torch.arange(horizon)
+    return starts, states[:, starts], actions[:, idx], states[:, idx + 1]
+
+
+def throttle_sequence(actions: torch.Tensor, tau_up: torch.Tensor, tau_down: torch.Tensor) -> torch.Tensor:
+    """
+    The throttles of `RotorGroup` before each command of `actions` [*, T, num_rotors]
+    is applied, starting from the steady state of the first command. The
+    throttle is not logged but follows from the commands given the lag.
+    """
+    target = torch.clamp((actions + 1) / 2, 1e-6, 1).sqrt()
+    throttle = target[..., 0, :].expand(torch.broadcast_shapes(target[..., 0, :].shape, tau_up.shape))
+    throttles = []
+    for t in range(actions.shape[-2]):
+        throttles.append(throttle)
+        tau = torch.where(target[..., t, :] > throttle, tau_up, tau_down).clamp(0, 1)
+        throttle = throttle + tau * (target[..., t, :] - throttle)
+    return torch.stack(throttles, dim=-2)
+
+
+def prediction_error(pred: torch.Tensor, target: torch.Tensor, scale: torch.Tensor) -> torch.Tensor:
+    """Mean squared error of predicted root states [..., 13], reduced over all but the leading dim."""
+    pos_vel = torch.cat([pred[..., :3], pred[..., 7:13]], -1) - torch.cat([target[..., :3], target[..., 7:13]], -1)
+    # rotation error, invariant to the sign of the quaternion
+    rot = (1 - (pred[..., 3:7] * target[..., 3:7]).sum(-1).square()).clamp_min(0)
+    err = (pos_vel / scale).square().sum(-1) + rot / 1e-3
+    return err.flatten(1).mean(-1)
+
+
+class SystemIdentification:
+    """
+    Fits `params` of a :class:`MultirotorDynamics` as multiplicative log-scale
+    corrections of their nominal values, for `num_inits` initializations at once.
+
+    Examples:
+        >>> sysid = SystemIdentification(MultirotorDynamics(uav_params, dt=0.01))
+        >>> losses = sysid.fit(states, actions)
+        >>> fitted = sysid.best_params()
+        >>> uav_params = to_uav_params(uav_params, fitted, dt=0.01)
+    """
+
+    def __init__(
+        self,
+        dynamics: MultirotorDynamics,
+        params: Sequence[str] = DEFAULT_PARAMS,
+        num_inits: int = 16,
+        init_scale: float = 0.5,
+        horizon: int = 20,
+        burn_in: int = 20,
+    ):
+        self.dynamics = dynamics
+        self.names = list(params)
+        self.num_inits = num_inits
+        self.horizon = horizon
+        self.burn_in = burn_in
+        self.nominal = {name: getattr(dynamics, name).detach().clone() for name in self.names}
+        # the first initialization starts from the nominal values
+        self.log_scales = {}
+        for name, value in self.nominal.items():
+            log_scale = (torch.rand(num_inits, *value.shape, device=value.device) * 2 - 1) * init_scale
+            log_scale[0] = 0.
+            self.log_scales[name] = log_scale.requires_grad_(True)
+        self.losses = torch.full((num_inits,), float("inf"))
+
+    def params(self) -> Dict[str, torch.Tensor]:
+        return {
+            name: self.nominal[name] * self.log_scales[name].exp()
+            for name in self.names
+        }
+
+    def loss(self, actions, starts, init, cmds, targets, scale) -> torch.Tensor:
+        """Per-initialization prediction error, of shape [num_inits]."""
+        params = self.params()
+        N = self.num_inits
+        # [N, 1, num_rotors], broadcasting against the B flights
+        tau_up = params.get("tau_up", self.dynamics.tau_up).expand(N, -1).unsqueeze(-2)
+        tau_down = params.get("tau_down", self.dynamics.tau_down).expand(N, -1).unsqueeze(-2)
+        throttle = throttle_sequence(actions, tau_up, tau_down)[..., starts, :]
+        # [N, B, S, 13 + num_rotors]
+        state = torch.cat([init.expand(N, *init.shape), throttle], dim=-1)
+        pred = []
+        for t in range(cmds.shape[-2]):
+            state = functional_call(self.dynamics, params, (state, cmds[..., t, :]))
+            pred.append(state[..., :13])
+        pred = torch.stack(pred, dim=-2)
+        return prediction_error(pred, targets.expand(N, *targets.shape), scale)
+
+    def fit(
+        self,
+        states: torch.Tensor,
+        actions: torch.Tensor,
+        iters: int = 500,
+        lr: float = 0.05,
+        log_interval: int = 0,
+    ) -> torch.Tensor:
+        """
+        Fits the parameters to logs of root states [B, T, 13] and commands
+        [B, T, num_rotors], where `actions[:, t]` is applied at `states[:, t]`.
+        Returns the final loss of every initialization.
+        """
+        # the reconstructed throttle is only accurate once the unknown initial throttle has decayed
+        starts, init, cmds, targets = segment(states, actions, self.horizon, burn_in=self.burn_in)
+        vel = torch.cat([states[..., :3], states[..., 7:13]], -1)
+        scale = vel.flatten(0, -2).std(0).clamp_min(1e-3)
+
+        opt = torch.optim.Adam(self.log_scales.values(), lr=lr)
+        sched = torch.optim.lr_scheduler.CosineAnnealingLR(opt, iters)
+        for i in range(iters):
+            losses = self.loss(actions, starts, init, cmds, targets, scale)
+            opt.zero_grad()
+            losses.sum().backward()
+            opt.step()
+            sched.step()
+            if log_interval and i % log_interval == 0:
+                print(f"iter {i:>5}: best loss {losses.min().item():.3e}")
+        with torch.no_grad():
+            self.losses = self.loss(actions, starts, init, cmds, targets, scale).cpu()
+        return self.losses
+
+    def best_params(self) -> Dict[str, torch.Tensor]:
+        best = self.losses.argmin()
+        return {name: value[best].detach() for name, value in self.params().items()}
+
+
+def to_uav_params(uav_params: dict, fitted: Dict[str, torch.Tensor], dt: float, sim_dt: float = None) -> dict:
+    """
+    Writes fitted parameters into a copy of a params dict in the format of
+    `robots/assets/usd/*.yaml`.
+
+    `tau_up`/`tau_down` are per-step blending coefficients of the throttle, so
+    they depend on the step size. They are fitted at the log's `dt` and
+    converted to `sim_dt` (by default the same) through their time constants.
+    """
+    params = copy.deepcopy(uav_params)
+    rotor_config = params["rotor_configuration"]
+    max_rot_vels = torch.as_tensor(rotor_config["max_rotation_velocities"]).float()
+    fitted = {k: v.detach().cpu() for k, v in fitted.items()}
+
+    if "mass" in fitted:
+        params["mass"] = fitted["mass"].item()
+    if "inertia" in fitted:
+        for key, value in zip(("xx", "yy", "zz"), fitted["inertia"].tolist()):
+            params["inertia"][key] = value
+    if "drag_coef" in fitted:
+        params["drag_coef"] = fitted["drag_coef"].item()
+    if "KF" in fitted:
+        rotor_config["force_constants"] = (fitted["KF"] / max_rot_vels.square()).tolist()
+    if "KM" in fitted:
+        rotor_config["moment_constants"] = (fitted["KM"] / max_rot_vels.square()).tolist()
+    sim_dt = dt if sim_dt is None else sim_dt
+    for name in ("tau_up", "tau_down"):
+        if name in fitted:
+            alpha = fitted[name].clamp(1e-6, 1 - 1e-6)
+            time_constant = -dt / torch.log1p(-alpha)
+            rotor_config[name] = (1 - torch.exp(-sim_dt / time_constant)).tolist()
+    return params
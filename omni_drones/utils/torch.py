@@ -21,6 +21,9 @@
 # SOFTWARE.
 
 
+import functools
+import warnings
+
 import torch
 from typing import Sequence, Union
 from contextlib import contextmanager
@@ -268,3 +271,46 @@ def symlog(x: torch.Tensor):
 def symexp(x: torch.Tensor):
     return torch.sign(x) * (torch.exp(torch.abs(x)) - 1)
 
+
+
+def maybe_compile(func, mode: str = "compile", **kwargs):
+    """
+    Compiles a pure tensor function with `torch.compile` (``mode="compile"``) or
+    TorchScript (``mode="script"``), falling back to eager execution if
+    compilation fails, e.g., on platforms without a working compiler toolchain.
+    ``mode="eager"`` (or None) returns `func` unchanged.
+
+    `torch.compile` compiles lazily, so its fallback happens on the first call
+    that fails to compile. Only compiler errors trigger it; errors of the
+    function itself on the given inputs (e.g. mismatching shapes, which dynamo
+    reports as `TorchRuntimeError` while tracing) are raised as they are.
+    The returned function's `compiled` attribute tells whether it is still
+    compiled. `kwargs` are passed to `torch.compile`.
+    """
+    if mode in (None, "eager", "none"):
+        return func
+    if mode == "script":
+        try:
+            return torch.jit.script(func)
+        except (RuntimeError, OSError, torch.jit.frontend.FrontendError) as e:
+            warnings.warn(f"Failed to script {func.__name__}, running eagerly: {e}")
+            return func
+    if mode != "compile":
+        raise ValueError(f"Unknown compile mode: {mode}.")
+
+    compiled = torch.compile(func, **kwargs)
+    impl = [compiled]
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        try:
+            return impl[0](*args, **kwargs)
+        except torch._dynamo.exc.TorchDynamoException as e:
+            exc = torch._dynamo.exc
+            if impl[0] is func or isinstance(e, (exc.TorchRuntimeError, exc.UserError)):
+                raise
+            warnings.warn(f"Failed to compile {func.__name__}, running eagerly: {e}")
+            impl[0] = func
+            wrapped.compiled = False
+            return func(*args, **kwargs)
+    wrapped.compiled = True
+    return wrapped
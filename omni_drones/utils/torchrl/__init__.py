@@ -21,5 +21,5 @@
 # SOFTWARE.
 
 
-from .env import AgentSpec, RenderCallback, EpisodeStats
+from .env import AgentSpec, RenderCallback, EpisodeStats, EpisodeStatsReducer
 from .collector import SyncDataCollector
\ No newline at end of file
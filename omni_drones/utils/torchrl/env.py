@@ -20,17 +20,20 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import math
 import torch
 import numpy as np
 import einops
 from tqdm import tqdm
-from typing import Optional, Sequence
+from typing import Dict, Optional, Sequence
 
 from dataclasses import dataclass
 from torchrl.envs import EnvBase
 from torchrl.data import TensorSpec, CompositeSpec
 from tensordict import TensorDictBase
 
+from omni_drones.utils.torch import symlog, symexp
+
 
 @dataclass
 class AgentSpec:
@@ -126,3 +129,105 @@ class EpisodeStats:
     def __len__(self):
         return len(self._stats)
 
+
+class EpisodeStatsReducer:
+    """
+    An on-device alternative to :class:`EpisodeStats`.
+
+    Instead of gathering the stats of every finished episode into a Python list,
+    running sums, min/max and a fixed-bin histogram are kept per stat key and
+    updated with masked reductions. :meth:`add` therefore never synchronizes
+    with the host; data is only transferred in :meth:`pop`.
+
+    The histogram bins are uniform in symlog space over ``[-max_abs, max_abs]``,
+    so quantiles are estimated with a bounded relative (rather than absolute)
+    error regardless of the scale of the stat.
+
+    Examples:
+        >>> episode_stats = EpisodeStatsReducer(stats_keys)
+        >>> for data in collector:
+        ...     episode_stats.add(data)
+        ...     if len(episode_stats) >= num_envs: # synchronizes
+        ...         run.log(episode_stats.pop()) # {"stats.return": ..., "stats.return.p50": ...}
+    """
+    def __init__(
+        self,
+        in_keys: Sequence[str] = None,
+        num_bins: int = 512,
+        max_abs: float = 1e6,
+        quantiles: Sequence[float] = (0.1, 0.5, 0.9),
+    ):
+        self.in_keys = in_keys
+        self.num_bins = num_bins
+        self.bound = math.log1p(max_abs)
+        self.bin_width = 2 * self.bound / num_bins
+        self.quantiles = quantiles
+        self._episodes = None
+
+    def _init_buffers(self, tensordict: TensorDictBase):
+        device = tensordict.device
+        self._episodes = torch.zeros((), device=device)
+        self._sum = {}
+        self._min = {}
+        self._max = {}
+        self._hist = {}
+        for key in self.in_keys:
+            shape = tensordict.get(key).shape[tensordict.batch_dims:]
+            self._sum[key] = torch.zeros(shape, device=device)
+            self._min[key] = torch.full(shape, torch.inf, device=device)
+            self._max[key] = torch.full(shape, -torch.inf, device=device)
+            self._hist[key] = torch.zeros(self.num_bins, device=device)
+
+    def add(self, tensordict: TensorDictBase):
+        next_tensordict = tensordict["next"]
+        if self._episodes is None:
+            self._init_buffers(next_tensordict)
+        done = next_tensordict.get("done").reshape(-1)
+        self._episodes.add_(done.sum())
+        for key in self.in_keys:
+            value = next_tensordict.get(key).float()
+            value = value.reshape(done.shape[0], *value.shape[next_tensordict.batch_dims:])
+            mask = done.reshape(-1, *[1] * (value.dim() - 1)).expand_as(value)
+            self._sum[key].add_(torch.where(mask, value, 0.).sum(0))
+            torch.minimum(self._min[key], torch.where(mask, value, torch.inf).amin(0), out=self._min[key])
+            torch.maximum(self._max[key], torch.where(mask, value, -torch.inf).amax(0), out=self._max[key])
+            bins = ((symlog(value) + self.bound) / self.bin_width).long().clamp(0, self.num_bins - 1)
+            self._hist[key].index_add_(0, bins.reshape(-1), mask.reshape(-1).float())
+
+    def _quantiles(self, key) -> torch.Tensor:
+        hist = self._hist[key]
+        cdf = hist.cumsum(0)
+        target = torch.as_tensor(self.quantiles, device=hist.device) * cdf[-1]
+        idx = torch.searchsorted(cdf, target).clamp_max(self.num_bins - 1)
+        below = cdf[idx] - hist[idx]
+        frac = ((target - below) / hist[idx].clamp_min(1e-6)).clamp(0., 1.)
+        x = symexp(-self.bound + (idx + frac) * self.bin_width)
+        return x.clamp(self._min[key].min(), self._max[key].max())
+
+    def pop(self) -> Dict[str, float]:
+        """Returns the mean, min, max and quantiles of each stat over the episodes
+        finished since the last call, and resets the reducer. This is the only
+        place where data is transferred to the host."""
+        if self._episodes is None:
+            return {}
+        names, values = [], []
+        count = self._episodes.clamp_min(1.)
+        for key in self.in_keys:
+            name = ".".join(key) if isinstance(key, tuple) else key
+            names.extend([name, f"{name}.min", f"{name}.max"])
+            values.extend([
+                (self._sum[key] / count).mean(),
+                self._min[key].min(),
+                self._max[key].max(),
+            ])
+            names.extend(f"{name}.p{round(q * 100)}" for q in self.quantiles)
+            values.extend(self._quantiles(key).unbind(0))
+        values = torch.stack(values).cpu().tolist()
+        self._episodes = None
+        return dict(zip(names, values))
+
+    def __len__(self):
+        # NOTE: this synchronizes with the device
+        if self._episodes is None:
+            return 0
+        return int(self._episodes.item())
@@ -247,7 +247,6 @@ class RateController(Transform):
         super().__init__([], in_keys_inv=[("info", "drone_state")])
         self.controller = controller
         self.action_key = action_key
-        self.max_thrust = self.controller.max_thrusts.sum(-1)
     
     def transform_input_spec(self, input_spec: TensorSpec) -> TensorSpec:
         action_spec = input_spec[("full_action_spec", *self.action_key)]
@@ -255,11 +254,16 @@ class RateController(Transform):
         input_spec[("full_action_spec", *self.action_key)] = spec
         return input_spec
     
+    def _max_thrust(self, target_thrust: torch.Tensor) -> torch.Tensor:
+        # the controller's parameters may be per-env
+        max_thrusts = self.controller.get_param("max_thrusts", target_thrust.dim() - 1)
+        return max_thrusts.sum(-1, keepdim=True)
+
     def _inv_call(self, tensordict: TensorDictBase) -> TensorDictBase:
         drone_state = tensordict[("info", "drone_state")][..., :13]
         action = tensordict[self.action_key]
         target_rate, target_thrust = action.split([3, 1], -1)
-        target_thrust = ((target_thrust + 1) / 2).clip(0.) * self.max_thrust
+        target_thrust = ((target_thrust + 1) / 2).clip(0.) * self._max_thrust(target_thrust)
         cmds = self.controller(
             drone_state, 
             target_rate=target_rate * torch.pi, 
@@ -279,7 +283,6 @@ class AttitudeController(Transform):
         super().__init__([], in_keys_inv=[("info", "drone_state")])
         self.controller = controller
         self.action_key = action_key
-        self.max_thrust = self.controller.max_thrusts.sum(-1)
     
     def transform_input_spec(self, input_spec: TensorSpec) -> TensorSpec:
         action_spec = input_spec[("full_action_spec", *self.action_key)]
@@ -287,13 +290,18 @@ class AttitudeController(Transform):
         input_spec[("full_action_spec", *self.action_key)] = spec
         return input_spec
     
+    def _max_thrust(self, target_thrust: torch.Tensor) -> torch.Tensor:
+        # the controller's parameters may be per-env
+        max_thrusts = self.controller.get_param("max_thrusts", target_thrust.dim() - 1)
+        return max_thrusts.sum(-1, keepdim=True)
+
     def _inv_call(self, tensordict: TensorDictBase) -> TensorDictBase:
         drone_state = tensordict[("info", "drone_state")][..., :13]
         action = tensordict[self.action_key]
         target_thrust, target_yaw_rate, target_roll, target_pitch = action.split(1, dim=-1)
         cmds = self.controller(
             drone_state,
-            target_thrust=((target_thrust+1)/2).clip(0.) * self.max_thrust,
+            target_thrust=((target_thrust+1)/2).clip(0.) * self._max_thrust(target_thrust),
             target_yaw_rate=target_yaw_rate * torch.pi,
             target_roll=target_roll * torch.pi,
             target_pitch=target_pitch * torch.pi
@@ -0,0 +1,178 @@
+"""Export a trained actor to TorchScript for onboard deployment.
+
+Usage:
+    python export.py task=Hover export.checkpoint=/path/to/checkpoint_final.pt
+    python export.py task=Hover export.checkpoint=... export.quantize=true
+
+Writes ``actor.pt`` (and ``actor_int8.pt`` with ``export.quantize=true``) in
+the format loaded by ``sim2real_omnidrones.load_actor``, the recorded
+observations, and ``report.json`` comparing fp32 and int8 actions and latency.
+"""
+import json
+import logging
+import os
+
+import hydra
+import torch
+from omegaconf import OmegaConf
+
+from omni_drones import init_simulation_app
+from torchrl.data import CompositeSpec
+from torchrl.envs.utils import set_exploration_type, ExplorationType
+from omni_drones.utils.torchrl.transforms import (
+    FromMultiDiscreteAction,
+    FromDiscreteAction,
+    ravel_composite,
+    VelController,
+    AttitudeController,
+    RateController,
+)
+from omni_drones.learning import ALGOS
+from omni_drones.learning.export import (
+    strip_actor,
+    quantize_actor,
+    to_torchscript,
+    parity_report,
+)
+from sim2real_omnidrones import save_actor
+
+from torchrl.envs.transforms import TransformedEnv, InitTracker, Compose
+
+FILE_PATH = os.path.dirname(__file__)
+
+
+def flatten_inputs(tensordict, in_keys):
+    inputs = [tensordict[tuple(key.split("."))] for key in in_keys]
+    inputs = torch.cat(inputs, dim=-1)
+    return inputs.reshape(-1, inputs.shape[-1])
+
+
+@hydra.main(config_path=FILE_PATH, config_name="export", version_base=None)
+def main(cfg):
+    OmegaConf.register_new_resolver("eval", eval)
+    OmegaConf.resolve(cfg)
+    OmegaConf.set_struct(cfg, False)
+    simulation_app = init_simulation_app(cfg)
+
+    from omni_drones.envs.isaac_env import IsaacEnv
+
+    env_class = IsaacEnv.REGISTRY[cfg.task.name]
+    base_env = env_class(cfg, headless=cfg.headless)
+
+    transforms = [InitTracker()]
+
+    # a CompositeSpec is by deafault processed by a entity-based encoder
+    # ravel it to use a MLP encoder instead
+    if cfg.task.get("ravel_obs", False):
+        transform = ravel_composite(base_env.observation_spec, ("agents", "observation"))
+        transforms.append(transform)
+    if cfg.task.get("ravel_obs_central", False):
+        transform = ravel_composite(base_env.observation_spec, ("agents", "observation_central"))
+        transforms.append(transform)
+    if (
+        cfg.task.get("ravel_intrinsics", True)
+        and ("agents", "intrinsics") in base_env.observation_spec.keys(True)
+        and isinstance(base_env.observation_spec[("agents", "intrinsics")], CompositeSpec)
+    ):
+        transforms.append(ravel_composite(base_env.observation_spec, ("agents", "intrinsics"), start_dim=-1))
+
+    # optionally discretize the action space or use a controller
+    action_transform: str = cfg.task.get("action_transform", None)
+    if action_transform is not None:
+        if action_transform.startswith("multidiscrete"):
+            nbins = int(action_transform.split(":")[1])
+            transform = FromMultiDiscreteAction(nbins=nbins)
+            transforms.append(transform)
+        elif action_transform.startswith("discrete"):
+            nbins = int(action_transform.split(":")[1])
+            transform = FromDiscreteAction(nbins=nbins)
+            transforms.append(transform)
+        elif action_transform == "velocity":
+            from omni_drones.controllers import LeePositionController
+            controller = LeePositionController(9.81, base_env.drone.params).to(base_env.device)
+            transform = VelController(controller)
+            transforms.append(transform)
+        elif action_transform == "rate":
+            from omni_drones.controllers import RateController as _RateController
+            controller = _RateController(9.81, base_env.drone.params).to(base_env.device)
+            transform = RateController(controller)
+            transforms.append(transform)
+        elif action_transform == "attitude":
+            from omni_drones.controllers import AttitudeController as _AttitudeController
+            controller = _AttitudeController(9.81, base_env.drone.params).to(base_env.device)
+            transform = AttitudeController(controller)
+            transforms.append(transform)
+        elif not action_transform.lower() == "none":
+            raise NotImplementedError(f"Unknown action transform: {action_transform}")
+        if not action_transform.lower() == "none":
+            # the exported network stops at the policy output; the transform must run onboard
+            logging.warning(f"The exported actor outputs actions before the '{action_transform}' transform.")
+
+    env = TransformedEnv(base_env, Compose(*transforms)).eval()
+    env.set_seed(cfg.seed)
+
+    policy = ALGOS[cfg.algo.name.lower()](
+        cfg.algo,
+        env.observation_spec,
+        env.action_spec,
+        env.reward_spec,
+        device=base_env.device
+    )
+    policy.load_state_dict(torch.load(cfg.export.checkpoint))
+
+    os.makedirs(cfg.export.output_dir, exist_ok=True)
+    tensordict = env.reset()
+    actor, in_keys = strip_actor(policy.actor, tensordict)
+    logging.info(f"Stripped actor with inputs {in_keys}:\n{actor}")
+
+    if cfg.export.observations is not None:
+        observations = torch.load(cfg.export.observations)
+    else:
+        with set_exploration_type(ExplorationType.MEAN), torch.no_grad():
+            rollout = env.rollout(
+                max_steps=cfg.export.record_steps,
+                policy=policy,
+                auto_reset=True,
+                break_when_any_done=False,
+            )
+        observations = flatten_inputs(rollout, in_keys).cpu()
+        torch.save(observations, os.path.join(cfg.export.output_dir, "observations.pt"))
+    logging.info(f"Using {len(observations)} recorded observations.")
+
+    action_spec = env.action_spec[("agents", "action")]
+    action_dim = action_spec.shape[-1]
+    metadata = {
+        "task": cfg.task.name,
+        "algo": cfg.algo.name,
+        "in_keys": in_keys,
+        "observation_dim": observations.shape[-1],
+        "action_dim": action_dim,
+        "action_transform": action_transform,
+    }
+    space = getattr(action_spec, "space", None)
+    if hasattr(space, "low"):
+        metadata["action_low"] = space.low.reshape(-1, action_dim)[0].tolist()
+        metadata["action_high"] = space.high.reshape(-1, action_dim)[0].tolist()
+
+    example = observations[:1]
+    scripted = to_torchscript(actor, example)
+    save_actor(scripted, os.path.join(cfg.export.output_dir, "actor.pt"), metadata)
+    logging.info(f"Saved fp32 actor to {cfg.export.output_dir}/actor.pt")
+
+    if cfg.export.quantize:
+        quantized = to_torchscript(quantize_actor(actor), example)
+        save_actor(
+            quantized,
+            os.path.join(cfg.export.output_dir, "actor_int8.pt"),
+            {**metadata, "quantization": "dynamic_int8"}
+        )
+        report = parity_report(scripted, quantized, observations, iters=cfg.export.latency_iters)
+        with open(os.path.join(cfg.export.output_dir, "report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+
+    simulation_app.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -83,7 +83,7 @@ def main(cfg):
         elif action_transform == "velocity":
             from omni_drones.controllers import LeePositionController
             controller = LeePositionController(9.81, base_env.drone.params).to(base_env.device)
-            transform = VelController(torch.vmap(controller))
+            transform = VelController(controller)
             transforms.append(transform)
         elif action_transform == "rate":
             from omni_drones.controllers import RateController as _RateController
@@ -93,7 +93,7 @@ def main(cfg):
         elif action_transform == "attitude":
             from omni_drones.controllers import AttitudeController as _AttitudeController
             controller = _AttitudeController(9.81, base_env.drone.params).to(base_env.device)
-            transform = AttitudeController(torch.vmap(torch.vmap(controller)))
+            transform = AttitudeController(controller)
             transforms.append(transform)
         elif not action_transform.lower() == "none":
             raise NotImplementedError(f"Unknown action transform: {action_transform}")
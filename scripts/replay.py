@@ -0,0 +1,125 @@
+"""Replay flight logs through a controller or an exported policy and report the
+action deltas against the logged commands.
+
+Usage:
+    python replay.py --logs "flights/*" --actor actor.pt --drone_model hummingbird
+    python replay.py --logs "flights/*" --controller lee --out report.json
+    python replay.py --synthetic 4096 --controller lee
+
+A log is a directory written by `omni_drones.utils.replay.save_flight_log`.
+With `--synthetic N`, N hover flights of a `LeePositionController` on
+`MultirotorDynamics` are generated into a temporary directory first, which
+makes a quick throughput check (and, replaying the same controller, a zero
+delta sanity check).
+"""
+import argparse
+import glob
+import json
+import os.path as osp
+import tempfile
+
+import torch
+import yaml
+
+from omni_drones.controllers import LeePositionController, MultirotorDynamics
+from omni_drones.utils.replay import (
+    ExportedPolicy,
+    FlightLogCorpus,
+    HoverObservation,
+    replay,
+    save_flight_log,
+)
+from sim2real_omnidrones import load_module
+
+ASSET_PATH = osp.join(osp.dirname(__file__), "..", "omni_drones", "robots", "assets")
+
+
+def synthetic_logs(root, uav_params, num_flights, steps, dt):
+    dynamics = MultirotorDynamics(uav_params, dt=dt)
+    controller = LeePositionController(9.81, uav_params)
+    root_state = torch.zeros(num_flights, 13)
+    root_state[:, :3] = torch.rand(num_flights, 3) * torch.tensor([4., 4., 1.5]) + torch.tensor([-2., -2., 1.])
+    root_state[:, 3] = 1.
+    state = dynamics.init_state(root_state)
+    target_pos = torch.tensor([0., 0., 2.]).expand(num_flights, 3)
+    states, actions = [], []
+    with torch.no_grad():
+        for _ in range(steps):
+            cmds = controller(state[..., :13], target_pos=target_pos)
+            states.append(state[..., :13])
+            actions.append(cmds)
+            state = dynamics(state, cmds)
+    states, actions = torch.stack(states, 1), torch.stack(actions, 1)
+    # flights of different lengths, as in a real corpus
+    lengths = torch.randint(steps // 2, steps + 1, (num_flights,))
+    paths = []
+    for i in range(num_flights):
+        path = osp.join(root, f"flight_{i:05d}")
+        T = lengths[i]
+        save_flight_log(
+            path, torch.arange(T) * dt, states[i, :T], actions[i, :T], dt=dt, target_pos=[0., 0., 2.]
+        )
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", type=str, default=None, help="glob of flight log directories")
+    parser.add_argument("--synthetic", type=int, default=None, help="number of flights to generate")
+    parser.add_argument("--actor", type=str, default=None)
+    parser.add_argument("--controller", choices=["lee"], default=None)
+    parser.add_argument("--drone_model", default="hummingbird")
+    parser.add_argument("--dt", type=float, default=0.016, help="control period the rotor time constants refer to")
+    parser.add_argument("--max_episode_length", type=int, default=None, help="enables the time encoding")
+    parser.add_argument("--batch_size", type=int, default=1024)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--top", type=int, default=10, help="number of worst logs to print")
+    parser.add_argument("--out", type=str, default=None)
+    args = parser.parse_args()
+    if (args.actor is None) == (args.controller is None):
+        parser.error("exactly one of --actor or --controller is required")
+
+    with open(osp.join(ASSET_PATH, "usd", f"{args.drone_model}.yaml")) as f:
+        uav_params = yaml.safe_load(f)
+
+    tmpdir = None
+    if args.synthetic is not None:
+        tmpdir = tempfile.TemporaryDirectory()
+        paths = synthetic_logs(tmpdir.name, uav_params, args.synthetic, steps=500, dt=args.dt)
+    elif args.logs is not None:
+        paths = sorted(glob.glob(args.logs))
+    else:
+        parser.error("either --logs or --synthetic is required")
+    corpus = FlightLogCorpus(paths)
+    print(f"replaying {len(corpus)} logs, {corpus.num_steps} steps")
+
+    if args.actor is not None:
+        module, metadata = load_module(args.actor, map_location=args.device)
+        dynamics = MultirotorDynamics(uav_params, dt=args.dt).to(args.device)
+        observe = HoverObservation(dynamics, max_episode_length=args.max_episode_length)
+        policy = ExportedPolicy(module, metadata, device=args.device)
+    else:
+        controller = LeePositionController(9.81, uav_params).to(args.device)
+        target_pos = torch.tensor([0., 0., 2.], device=args.device)
+        observe = lambda batch: batch.state
+        policy = lambda state: controller(state, target_pos=target_pos.expand(len(state), 3))
+
+    report = replay(corpus, observe, policy, batch_size=args.batch_size, device=args.device)
+    print(
+        f"{report['steps']} steps in {report['seconds']:.2f}s ({report['steps_per_second']:.3g} steps/s), "
+        f"mean |delta| {report['mean_abs_delta']:.4f}, max |delta| {report['max_abs_delta']:.4f}"
+    )
+    for log in sorted(report["logs"], key=lambda log: log["max_abs_delta"], reverse=True)[:args.top]:
+        print(f"  {log['path']}: max |delta| {log['max_abs_delta']:.4f} at step {log['worst_step']}, rmse {log['rmse']:.4f}")
+
+    if args.out is not None:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
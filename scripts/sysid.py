@@ -0,0 +1,136 @@
+"""Fit multirotor parameters to flight logs and write an updated params YAML.
+
+Usage:
+    python sysid.py --log flight.pt --drone_model hummingbird --out hummingbird_fitted.yaml
+    python sysid.py --synthetic --check --drone_model hummingbird
+
+A log is a file saved with `torch.save` holding a dict with `state`, the root
+states [B, T, 13] (position, quaternion wxyz, linear and angular velocity in
+the world frame), `action`, the rotor commands in [-1, 1] applied at each state
+[B, T, num_rotors], and `dt`, the time between consecutive states.
+
+With `--synthetic`, logs are generated by flying `MultirotorDynamics` with
+randomly perturbed parameters under a `LeePositionController` tracking random
+waypoints, and the recovered parameters are compared with the true ones. It
+runs on CPU in a few minutes and serves as a check of the identification:
+with `--check`, the script exits with an error if any parameter is further
+from the true value than its tolerance in `TOLERANCES`.
+"""
+import argparse
+import os.path as osp
+import sys
+
+import torch
+import yaml
+
+from omni_drones.controllers import LeePositionController, MultirotorDynamics
+from omni_drones.utils.sysid import DEFAULT_PARAMS, SystemIdentification, to_uav_params
+
+ASSET_PATH = osp.join(osp.dirname(__file__), "..", "omni_drones", "robots", "assets")
+
+# the max. relative errors accepted by `--check`. The yaw moment constant and
+# the drag are the least excited by the tracking flights and converge last.
+TOLERANCES = {
+    "KF": 0.02,
+    "KM": 0.05,
+    "tau_up": 0.02,
+    "tau_down": 0.02,
+    "drag_coef": 0.05,
+    "inertia": 0.02,
+    "mass": 0.02,
+}
+
+
+def synthetic_logs(uav_params, true_params, dt, num_flights, steps, noise_std):
+    dynamics = MultirotorDynamics(uav_params, dt=dt)
+    dynamics.set_params(**true_params)
+    controller = LeePositionController(9.81, uav_params)
+
+    root_state = torch.zeros(num_flights, 13)
+    root_state[:, 2] = 1.
+    root_state[:, 3] = 1.
+    state = dynamics.init_state(root_state)
+    states, actions = [], []
+    for t in range(steps):
+        if t % 50 == 0:
+            target_pos = torch.randn(num_flights, 3) * 0.5 + torch.tensor([0., 0., 1.])
+            target_yaw = torch.randn(num_flights, 1) * 0.5
+        # excitation on top of the tracking commands
+        cmds = controller(state[..., :13], target_pos=target_pos, target_yaw=target_yaw)
+        cmds = (cmds + torch.randn_like(cmds) * 0.1).clamp(-1, 1)
+        states.append(state[..., :13])
+        actions.append(cmds)
+        state = dynamics(state, cmds)
+    states = torch.stack(states, 1)
+    states = states + torch.randn_like(states) * noise_std
+    states[..., 3:7] = states[..., 3:7] / states[..., 3:7].norm(dim=-1, keepdim=True)
+    return {"state": states, "action": torch.stack(actions, 1), "dt": dt}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", type=str, default=None)
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--check", action="store_true", help="with --synthetic, fail if a parameter is not recovered")
+    parser.add_argument("--drone_model", default="hummingbird")
+    parser.add_argument("--params", nargs="+", default=list(DEFAULT_PARAMS))
+    parser.add_argument("--num_inits", type=int, default=16)
+    parser.add_argument("--horizon", type=int, default=20)
+    parser.add_argument("--iters", type=int, default=1000)
+    parser.add_argument("--lr", type=float, default=0.05)
+    parser.add_argument("--sim_dt", type=float, default=None, help="step size to convert the fitted tau_up/tau_down to")
+    parser.add_argument("--out", type=str, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.check and not args.synthetic:
+        parser.error("--check requires --synthetic")
+    torch.manual_seed(args.seed)
+
+    with open(osp.join(ASSET_PATH, "usd", f"{args.drone_model}.yaml")) as f:
+        uav_params = yaml.safe_load(f)
+
+    if args.synthetic:
+        nominal = MultirotorDynamics(uav_params, dt=0.01)
+        true_params = {
+            name: getattr(nominal, name) * (0.7 + 0.6 * torch.rand_like(getattr(nominal, name)))
+            for name in args.params
+        }
+        # the drag coefficient of the stock models is large; keep it in a plausible range
+        if "drag_coef" in true_params:
+            true_params["drag_coef"] = torch.tensor(0.05 + 0.1 * torch.rand(()).item())
+        log = synthetic_logs(uav_params, true_params, dt=0.01, num_flights=16, steps=400, noise_std=1e-4)
+    elif args.log is not None:
+        log = torch.load(args.log)
+    else:
+        parser.error("either --log or --synthetic is required")
+
+    dynamics = MultirotorDynamics(uav_params, dt=log["dt"])
+    sysid = SystemIdentification(
+        dynamics, args.params, num_inits=args.num_inits, horizon=args.horizon
+    )
+    losses = sysid.fit(log["state"], log["action"], iters=args.iters, lr=args.lr, log_interval=50)
+    fitted = sysid.best_params()
+    print(f"final loss: best {losses.min():.3e}, median {losses.median():.3e} over {args.num_inits} inits")
+
+    failed = []
+    for name, value in fitted.items():
+        line = f"{name:>10}: {value.numpy().round(6)}"
+        if args.synthetic:
+            rel_err = ((value - true_params[name]) / true_params[name]).abs().max()
+            line += f"  true {true_params[name].numpy().round(6)}  max rel. error {rel_err:.2%}"
+            if rel_err > TOLERANCES[name]:
+                failed.append(name)
+                line += f" > {TOLERANCES[name]:.0%}"
+        print(line)
+
+    if args.out is not None:
+        with open(args.out, "w") as f:
+            yaml.safe_dump(to_uav_params(uav_params, fitted, log["dt"], args.sim_dt), f, sort_keys=False)
+        print(f"wrote {args.out}")
+
+    if args.check and failed:
+        sys.exit(f"not recovered within tolerance: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
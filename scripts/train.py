@@ -26,7 +26,7 @@ from omni_drones.utils.torchrl.transforms import (
     History
 )
 from omni_drones.utils.wandb import init_wandb
-from omni_drones.utils.torchrl import RenderCallback, EpisodeStats
+from omni_drones.utils.torchrl import RenderCallback, EpisodeStatsReducer
 from omni_drones.learning import ALGOS
 
 from setproctitle import setproctitle
@@ -119,7 +119,7 @@ def main(cfg):
         elif action_transform == "velocity":
             from omni_drones.controllers import LeePositionController
             controller = LeePositionController(9.81, base_env.drone.params).to(base_env.device)
-            transform = VelController(torch.vmap(controller))
+            transform = VelController(controller)
             transforms.append(transform)
         elif action_transform == "rate":
             from omni_drones.controllers import RateController as _RateController
@@ -158,7 +158,7 @@ def main(cfg):
         k for k in base_env.observation_spec.keys(True, True) 
         if isinstance(k, tuple) and k[0]=="stats"
     ]
-    episode_stats = EpisodeStats(stats_keys)
+    episode_stats = EpisodeStatsReducer(stats_keys)
     collector = SyncDataCollector(
         env,
         policy=policy,
@@ -229,13 +229,10 @@ def main(cfg):
     env.train()
     for i, data in enumerate(pbar):
         info = {"env_frames": collector._frames, "rollout_fps": collector._fps}
-        episode_stats.add(data.to_tensordict())
+        episode_stats.add(data)
         
         if len(episode_stats) >= base_env.num_envs:
-            stats = {
-                "train/" + (".".join(k) if isinstance(k, tuple) else k): torch.mean(v.float()).item() 
-                for k, v in episode_stats.pop().items(True, True)
-            }
+            stats = {"train/" + k: v for k, v in episode_stats.pop().items()}
             info.update(stats)
 
         info.update(policy.train_op(data.to_tensordict()))
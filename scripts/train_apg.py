@@ -0,0 +1,83 @@
+import logging
+import os
+
+import hydra
+import torch
+import wandb
+import yaml
+
+from tqdm import tqdm
+from omegaconf import OmegaConf
+
+from omni_drones.controllers import MultirotorDynamics
+from omni_drones.learning.apg import APGPolicy, TASKS
+from omni_drones.learning.export import to_torchscript
+from omni_drones.utils.wandb import init_wandb
+from sim2real_omnidrones import save_actor
+
+FILE_PATH = os.path.dirname(__file__)
+ASSET_PATH = os.path.join(FILE_PATH, "..", "omni_drones", "robots", "assets")
+
+
+@hydra.main(config_path=FILE_PATH, config_name="train_apg", version_base=None)
+def main(cfg):
+    OmegaConf.register_new_resolver("eval", eval)
+    OmegaConf.resolve(cfg)
+    OmegaConf.set_struct(cfg, False)
+    torch.manual_seed(cfg.seed)
+
+    run = init_wandb(cfg)
+    print(OmegaConf.to_yaml(cfg))
+
+    with open(os.path.join(ASSET_PATH, "usd", f"{cfg.task.drone_model.lower()}.yaml")) as f:
+        uav_params = yaml.safe_load(f)
+    dynamics = MultirotorDynamics(
+        uav_params, dt=cfg.sim.dt, g=-cfg.sim.gravity[2], substeps=cfg.sim.substeps
+    ).to(cfg.device)
+
+    if cfg.task.name not in TASKS:
+        raise NotImplementedError(f"No differentiable version of task {cfg.task.name}, available: {list(TASKS)}.")
+    task = TASKS[cfg.task.name](cfg, dynamics, cfg.env.num_envs, cfg.device)
+    policy = APGPolicy(cfg.algo, task, cfg.device)
+    if cfg.algo.checkpoint_path is not None:
+        policy.load_state_dict(torch.load(cfg.algo.checkpoint_path))
+
+    pbar = tqdm(range(cfg.max_iters))
+    for i in pbar:
+        info = policy.train_op()
+        info["env_frames"] = (i + 1) * cfg.algo.horizon * cfg.env.num_envs
+        run.log(info)
+        pbar.set_postfix({"loss": info["loss"], "terminated": info["terminated"]})
+
+        if cfg.save_interval > 0 and i % cfg.save_interval == 0:
+            ckpt_path = os.path.join(run.dir, f"checkpoint_{info['env_frames']}.pt")
+            torch.save(policy.state_dict(), ckpt_path)
+            logging.info(f"Saved checkpoint to {str(ckpt_path)}")
+
+    ckpt_path = os.path.join(run.dir, "checkpoint_final.pt")
+    torch.save(policy.state_dict(), ckpt_path)
+    logging.info(f"Saved checkpoint to {str(ckpt_path)}")
+
+    # the actor is already deterministic; export it for `sim2real_omnidrones`
+    actor = policy.actor.cpu().eval()
+    example = task.observation(task.state)[:1].cpu()
+    save_actor(
+        to_torchscript(actor, example),
+        os.path.join(run.dir, "actor.pt"),
+        {
+            "task": cfg.task.name,
+            "algo": "apg",
+            "in_keys": ["agents.observation"],
+            "observation_dim": example.shape[-1],
+            "action_dim": dynamics.num_rotors,
+            "action_low": -1.,
+            "action_high": 1.,
+        }
+    )
+    logging.info(f"Exported actor to {os.path.join(run.dir, 'actor.pt')}")
+
+    wandb.finish()
+
+
+if __name__ == "__main__":
+    main()
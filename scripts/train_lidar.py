@@ -33,7 +33,8 @@ import torch.nn as nn
 import torch.nn.functional as F
 import einops
 from einops.layers.torch import Rearrange
-from omni_drones.learning.ppo.ppo import PPOConfig, make_mlp, make_batch, Actor, IndependentNormal, GAE, ValueNorm1
+from omni_drones.learning.ppo.ppo import PPOConfig, make_mlp, Actor, DiagNormal, GAE, ValueNorm1
+from omni_drones.learning.utils.minibatch import MinibatchSampler
 from tensordict import TensorDict
 from tensordict.nn import TensorDictSequential, TensorDictModule, TensorDictModuleBase
 from torchrl.envs.transforms import CatTensors
@@ -74,7 +75,7 @@ class PPOPolicy(TensorDictModuleBase):
             TensorDictModule(Actor(self.action_dim), ["_feature"], ["loc", "scale"]),
             in_keys=["loc", "scale"],
             out_keys=[("agents", "action")],
-            distribution_class=IndependentNormal,
+            distribution_class=DiagNormal,
             return_log_prob=True
         ).to(self.device)
 
@@ -129,9 +130,9 @@ class PPOPolicy(TensorDictModuleBase):
         tensordict.set("ret", ret)
 
         infos = []
+        sampler = MinibatchSampler(tensordict, self.cfg.num_minibatches)
         for epoch in range(self.cfg.ppo_epochs):
-            batch = make_batch(tensordict, self.cfg.num_minibatches)
-            for minibatch in batch:
+            for minibatch in sampler:
                 infos.append(self._update(minibatch))
         
         infos: TensorDict = torch.stack(infos).to_tensordict()
@@ -234,7 +235,7 @@ def main(cfg):
         elif action_transform == "velocity":
             from omni_drones.controllers import LeePositionController
             controller = LeePositionController(9.81, base_env.drone.params).to(base_env.device)
-            transform = VelController(torch.vmap(controller))
+            transform = VelController(controller)
             transforms.append(transform)
         elif action_transform == "rate":
             from omni_drones.controllers import RateController as _RateController
@@ -244,7 +245,7 @@ def main(cfg):
         elif action_transform == "attitude":
             from omni_drones.controllers import AttitudeController as _AttitudeController
             controller = _AttitudeController(9.81, base_env.drone.params).to(base_env.device)
-            transform = AttitudeController(torch.vmap(torch.vmap(controller)))
+            transform = AttitudeController(controller)
             transforms.append(transform)
         elif not action_transform.lower() == "none":
             raise NotImplementedError(f"Unknown action transform: {action_transform}")
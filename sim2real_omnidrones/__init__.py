@@ -0,0 +1,34 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Minimal onboard inference runtime for policies trained with OmniDrones.
+
+Only depends on ``numpy`` and ``torch``; nothing from the simulation or
+training stack is imported. See ``python -m sim2real_omnidrones --help`` for
+the loopback jitter benchmark.
+"""
+
+from .actor import ExportedActor, load_actor, load_module, save_actor
+from .link import LoopbackVehicle, PointMass, UdpVehicleLink, VehicleLink
+from .runtime import ControlLoop, LatencyHistogram
+from .shm import SharedMemoryLink, SharedMemoryVehicle, ShmRing, command_record, state_record
+from .state import DroneState, HoverObservation, StateEstimate, quat_axis
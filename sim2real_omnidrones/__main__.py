@@ -0,0 +1,102 @@
+
+"""Benchmark the control loop for jitter against the loopback vehicle.
+
+Usage:
+    python -m sim2real_omnidrones --rates 100 200 500 --duration 10
+    python -m sim2real_omnidrones --actor hover.pt --json results.json
+
+Without ``--actor`` a randomly initialized network with the shape of the
+default PPO actor for ``Hover`` is used.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import torch
+import torch.nn as nn
+
+from . import (
+    ControlLoop,
+    HoverObservation,
+    LoopbackVehicle,
+    UdpVehicleLink,
+    load_actor,
+    save_actor,
+)
+
+
+def dummy_actor(path: str, observation_dim: int, action_dim: int):
+    layers = []
+    in_dim = observation_dim
+    for n in (256, 256, 256):
+        layers += [nn.Linear(in_dim, n), nn.LeakyReLU(), nn.LayerNorm(n)]
+        in_dim = n
+    layers.append(nn.Linear(in_dim, action_dim))
+    module = torch.jit.script(nn.Sequential(*layers).eval())
+    save_actor(module, path, {
+        "observation_dim": observation_dim,
+        "action_dim": action_dim,
+        "action_low": -1.,
+        "action_high": 1.,
+    })
+
+
+def fmt(stats):
+    return (
+        f"mean {stats['mean_us']:7.1f}  p50 {stats['p50_us']:7.1f}  "
+        f"p99 {stats['p99_us']:7.1f}  max {stats['max_us']:8.1f} us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actor", type=str, default=None, help="exported actor (TorchScript)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[100., 200., 500.])
+    parser.add_argument("--duration", type=float, default=5., help="seconds per rate")
+    parser.add_argument("--warmup", type=float, default=0.5, help="seconds discarded per rate")
+    parser.add_argument("--num-rotors", type=int, default=4)
+    parser.add_argument("--time-encoding", type=int, default=None, metavar="MAX_EPISODE_LENGTH")
+    parser.add_argument("--vehicle-rate", type=float, default=1000.)
+    parser.add_argument("--spin-us", type=float, default=200.)
+    parser.add_argument("--json", type=str, default=None, help="write the summaries to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = args.actor
+        if path is None:
+            dim = 3 + 16 + args.num_rotors + 3 + (4 if args.time_encoding else 0)
+            path = os.path.join(tmpdir, "actor.pt")
+            dummy_actor(path, dim, args.num_rotors)
+        actor = load_actor(path)
+    actor.warmup()
+
+    results = []
+    vehicle = LoopbackVehicle(num_rotors=args.num_rotors, rate_hz=args.vehicle_rate)
+    with vehicle, UdpVehicleLink(*vehicle.addresses, num_rotors=args.num_rotors) as link:
+        observe = HoverObservation(
+            actor.observation,
+            num_rotors=args.num_rotors,
+            max_episode_length=args.time_encoding,
+        )
+        for rate in args.rates:
+            loop = ControlLoop(link, actor, observe, rate_hz=rate, spin_us=args.spin_us)
+            loop.run(duration=args.warmup)
+            loop.reset_stats()
+            loop.run(duration=args.duration)
+            summary = loop.summary()
+            results.append(summary)
+            print(f"{rate:6.0f} Hz  ticks {summary['ticks']:6d}  overruns {summary['overruns']}")
+            print(f"    latency   {fmt(summary['latency'])}")
+            print(f"    jitter    {fmt(summary['jitter'])}")
+            print(f"    state age {fmt(summary['state_age'])}")
+        print(f"state packets received: {link.packets_received}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Loading and invoking an exported actor.
+
+An exported actor is a TorchScript module mapping a batch of (normalized)
+observations of shape ``[1, observation_dim]`` to actions of shape
+``[1, action_dim]``. Observation normalization and action bounds travel with
+the module as a JSON extra file (``metadata.json``) so a single file is all the
+vehicle needs::
+
+    {
+        "observation_dim": 23,
+        "action_dim": 4,
+        "obs_loc": [...],      # optional, defaults to 0
+        "obs_scale": [...],    # optional, defaults to 1
+        "action_low": -1.0,    # optional, scalar or list
+        "action_high": 1.0     # optional, scalar or list
+    }
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+import torch
+
+METADATA_FILE = "metadata.json"
+
+
+def save_actor(module: torch.jit.ScriptModule, path: str, metadata: Dict[str, Any]):
+    """Save a scripted actor together with its metadata in the format read by :func:`load_actor`."""
+    for key in ("observation_dim", "action_dim"):
+        if key not in metadata:
+            raise ValueError(f"Actor metadata is missing the required key '{key}'.")
+    torch.jit.save(module, path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+
+
+def load_actor(path: str, num_threads: Optional[int] = 1) -> "ExportedActor":
+    """Load an actor saved by :func:`save_actor` (or by ``scripts/export.py``).
+
+    ``num_threads`` limits intra-op parallelism, which for the small networks
+    used onboard mostly adds scheduling jitter. Pass ``None`` to leave it alone.
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    return ExportedActor(*load_module(path))
+
+
+def load_module(path: str, map_location="cpu"):
+    """Load the scripted module and the metadata saved by :func:`save_actor`."""
+    extra_files = {METADATA_FILE: ""}
+    module = torch.jit.load(path, map_location=map_location, _extra_files=extra_files)
+    if not extra_files[METADATA_FILE]:
+        raise ValueError(f"{path} has no '{METADATA_FILE}'; was it saved with `save_actor`?")
+    return module, json.loads(extra_files[METADATA_FILE])
+
+
+class ExportedActor:
+    """Runs an exported actor on preallocated input and output buffers.
+
+    Write the observation into :attr:`observation` (a float32 numpy array that
+    shares memory with the network input) and call the actor; the action is
+    written into :attr:`action` and returned. No tensors are allocated on the
+    host side per call apart from the module's own intermediates.
+    """
+
+    def __init__(self, module: torch.nn.Module, metadata: Dict[str, Any]):
+        self.module = module.eval()
+        self.metadata = metadata
+        self.observation_dim = int(metadata["observation_dim"])
+        self.action_dim = int(metadata["action_dim"])
+
+        self.observation = np.zeros(self.observation_dim, dtype=np.float32)
+        self.action = np.zeros(self.action_dim, dtype=np.float32)
+        self._obs = torch.from_numpy(self.observation).unsqueeze(0)
+        self._action = torch.from_numpy(self.action).unsqueeze(0)
+        self._normalized = torch.zeros_like(self._obs)
+
+        self.obs_loc = self._vector(metadata.get("obs_loc", 0.), self.observation_dim)
+        self.obs_scale = self._vector(metadata.get("obs_scale", 1.), self.observation_dim)
+        self.action_low = self._vector(metadata.get("action_low", -float("inf")), self.action_dim)
+        self.action_high = self._vector(metadata.get("action_high", float("inf")), self.action_dim)
+
+    @staticmethod
+    def _vector(value, dim: int) -> torch.Tensor:
+        value = torch.as_tensor(value, dtype=torch.float32)
+        return value.expand(dim).clone().unsqueeze(0)
+
+    @torch.inference_mode()
+    def __call__(self) -> np.ndarray:
+        torch.sub(self._obs, self.obs_loc, out=self._normalized)
+        self._normalized.div_(self.obs_scale)
+        self._action.copy_(self.module(self._normalized))
+        torch.clamp(self._action, self.action_low, self.action_high, out=self._action)
+        return self.action
+
+    def warmup(self, iters: int = 20):
+        """Run the actor a few times so TorchScript's profiling executor settles before flight."""
+        for _ in range(iters):
+            self()
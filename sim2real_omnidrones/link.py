@@ -0,0 +1,242 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Vehicle links and a local loopback stand-in for the vehicle.
+
+The wire format is deliberately trivial so it can be produced by a companion
+computer bridge (e.g. a MAVLink or ROS relay) without pulling in this package:
+
+- state packet: ``<d 3f 4f 3f 3f {num_rotors}f``, i.e. monotonic timestamp,
+  position, quaternion ``(w, x, y, z)``, linear and angular velocity in the
+  world frame, and normalized rotor throttle in ``[0, 1]``.
+- command packet: ``<Q {num_rotors}f``, i.e. a sequence number followed by the
+  actor's rotor commands in ``[-1, 1]``.
+"""
+
+import multiprocessing as mp
+import socket
+import struct
+import time
+
+import numpy as np
+
+from .state import StateEstimate
+
+
+def state_format(num_rotors: int) -> struct.Struct:
+    return struct.Struct(f"<d{13 + num_rotors}f")
+
+
+def command_format(num_rotors: int) -> struct.Struct:
+    return struct.Struct(f"<Q{num_rotors}f")
+
+
+class VehicleLink:
+    """Interface between the control loop and the vehicle."""
+
+    def read_state(self) -> StateEstimate:
+        """Return the most recent state estimate. Must not block."""
+        raise NotImplementedError
+
+    def send_command(self, action: np.ndarray):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class UdpVehicleLink(VehicleLink):
+    """Non-blocking UDP link using the packet layout described in this module.
+
+    Incoming state packets are drained on every :meth:`read_state` and only
+    the newest one is kept, so a slow tick never acts on a stale backlog. All
+    packet buffers are preallocated.
+    """
+
+    def __init__(
+        self,
+        vehicle_addr=("127.0.0.1", 14560),
+        bind_addr=("127.0.0.1", 14561),
+        num_rotors: int = 4,
+    ):
+        self.vehicle_addr = vehicle_addr
+        self.num_rotors = num_rotors
+        self._state_fmt = state_format(num_rotors)
+        self._command_fmt = command_format(num_rotors)
+        self._state_buf = bytearray(self._state_fmt.size)
+        self._command_buf = bytearray(self._command_fmt.size)
+        self._seq = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(bind_addr)
+        self.sock.setblocking(False)
+
+        self.estimate = StateEstimate(throttle=np.zeros(num_rotors, np.float32))
+        # the float payload of the state packet, decoded without copies
+        self._payload = np.frombuffer(self._state_buf, dtype="<f4", offset=8)
+        self.packets_received = 0
+
+    def read_state(self) -> StateEstimate:
+        received = False
+        while True:
+            try:
+                n = self.sock.recv_into(self._state_buf)
+            except BlockingIOError:
+                break
+            if n == self._state_fmt.size:
+                received = True
+                self.packets_received += 1
+        if received:
+            p = self._payload
+            e = self.estimate
+            e.timestamp = struct.unpack_from("<d", self._state_buf)[0]
+            e.pos[:] = p[0:3]
+            e.rot[:] = p[3:7]
+            e.lin_vel[:] = p[7:10]
+            e.ang_vel[:] = p[10:13]
+            e.throttle[:] = p[13:]
+        return self.estimate
+
+    def send_command(self, action: np.ndarray):
+        self._seq += 1
+        self._command_fmt.pack_into(self._command_buf, 0, self._seq, *action)
+        self.sock.sendto(self._command_buf, self.vehicle_addr)
+
+    def close(self):
+        self.sock.close()
+
+
+class PointMass:
+    """A level point mass under collective thrust and drag; just enough to close the loop."""
+
+    def __init__(self, num_rotors: int, mass: float, max_thrust: float):
+        self.pos = np.array([0., 0., 1.])
+        self.vel = np.zeros(3)
+        self.throttle = np.zeros(num_rotors)
+        self.g = np.array([0., 0., -9.81])
+        self.thrust_to_acc = max_thrust / mass
+
+    def apply(self, cmds: np.ndarray):
+        self.throttle = np.clip((np.asarray(cmds) + 1.) / 2., 0., 1.)
+
+    def step(self, dt: float):
+        acc = self.g - 0.1 * self.vel
+        acc[2] += self.throttle.sum() * self.thrust_to_acc
+        self.vel += acc * dt
+        self.pos += self.vel * dt
+        if self.pos[2] < 0.:
+            self.pos[2], self.vel[2] = 0., max(self.vel[2], 0.)
+
+
+def _vehicle_main(bind_addr, controller_addr, num_rotors, rate_hz, mass, max_thrust, stop_event):
+    state_fmt = state_format(num_rotors)
+    command_fmt = command_format(num_rotors)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(bind_addr)
+    sock.setblocking(False)
+    command_buf = bytearray(command_fmt.size)
+
+    body = PointMass(num_rotors, mass, max_thrust)
+    dt = 1. / rate_hz
+    deadline = time.perf_counter()
+    while not stop_event.is_set():
+        while True:
+            try:
+                n = sock.recv_into(command_buf)
+            except BlockingIOError:
+                break
+            if n == command_fmt.size:
+                body.apply(command_fmt.unpack_from(command_buf)[1:])
+        body.step(dt)
+        packet = state_fmt.pack(
+            time.monotonic(), *body.pos, 1., 0., 0., 0., *body.vel, 0., 0., 0., *body.throttle
+        )
+        try:
+            sock.sendto(packet, controller_addr)
+        except OSError:
+            pass
+        deadline += dt
+        remaining = deadline - time.perf_counter()
+        if remaining > 0.:
+            time.sleep(remaining)
+    sock.close()
+
+
+class LoopbackVehicle:
+    """A fake vehicle in a separate process, talking over UDP on localhost.
+
+    It streams state packets at ``rate_hz`` and applies the latest command to a
+    level point mass. It is not a simulator; it exists so the control loop, the
+    link and the scheduling can be benchmarked for jitter on a laptop with the
+    same process and socket boundaries as on the real vehicle.
+
+    Use as a context manager together with a :class:`UdpVehicleLink`::
+
+        with LoopbackVehicle() as vehicle, UdpVehicleLink(*vehicle.addresses) as link:
+            ...
+    """
+
+    def __init__(
+        self,
+        bind_addr=("127.0.0.1", 14560),
+        controller_addr=("127.0.0.1", 14561),
+        num_rotors: int = 4,
+        rate_hz: float = 1000.,
+        mass: float = 0.716,
+        max_thrust: float = 2.8,
+    ):
+        self.bind_addr = bind_addr
+        self.controller_addr = controller_addr
+        ctx = mp.get_context("spawn")
+        self._stop = ctx.Event()
+        self._process = ctx.Process(
+            target=_vehicle_main,
+            args=(bind_addr, controller_addr, num_rotors, rate_hz, mass, max_thrust, self._stop),
+            daemon=True,
+        )
+
+    @property
+    def addresses(self):
+        """``(vehicle_addr, bind_addr)`` for the matching :class:`UdpVehicleLink`."""
+        return self.bind_addr, self.controller_addr
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._process.join(timeout=2.)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
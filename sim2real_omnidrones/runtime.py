@@ -0,0 +1,190 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Fixed-rate control loop with per-tick latency histograms."""
+
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from .actor import ExportedActor
+from .link import VehicleLink
+from .state import StateEstimate
+
+
+class LatencyHistogram:
+    """Fixed-width histogram of durations, preallocated so recording never allocates.
+
+    Durations are recorded in seconds and binned in microseconds. Samples
+    beyond ``max_us`` land in an overflow bin; the exact maximum is still kept.
+    """
+
+    def __init__(self, bin_us: float = 5., max_us: float = 20_000.):
+        self.bin_us = bin_us
+        self.num_bins = int(np.ceil(max_us / bin_us))
+        self.counts = np.zeros(self.num_bins + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total_us = 0.
+        self.max_us = 0.
+
+    def record(self, seconds: float):
+        us = seconds * 1e6
+        index = int(us / self.bin_us) if us > 0. else 0
+        self.counts[min(index, self.num_bins)] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def record_many(self, seconds: np.ndarray):
+        """Vectorized :meth:`record` for a batch of durations."""
+        if len(seconds) == 0:
+            return
+        us = np.asarray(seconds, dtype=np.float64) * 1e6
+        index = np.clip(us / self.bin_us, 0, self.num_bins).astype(np.int64)
+        self.counts += np.bincount(index, minlength=self.num_bins + 1)
+        self.count += len(us)
+        self.total_us += us.sum()
+        self.max_us = max(self.max_us, us.max())
+
+    def percentile(self, q: float) -> float:
+        """Upper edge (in microseconds) of the bin holding the ``q``-th percentile."""
+        if self.count == 0:
+            return float("nan")
+        rank = int(np.ceil(q / 100. * self.count))
+        index = int(np.searchsorted(np.cumsum(self.counts), max(rank, 1)))
+        return min((index + 1) * self.bin_us, self.max_us)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_us": self.total_us / max(self.count, 1),
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "p99.9_us": self.percentile(99.9),
+            "max_us": self.max_us,
+        }
+
+
+class ControlLoop:
+    """Runs ``read state -> build observation -> actor -> send command`` at a fixed rate.
+
+    Ticks are scheduled against absolute deadlines on ``time.perf_counter`` so
+    that errors do not accumulate. The thread sleeps until ``spin_us`` before
+    the deadline and busy-waits the remainder, trading a little CPU for much
+    tighter wake-ups than ``time.sleep`` alone. A tick that overruns its period
+    is counted and the schedule skips ahead instead of bursting to catch up.
+
+    Three histograms are kept:
+
+    - ``latency``: time from reading the state estimate to the command being sent.
+    - ``jitter``: how late each tick woke up relative to its deadline.
+    - ``state_age``: age of the state estimate when it was read, as stamped by the link.
+
+    Args:
+        link: The vehicle link to read estimates from and send commands to.
+        actor: The exported actor. ``observe`` must write into ``actor.observation``.
+        observe: Callable ``(estimate, tick) -> None`` filling the observation buffer,
+            e.g. a :class:`~sim2real_omnidrones.state.HoverObservation`.
+        rate_hz: The control rate.
+        spin_us: How long before each deadline to stop sleeping and start spinning.
+    """
+
+    def __init__(
+        self,
+        link: VehicleLink,
+        actor: ExportedActor,
+        observe: Callable[[StateEstimate, int], None],
+        rate_hz: float = 100.,
+        spin_us: float = 200.,
+    ):
+        self.link = link
+        self.actor = actor
+        self.observe = observe
+        self.rate_hz = rate_hz
+        self.period = 1. / rate_hz
+        self.spin = spin_us * 1e-6
+
+        self.latency = LatencyHistogram()
+        self.jitter = LatencyHistogram()
+        self.state_age = LatencyHistogram(bin_us=50., max_us=100_000.)
+        self.tick = 0
+        self.overruns = 0
+        self._running = False
+
+    def step(self):
+        start = time.perf_counter()
+        estimate = self.link.read_state()
+        self.observe(estimate, self.tick)
+        action = self.actor()
+        self.link.send_command(action)
+        end = time.perf_counter()
+        self.latency.record(end - start)
+        if estimate.timestamp > 0.:
+            self.state_age.record(time.monotonic() - estimate.timestamp)
+        self.tick += 1
+        return end
+
+    def run(self, duration: float = None, max_ticks: int = None):
+        """Run until :meth:`stop` is called, ``duration`` seconds pass or ``max_ticks`` ticks are done."""
+        self._running = True
+        deadline = time.perf_counter() + self.period
+        stop_at = float("inf") if duration is None else deadline + duration
+        stop_tick = float("inf") if max_ticks is None else self.tick + max_ticks
+        while self._running and self.tick < stop_tick and deadline < stop_at:
+            remaining = deadline - time.perf_counter() - self.spin
+            if remaining > 0.:
+                time.sleep(remaining)
+            while (now := time.perf_counter()) < deadline:
+                pass
+            self.jitter.record(now - deadline)
+            end = self.step()
+            deadline += self.period
+            if end > deadline:
+                self.overruns += 1
+                deadline += np.ceil((end - deadline) / self.period) * self.period
+        self._running = False
+
+    def stop(self):
+        self._running = False
+
+    def reset_stats(self):
+        self.latency.reset()
+        self.jitter.reset()
+        self.state_age.reset()
+        self.overruns = 0
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            "rate_hz": self.rate_hz,
+            "ticks": self.latency.count,
+            "overruns": self.overruns,
+            "latency": self.latency.summary(),
+            "jitter": self.jitter.summary(),
+            "state_age": self.state_age.summary(),
+        }
@@ -0,0 +1,406 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""Single-producer/single-consumer ring buffers over POSIX shared memory.
+
+A :class:`ShmRing` holds fixed-layout records (numpy structured dtypes, see
+:func:`state_record` and :func:`command_record`) in a shared memory segment
+that another process attaches to by name. Neither side takes a lock:
+
+- the producer owns ``write_index`` and never waits for the consumer. When
+  the ring is full it simply overwrites the oldest record (drop-oldest);
+- the consumer owns ``read_index`` and the ``dropped`` counter. It notices
+  records that were overwritten before it got to them, either from the
+  indices or from the per-record sequence number, which the producer makes
+  odd while it writes a slot (a seqlock). A record whose sequence number
+  changed while it was being copied is counted as dropped, never returned.
+
+Each index lives on its own cache line. The protocol relies on the stores of
+the producer becoming visible in program order, which holds on x86-64; on
+weakly ordered CPUs (e.g. ARM companion computers) run both ends on
+the same core cluster or add a fence in the producer.
+"""
+
+import time
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import multiprocessing as mp
+import numpy as np
+import torch
+
+from .link import PointMass, VehicleLink
+from .state import StateEstimate
+
+_MAGIC = 0x4F4D4E4952494E47 # "OMNIRING"
+_CACHE_LINE = 64
+# header words, each index on its own cache line to avoid false sharing
+_MAGIC_WORD, _CAPACITY_WORD, _ITEMSIZE_WORD = 0, 1, 2
+_WRITE_WORD = _CACHE_LINE // 8
+_READ_WORD, _DROPPED_WORD = 2 * _CACHE_LINE // 8, 2 * _CACHE_LINE // 8 + 1
+HEADER_SIZE = 3 * _CACHE_LINE
+
+
+def state_record(num_rotors: int = 4) -> np.dtype:
+    """A state estimate, as in the UDP state packet of :mod:`~sim2real_omnidrones.link`."""
+    return np.dtype([
+        ("seq", "<u8"),
+        ("timestamp", "<f8"),
+        ("pos", "<f4", 3),
+        ("rot", "<f4", 4),
+        ("lin_vel", "<f4", 3),
+        ("ang_vel", "<f4", 3),
+        ("throttle", "<f4", num_rotors),
+    ], align=True)
+
+
+def command_record(num_rotors: int = 4) -> np.dtype:
+    """Rotor commands in ``[-1, 1]`` and the time they were sent."""
+    return np.dtype([
+        ("seq", "<u8"),
+        ("timestamp", "<f8"),
+        ("cmd", "<f4", num_rotors),
+    ], align=True)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python >= 3.13
+    except TypeError:
+        pass
+    # before 3.13 attaching registers the segment with the resource tracker
+    # (shared with the parent for spawned processes), which then unlinks it
+    # or complains when the creator does
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class ShmRing:
+    """A lock-free SPSC ring of ``capacity`` records of ``dtype`` in shared memory.
+
+    Create it on one side with ``create=True`` and attach on the other side
+    with the same ``name`` and ``dtype``. Use one instance per process and only
+    call the producer methods (:meth:`claim`, :meth:`publish`, :meth:`push`)
+    on one side and the consumer methods (:meth:`pop`, :meth:`latest`,
+    :meth:`drain`) on the other.
+
+    :attr:`records` is a zero-copy numpy view of all slots and
+    :meth:`tensor` a zero-copy torch view of one field across all slots.
+    """
+
+    def __init__(self, name: str, dtype: np.dtype, capacity: int = None, create: bool = False):
+        self.dtype = np.dtype(dtype)
+        if self.dtype.names is None or "seq" not in self.dtype.names:
+            raise ValueError("The record dtype must be structured and have a 'seq' field.")
+        self.created = create
+        if create:
+            if capacity is None or capacity < 1:
+                raise ValueError(f"A positive capacity is required to create a ring, got {capacity}.")
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=HEADER_SIZE + capacity * self.dtype.itemsize
+            )
+        else:
+            self.shm = _attach(name)
+        self.name = self.shm.name
+        self.header = np.ndarray(HEADER_SIZE // 8, np.uint64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[_CAPACITY_WORD] = capacity
+            self.header[_ITEMSIZE_WORD] = self.dtype.itemsize
+            self.header[_MAGIC_WORD] = _MAGIC
+        elif self.header[_MAGIC_WORD] != _MAGIC:
+            raise ValueError(f"Shared memory '{name}' is not an initialized ring.")
+        elif self.header[_ITEMSIZE_WORD] != self.dtype.itemsize:
+            raise ValueError(
+                f"Record size mismatch: ring '{name}' has {self.header[_ITEMSIZE_WORD]} bytes, "
+                f"the given dtype {self.dtype.itemsize}."
+            )
+        self.capacity = int(self.header[_CAPACITY_WORD])
+        self.records = np.ndarray(self.capacity, self.dtype, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self._seq = self.records["seq"]
+        self._write_index = int(self.header[_WRITE_WORD])
+        self._read_index = int(self.header[_READ_WORD])
+
+    # producer
+
+    def claim(self) -> np.void:
+        """Mark the next slot as being written and return a view of it."""
+        w = self._write_index
+        slot = w % self.capacity
+        self._seq[slot] = 2 * w + 1
+        return self.records[slot]
+
+    def publish(self):
+        """Make the slot returned by the last :meth:`claim` visible to the consumer."""
+        w = self._write_index
+        self._seq[w % self.capacity] = 2 * w + 2
+        self._write_index = w + 1
+        self.header[_WRITE_WORD] = w + 1
+
+    def push(self, **fields):
+        record = self.claim()
+        for key, value in fields.items():
+            record[key] = value
+        self.publish()
+
+    # consumer
+
+    def _skip_overwritten(self, w: int) -> int:
+        r = self._read_index
+        if w - r > self.capacity:
+            self._drop(w - self.capacity - r)
+            r = w - self.capacity
+        return r
+
+    def _drop(self, n: int):
+        self.header[_DROPPED_WORD] += np.uint64(n)
+
+    def _consume(self, r: int):
+        self._read_index = r
+        self.header[_READ_WORD] = r
+
+    def pop(self, out: np.ndarray) -> bool:
+        """Copy the oldest unread record into the 0-d array `out`. Returns False if there is none."""
+        while True:
+            w = int(self.header[_WRITE_WORD])
+            r = self._skip_overwritten(w)
+            if r == w:
+                self._consume(r)
+                return False
+            slot, expected = r % self.capacity, 2 * r + 2
+            out[...] = self.records[slot]
+            if self._seq[slot] == expected and out["seq"] == expected:
+                self._consume(r + 1)
+                return True
+            # overwritten while we were copying it
+            self._drop(1)
+            self._consume(r + 1)
+
+    def latest(self, out: np.ndarray) -> bool:
+        """Copy the newest record into `out`, consuming everything before it.
+
+        Skipped records are not counted as dropped. Returns False if no record
+        was published since the last read.
+        """
+        while True:
+            w = int(self.header[_WRITE_WORD])
+            if w == self._read_index:
+                return False
+            slot, expected = (w - 1) % self.capacity, 2 * w
+            out[...] = self.records[slot]
+            if self._seq[slot] == expected and out["seq"] == expected:
+                self._consume(w)
+                return True
+
+    def drain(self, out: np.ndarray) -> int:
+        """Copy up to ``len(out)`` unread records, oldest first, into `out` in bulk.
+
+        Returns the number of records copied.
+        """
+        w = int(self.header[_WRITE_WORD])
+        r = self._skip_overwritten(w)
+        n = min(w - r, len(out))
+        if n == 0:
+            return 0
+        start = r % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.records[start:start + first]
+        out[first:n] = self.records[:n - first]
+        # the producer overwrites in order, so torn or overwritten records
+        # can only be the oldest ones
+        expected = 2 * (r + np.arange(n, dtype=np.uint64)) + 2
+        valid = (out["seq"][:n] == expected) & (self._slot_seq(r, n) == expected)
+        bad = n if not valid.any() else int(np.argmax(valid))
+        if bad:
+            self._drop(bad)
+            out[:n - bad] = out[bad:n].copy()
+        self._consume(r + n)
+        return n - bad
+
+    def _slot_seq(self, r: int, n: int) -> np.ndarray:
+        start = r % self.capacity
+        first = min(n, self.capacity - start)
+        return np.concatenate([self._seq[start:start + first], self._seq[:n - first]])
+
+    def tensor(self, field: str) -> torch.Tensor:
+        """A zero-copy torch view of `field` across all slots, shaped ``[capacity, *field_shape]``."""
+        return torch.from_numpy(self.records[field])
+
+    def stats(self) -> Dict[str, int]:
+        written = int(self.header[_WRITE_WORD])
+        read = int(self.header[_READ_WORD])
+        return {
+            "capacity": self.capacity,
+            "written": written,
+            "read": read,
+            "dropped": int(self.header[_DROPPED_WORD]),
+            "backlog": min(written - read, self.capacity),
+        }
+
+    def close(self):
+        """Detach from the segment (and remove it if this side created it).
+
+        Views obtained from :attr:`records` or :meth:`tensor` must be released
+        first, shared memory cannot be unmapped while they are alive.
+        """
+        self.records = self._seq = self.header = None
+        self.shm.close()
+        if self.created:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SharedMemoryLink(VehicleLink):
+    """:class:`~sim2real_omnidrones.link.VehicleLink` over a pair of :class:`ShmRing`.
+
+    Consumes the state ring (keeping only the newest estimate, like
+    :class:`~sim2real_omnidrones.link.UdpVehicleLink`) and produces into the
+    command ring. Both rings must already exist, e.g. created by a
+    :class:`SharedMemoryVehicle` or by the bridge to the real vehicle.
+    """
+
+    def __init__(self, state_name: str, command_name: str, num_rotors: int = 4):
+        self.num_rotors = num_rotors
+        self.state_ring = ShmRing(state_name, state_record(num_rotors))
+        self.command_ring = ShmRing(command_name, command_record(num_rotors))
+        self._record = np.zeros((), self.state_ring.dtype)
+        self.estimate = StateEstimate(throttle=np.zeros(num_rotors, np.float32))
+        self.packets_received = 0
+
+    def read_state(self) -> StateEstimate:
+        if self.state_ring.latest(self._record):
+            self.packets_received += 1
+            record, e = self._record, self.estimate
+            e.timestamp = float(record["timestamp"])
+            e.pos[:] = record["pos"]
+            e.rot[:] = record["rot"]
+            e.lin_vel[:] = record["lin_vel"]
+            e.ang_vel[:] = record["ang_vel"]
+            e.throttle[:] = record["throttle"]
+        return self.estimate
+
+    def send_command(self, action: np.ndarray):
+        record = self.command_ring.claim()
+        record["timestamp"] = time.monotonic()
+        record["cmd"] = action
+        self.command_ring.publish()
+
+    def close(self):
+        self._record = None
+        self.state_ring.close()
+        self.command_ring.close()
+
+
+def _shm_vehicle_main(state_name, command_name, num_rotors, rate_hz, mass, max_thrust, stop_event):
+    state_ring = ShmRing(state_name, state_record(num_rotors))
+    command_ring = ShmRing(command_name, command_record(num_rotors))
+    command = np.zeros((), command_ring.dtype)
+    body = PointMass(num_rotors, mass, max_thrust)
+    # free-running producers advance the model at a nominal 1 kHz
+    dt = 1. / (rate_hz or 1000.)
+    deadline = time.perf_counter()
+    while not stop_event.is_set():
+        if command_ring.latest(command):
+            body.apply(command["cmd"])
+        body.step(dt)
+        record = state_ring.claim()
+        record["pos"] = body.pos
+        record["rot"] = (1., 0., 0., 0.)
+        record["lin_vel"] = body.vel
+        record["ang_vel"] = 0.
+        record["throttle"] = body.throttle
+        record["timestamp"] = time.monotonic()
+        state_ring.publish()
+        if rate_hz:
+            deadline += dt
+            remaining = deadline - time.perf_counter()
+            if remaining > 0.:
+                time.sleep(remaining)
+    command = None
+    state_ring.close()
+    command_ring.close()
+
+
+class SharedMemoryVehicle:
+    """A fake vehicle in a separate process, talking over shared memory rings.
+
+    The shared memory counterpart of :class:`~sim2real_omnidrones.link.LoopbackVehicle`:
+    it creates the state and command rings, publishes state records at
+    ``rate_hz`` (as fast as it can if ``rate_hz`` is ``None``) and applies the
+    newest command to a level point mass. Use together with a
+    :class:`SharedMemoryLink`::
+
+        with SharedMemoryVehicle() as vehicle, SharedMemoryLink(*vehicle.names) as link:
+            ...
+    """
+
+    def __init__(
+        self,
+        num_rotors: int = 4,
+        rate_hz: Optional[float] = 1000.,
+        capacity: int = 4096,
+        mass: float = 0.716,
+        max_thrust: float = 2.8,
+        prefix: str = "omnidrones",
+    ):
+        suffix = f"{mp.current_process().pid}_{id(self):x}"
+        self.state_ring = ShmRing(f"{prefix}_state_{suffix}", state_record(num_rotors), capacity, create=True)
+        self.command_ring = ShmRing(f"{prefix}_cmd_{suffix}", command_record(num_rotors), capacity, create=True)
+        ctx = mp.get_context("spawn")
+        self._stop = ctx.Event()
+        self._process = ctx.Process(
+            target=_shm_vehicle_main,
+            args=(self.state_ring.name, self.command_ring.name, num_rotors, rate_hz, mass, max_thrust, self._stop),
+            daemon=True,
+        )
+
+    @property
+    def names(self):
+        """``(state_name, command_name)`` for the matching :class:`SharedMemoryLink`."""
+        return self.state_ring.name, self.command_ring.name
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._process.join(timeout=2.)
+        if self._process.is_alive():
+            self._process.terminate()
+        self.state_ring.close()
+        self.command_ring.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,150 @@
+# MIT License
+# 
+# Copyright (c) 2023 Botian Xu, Tsinghua University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Observation construction from an onboard state estimate.
+
+The layout written here mirrors :meth:`MultirotorBase.get_state` and the
+observation of the ``Hover`` task so that an actor trained in simulation can be
+fed directly from the flight controller's estimator. Every method writes into
+buffers allocated once at construction; nothing is allocated per tick.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class StateEstimate:
+    """A single estimate of the vehicle state, expressed in the world frame.
+
+    ``rot`` is a unit quaternion in ``(w, x, y, z)`` order and ``throttle`` holds
+    the normalized rotor commands in ``[0, 1]`` last applied to the vehicle.
+    """
+    pos: np.ndarray = field(default_factory=lambda: np.zeros(3, np.float32))
+    rot: np.ndarray = field(default_factory=lambda: np.array([1., 0., 0., 0.], np.float32))
+    lin_vel: np.ndarray = field(default_factory=lambda: np.zeros(3, np.float32))
+    ang_vel: np.ndarray = field(default_factory=lambda: np.zeros(3, np.float32))
+    throttle: np.ndarray = field(default_factory=lambda: np.zeros(4, np.float32))
+    timestamp: float = 0.
+
+
+def quat_axis(q: np.ndarray, axis: int, out: np.ndarray) -> np.ndarray:
+    """Write the world-frame direction of body ``axis`` for quaternion ``q`` into ``out``."""
+    w, x, y, z = q
+    if axis == 0:
+        out[0] = 1. - 2. * (y * y + z * z)
+        out[1] = 2. * (x * y + w * z)
+        out[2] = 2. * (x * z - w * y)
+    elif axis == 1:
+        out[0] = 2. * (x * y - w * z)
+        out[1] = 1. - 2. * (x * x + z * z)
+        out[2] = 2. * (y * z + w * x)
+    elif axis == 2:
+        out[0] = 2. * (x * z + w * y)
+        out[1] = 2. * (y * z - w * x)
+        out[2] = 1. - 2. * (x * x + y * y)
+    else:
+        raise ValueError(f"axis must be 0, 1 or 2, got {axis}.")
+    return out
+
+
+class DroneState:
+    """Preallocated equivalent of ``MultirotorBase.get_state`` (without force sensors).
+
+    Layout: ``pos (3) | rot (4) | vel_w (6) | heading (3) | up (3) | throttle * 2 - 1 (num_rotors)``.
+    """
+
+    def __init__(self, num_rotors: int = 4):
+        self.num_rotors = num_rotors
+        self.dim = 19 + num_rotors
+        self.buffer = np.zeros(self.dim, dtype=np.float32)
+        # views into ``buffer`` so that ``update`` only does in-place writes
+        self.pos = self.buffer[0:3]
+        self.rot = self.buffer[3:7]
+        self.lin_vel = self.buffer[7:10]
+        self.ang_vel = self.buffer[10:13]
+        self.heading = self.buffer[13:16]
+        self.up = self.buffer[16:19]
+        self.throttle = self.buffer[19:]
+
+    def update(self, estimate: StateEstimate) -> np.ndarray:
+        self.pos[:] = estimate.pos
+        self.rot[:] = estimate.rot
+        self.lin_vel[:] = estimate.lin_vel
+        self.ang_vel[:] = estimate.ang_vel
+        quat_axis(self.rot, 0, self.heading)
+        quat_axis(self.rot, 2, self.up)
+        np.multiply(estimate.throttle, 2., out=self.throttle)
+        self.throttle -= 1.
+        return self.buffer
+
+
+class HoverObservation:
+    """Builds the ``Hover`` task observation into a caller-provided buffer.
+
+    Layout: ``rpos (3) | drone_state[3:] | rheading (3) | time_encoding (4, optional)``.
+
+    Args:
+        out: The flat float32 buffer to write into, typically the input buffer of
+            an :class:`~sim2real_omnidrones.actor.ExportedActor`.
+        target_pos: The hovering position in the world frame.
+        target_heading: The desired heading as a unit vector.
+        num_rotors: Number of rotors of the vehicle.
+        max_episode_length: Number of control ticks in an episode, used for the
+            time encoding. ``None`` disables the time encoding.
+    """
+
+    def __init__(
+        self,
+        out: np.ndarray,
+        target_pos=(0., 0., 2.),
+        target_heading=(1., 0., 0.),
+        num_rotors: int = 4,
+        max_episode_length: int = None,
+    ):
+        self.state = DroneState(num_rotors)
+        self.time_encoding = max_episode_length is not None
+        self.max_episode_length = max_episode_length
+        self.dim = 3 + (self.state.dim - 3) + 3 + (4 if self.time_encoding else 0)
+        if out.shape != (self.dim,) or out.dtype != np.float32:
+            raise ValueError(
+                f"Expected a float32 buffer of shape ({self.dim},), got {out.dtype} {out.shape}."
+            )
+        self.out = out
+        self.target_pos = np.asarray(target_pos, dtype=np.float32)
+        self.target_heading = np.asarray(target_heading, dtype=np.float32)
+
+        n = self.state.dim
+        self._rpos = out[0:3]
+        self._state = out[3:n]
+        self._rheading = out[n:n + 3]
+        self._time = out[n + 3:]
+
+    def __call__(self, estimate: StateEstimate, tick: int = 0) -> np.ndarray:
+        state = self.state.update(estimate)
+        np.subtract(self.target_pos, state[0:3], out=self._rpos)
+        self._state[:] = state[3:]
+        np.subtract(self.target_heading, self.state.heading, out=self._rheading)
+        if self.time_encoding:
+            self._time[:] = tick / self.max_episode_length
+        return self.out